@@ -1,221 +1,529 @@
-from fastapi import FastAPI, HTTPException, Query, Depends, APIRouter, UploadFile, File, Request
-from fastapi.security import OAuth2PasswordBearer
-from slowapi import Limiter
-from slowapi.util import get_remote_address
-from sqlalchemy.orm import Session
-from datetime import date, timedelta
-from models import Contact, User, Token
-from db.dbs import get_db, database
+from fastapi import HTTPException, Query, Depends, APIRouter, Request
+from fastapi.responses import Response, StreamingResponse
+from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from starlette.datastructures import UploadFile as StarletteUploadFile
+from sqlalchemy import func, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import date, datetime, timedelta
+from models import Contact, User, Token, birth_md_of
+from db.dbs import get_db
 from typing import List
-from auth.auths import get_current_active_user, login_for_access_token, get_current_user
+from auth import auths
+from auth.auths import get_current_active_user, get_current_user
 from auth.jwts import create_jwt_token, decode_jwt_token
-from schemas import ContactCreateUpdate, ContactResponse
-import cloudinary.uploader
-from functools import wraps
-import time
+from schemas import ContactCreateUpdate, ContactResponse, ContactPage, BulkImportReport
+from api.config import (
+    CONTACTS_PAGE_SIZE, CONTACTS_MAX_PAGE_SIZE, CONTACTS_STREAM_BATCH_SIZE,
+    CONTACTS_BULK_BATCH_SIZE, CONTACTS_BULK_MAX_BATCH_SIZE, CONTACTS_BULK_MAX_ERRORS,
+    CACHE_BACKEND, REDIS_URL, CONTACT_CACHE_TTL, CONTACT_CACHE_MAXSIZE,
+    RATE_LIMIT_CONTACTS_WRITE, RATE_LIMIT_LOGIN,
+)
+from api.pagination import keyset_page, decode_cursor
+from api.conditional import (
+    contact_etag, make_etag, validator_headers, is_conditional, is_not_modified, not_modified_response, check_if_match,
+)
+from api.exports import ExportFormat, MEDIA_TYPES, export_stream, iter_contacts
+from api.bulk import BulkImporter, BulkFormatError, PARSERS, detect_format, iter_upload
+from api.ratelimit import rate_limit
+from api.avatars import read_upload, store_avatar
+from db.search import search_contact_ids, search_clause
+from cache import create_cache
 
-app = FastAPI()
+router = APIRouter()
 
 
-router = APIRouter()
+# Serialized ContactResponse JSON keyed by contact ID.
+contact_cache = create_cache(
+    "contacts", CACHE_BACKEND, CONTACT_CACHE_TTL, maxsize=CONTACT_CACHE_MAXSIZE, redis_url=REDIS_URL
+)
 
 
-limiter = Limiter(key_func=get_remote_address, default_limits=["1000 per hour"])
+# CRUD operations
 
+@router.post(
+    "/contacts/", response_model=ContactResponse,
+    dependencies=[Depends(rate_limit("contacts_write", RATE_LIMIT_CONTACTS_WRITE))],
+)
+async def create_contact(
+    contact: ContactCreateUpdate,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Create a new contact.
 
-app.state.limiter = limiter
+    Shares the RATE_LIMIT_CONTACTS_WRITE limit per user with updates and deletes.
+    An e-mail the user already has for another contact is rejected with 409.
 
+    Args:
+        contact (ContactCreateUpdate): Data of the new contact.
+        current_user (User): Current authenticated user.
+        db (AsyncSession, optional): Database session. Defaults to Depends(get_db).
 
-def rate_limited(max_calls: int, time_frame: int):
+    Returns:
+        Contact: Details of the created contact.
     """
-    :param max_calls: Maximum number of calls allowed in the specified time frame.
-    :param time_frame: The time frame (in seconds) for which the limit applies.
-    :return: Decorator function.
+    db_contact = Contact(**contact.dict(), owner_id=current_user.id)
+    db.add(db_contact)
+    await _commit_write(db)
+    return db_contact
+
+
+@router.post("/contacts/bulk", response_model=BulkImportReport)
+async def bulk_import_contacts(
+    request: Request,
+    batch_size: int = Query(CONTACTS_BULK_BATCH_SIZE, ge=1, le=CONTACTS_BULK_MAX_BATCH_SIZE, description="Rows per INSERT"),
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
     """
-    def decorator(func):
-        calls = []
-        @wraps(func)
-        async def wrapper(request: Request, *args, **kwargs):
-            now = time.time()
-            calls_in_time_frame = [call for call in calls if call > now - time_frame]
-            if len(calls_in_time_frame) >= max_calls:
-                raise HTTPException(status_code=429, detail="Rate limit exceeded.")
-            calls.append(now)
-            return await func(request, *args, **kwargs)
-        return wrapper
-    return decorator
+    Import many contacts of the current user from a JSON array, NDJSON or CSV body or file upload.
+
+    The body is parsed as a stream and every record is validated with
+    ContactCreateUpdate. Valid rows are inserted in batches of `batch_size`,
+    each batch in its own transaction. Invalid rows (and rows rejected by the
+    database, e.g. duplicate e-mails) are reported without aborting the import.
 
+    Args:
+        request (Request): The request with the body or a multipart file upload.
+        batch_size (int, optional): Rows per INSERT. Defaults to CONTACTS_BULK_BATCH_SIZE.
+        current_user (User): Current authenticated user.
+        db (AsyncSession, optional): Database session. Defaults to Depends(get_db).
 
-@app.get("/")
-@rate_limited(max_calls=10, time_frame=60) 
-async def read_root(request: Request):
-    return {"Hello": "World"}
-    
-    
-app.add_middleware(limiter)
+    Returns:
+        BulkImportReport: Counts of received, inserted and failed rows with per-row errors.
+    """
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = next((value for value in form.values() if isinstance(value, StarletteUploadFile)), None)
+        if upload is None:
+            raise HTTPException(status_code=400, detail="No file uploaded")
+        chunks = iter_upload(upload)
+        parse = PARSERS[detect_format(upload.content_type, upload.filename)]
+    else:
+        chunks = request.stream()
+        parse = PARSERS[detect_format(content_type)]
 
+    importer = BulkImporter(db, current_user.id, batch_size, CONTACTS_BULK_MAX_ERRORS)
+    try:
+        async for row, record in parse(chunks):
+            await importer.add(row, record)
+    except BulkFormatError as e:
+        await importer.flush()
+        return importer.report(error=str(e))
+    await importer.flush()
+    return importer.report()
 
-# CRUD operations
 
-@router.post("/contacts/", response_model=ContactResponse)
-async def create_contact(contact: ContactCreateUpdate, current_user: User = Depends(get_current_active_user)):
+def _search_contacts(db: AsyncSession, statement, q: str = None):
     """
-    Create a new contact.
+    Narrow a contacts select down to contacts matching a search phrase.
+
+    Uses the full-text index when the database has one and falls back to
+    ILIKE otherwise. The original ID order of the statement is kept.
 
     Args:
-        contact (ContactCreateUpdate): Data of the new contact.
-        current_user (User): Current authenticated user.
+        db (AsyncSession): Database session.
+        statement (Select): Select over contacts.
+        q (str, optional): Search query. Defaults to None.
 
     Returns:
-        dict: Details of the created contact.
+        Select: Filtered statement.
+    """
+    if not q:
+        return statement
+    clause = search_clause(db, Contact.id, q)
+    if clause is None:
+        clause = (
+            Contact.first_name.ilike(f"%{q}%")
+            | Contact.last_name.ilike(f"%{q}%")
+            | Contact.email.ilike(f"%{q}%")
+        )
+    return statement.where(clause)
+
+
+def stream_contacts_ndjson(owner_id: int, q: str = None, after_id: int = None,
+                           batch_size: int = CONTACTS_STREAM_BATCH_SIZE):
     """
-    await limiter.check(f"user:{current_user.username}", increment=True)
+    Stream matching contacts of a user as NDJSON read from a server-side cursor.
 
-    query = Contact.__table__.insert().values(**contact.dict())
-    contact_id = await database.execute(query)
-    return {"id": contact_id, **contact.dict()}
+    Rows are fetched `batch_size` at a time, so memory stays flat regardless
+    of the table size.
+
+    Args:
+        owner_id (int): ID of the user whose contacts are streamed.
+        q (str, optional): Search query. Defaults to None.
+        after_id (int, optional): Only stream contacts with a greater ID. Defaults to None.
+        batch_size (int, optional): Rows fetched per round trip. Defaults to CONTACTS_STREAM_BATCH_SIZE.
+
+    Returns:
+        AsyncIterator[bytes]: Chunks of NDJSON.
+    """
+    def build_statement(db, statement):
+        statement = _search_contacts(db, statement, q)
+        if after_id is not None:
+            statement = statement.where(Contact.id > after_id)
+        return statement
 
+    return export_stream(ExportFormat.ndjson, iter_contacts(owner_id, build_statement, batch_size))
 
-@router.get("/contacts/", response_model=List[ContactResponse])
-def get_all_contacts(
+
+@router.get("/contacts/", response_model=ContactPage)
+async def get_all_contacts(
+    request: Request,
+    response: Response,
     q: str = Query(None, alias="search", description="Search contacts by first name, last name, or email"),
-    db: Session = Depends(get_db)
+    cursor: str = Query(None, description="Opaque cursor returned as next_cursor of the previous page"),
+    limit: int = Query(CONTACTS_PAGE_SIZE, ge=1, le=CONTACTS_MAX_PAGE_SIZE, description="Page size"),
+    stream: bool = Query(False, description="Stream all matching contacts as NDJSON instead of a single page"),
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """
-    Get all contacts or search contacts by name or email.
+    Get a page of the current user's contacts or search them by name or email.
+
+    Pages are ordered by ID and fetched with keyset pagination, so every page
+    costs the same no matter how deep it is. A search returns the `limit` best
+    matches from the full-text index ranked by relevance, without a cursor.
+    With `stream=true` all matching contacts (after `cursor`, if given) are
+    streamed as NDJSON in ID order.
+
+    The first page and conditional requests carry an ETag and Last-Modified
+    derived from the number of the user's contacts and their latest
+    `updated_at`; a matching `If-None-Match` or `If-Modified-Since` is answered
+    with 304 before any contact is loaded. The validators take an aggregate
+    over all of the user's contacts, so they are skipped for later pages and
+    unconditional streams. All queries are bounded to the user's range of the
+    `owner_id` indexes.
 
     Args:
+        request (Request): Incoming request.
+        response (Response): Response whose headers are set.
         q (str, optional): Search query. Defaults to None.
-        db (Session, optional): Database session. Defaults to Depends(get_db).
+        cursor (str, optional): Cursor of the page to fetch. Defaults to None (first page).
+        limit (int, optional): Page size. Defaults to CONTACTS_PAGE_SIZE.
+        stream (bool, optional): Stream results as NDJSON. Defaults to False.
+        current_user (User): Current authenticated user.
+        db (AsyncSession, optional): Database session. Defaults to Depends(get_db).
 
     Returns:
-        List[ContactResponse]: List of contacts.
+        ContactPage: Contacts on the page and the cursor of the next one.
     """
-    if q:
-        contacts = db.query(Contact).filter(
-            Contact.first_name.ilike(f"%{q}%")
-            | Contact.last_name.ilike(f"%{q}%")
-            | Contact.email.ilike(f"%{q}%")
-        ).all()
-    else:
-        contacts = db.query(Contact).all()
-    return contacts
+    owned = Contact.owner_id == current_user.id
+    headers = {}
+    if is_conditional(request) or not (cursor or stream):
+        count, last_modified = (await db.execute(
+            select(func.count(Contact.id), func.max(Contact.updated_at)).where(owned)
+        )).one()
+        etag = make_etag(count, last_modified or 0)
+        if is_not_modified(request, etag, last_modified):
+            return not_modified_response(etag, last_modified)
+        headers = validator_headers(etag, last_modified)
+
+    if stream:
+        after_id = decode_cursor(cursor) if cursor else None
+        return StreamingResponse(
+            stream_contacts_ndjson(current_user.id, q, after_id), media_type="application/x-ndjson", headers=headers
+        )
+
+    response.headers.update(headers)
+
+    if q and not cursor:
+        ids = await search_contact_ids(db, q, limit, owner_id=current_user.id)
+        if ids is not None:
+            matches = await db.scalars(select(Contact).where(owned, Contact.id.in_(ids)))
+            found = {contact.id: contact for contact in matches}
+            return {"items": [found[contact_id] for contact_id in ids if contact_id in found], "next_cursor": None}
+
+    statement = _search_contacts(db, select(Contact).where(owned), q)
+    contacts, next_cursor = await keyset_page(db, statement, Contact.id, cursor, limit)
+    return {"items": contacts, "next_cursor": next_cursor}
+
+
+@router.get("/contacts/export")
+async def export_contacts(
+    export_format: ExportFormat = Query(ExportFormat.csv, alias="format", description="Export format"),
+    compress: bool = Query(False, alias="gzip", description="Compress the export with gzip"),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Export all contacts of the current user as CSV, NDJSON or vCard.
+
+    The export is streamed from a server-side cursor, so memory use is bounded
+    by the fetch batch size and the first bytes are sent right away, whatever
+    the size of the table.
+
+    Args:
+        export_format (ExportFormat, optional): Output format. Defaults to CSV.
+        compress (bool, optional): Whether to gzip the output. Defaults to False.
+        current_user (User): Current authenticated user.
+
+    Returns:
+        StreamingResponse: The export as a file download.
+    """
+    media_type, extension = MEDIA_TYPES[export_format]
+    filename = f"contacts.{extension}"
+    if compress:
+        media_type, filename = "application/gzip", f"{filename}.gz"
+    return StreamingResponse(
+        export_stream(export_format, iter_contacts(current_user.id, batch_size=CONTACTS_STREAM_BATCH_SIZE), compress),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+def _cache_entry(etag: str, last_modified: datetime, body: str) -> str:
+    # Cache entries are plain strings so that every backend can store them.
+    return f"{etag}\n{last_modified.isoformat()}\n{body}"
+
+
+def _parse_cache_entry(entry: str):
+    etag, last_modified, body = entry.split("\n", 2)
+    return etag, datetime.fromisoformat(last_modified), body
+
+
+def _cache_key(owner_id: int, contact_id: int) -> str:
+    return f"{owner_id}:{contact_id}"
+
+
+async def _get_owned(db: AsyncSession, contact_id: int, owner_id: int):
+    # Contacts of other users are reported as missing, so IDs cannot be probed.
+    contact = await db.get(Contact, contact_id)
+    if contact is None or contact.owner_id != owner_id:
+        raise HTTPException(status_code=404, detail="Contact not found")
+    return contact
+
+
+async def _get_for_write(db: AsyncSession, contact_id: int, owner_id: int, request: Request):
+    contact = await _get_owned(db, contact_id, owner_id)
+    check_if_match(request, contact_etag(contact))
+    return contact
+
+
+async def _commit_write(db: AsyncSession):
+    try:
+        await db.commit()
+    except StaleDataError:
+        # The row was changed by someone else between our read and write.
+        await db.rollback()
+        raise HTTPException(status_code=412, detail="Precondition Failed")
+    except IntegrityError:
+        # The only unique key a user controls is (owner_id, email).
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="Contact with this email already exists")
 
 
 @router.get("/contacts/{contact_id}", response_model=ContactResponse)
-def get_contact(contact_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_active_user)):
+async def get_contact(
+    contact_id: int,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
     """
-    Get a contact by ID.
+    Get a contact of the current user by ID.
+
+    The serialized contact is read through `contact_cache`, keyed by owner and
+    ID; writes to the contact invalidate the entry. The response carries a strong ETag and
+    Last-Modified, and a matching `If-None-Match` or `If-Modified-Since`
+    is answered with an empty 304.
 
     Args:
         contact_id (int): ID of the contact.
-        db (Session, optional): Database session. Defaults to Depends(get_db).
+        request (Request): Incoming request.
+        db (AsyncSession, optional): Database session. Defaults to Depends(get_db).
         current_user (User, optional): Current authenticated user. Defaults to Depends(get_current_active_user).
 
     Returns:
         ContactResponse: Details of the contact.
     """
-    contact = db.query(Contact).filter(Contact.id == contact_id).first()
-    if contact is None:
-        raise HTTPException(status_code=404, detail="Contact not found")
-    return contact
-
-
-@router.put("/contacts/{contact_id}", response_model=ContactResponse)
-def update_contact(contact_id: int, contact: ContactCreateUpdate, db: Session = Depends(get_db)):
+    cache_key = _cache_key(current_user.id, contact_id)
+    entry = await contact_cache.get(cache_key)
+    if entry is not None:
+        etag, last_modified, body = _parse_cache_entry(entry)
+    else:
+        contact = await _get_owned(db, contact_id, current_user.id)
+        etag, last_modified, body = contact_etag(contact), contact.updated_at, None
+    if is_not_modified(request, etag, last_modified):
+        return not_modified_response(etag, last_modified)
+    if body is None:
+        body = ContactResponse.model_validate(contact, from_attributes=True).model_dump_json()
+        await contact_cache.set(cache_key, _cache_entry(etag, last_modified, body))
+    return Response(content=body, media_type="application/json", headers=validator_headers(etag, last_modified))
+
+
+@router.put(
+    "/contacts/{contact_id}", response_model=ContactResponse,
+    dependencies=[Depends(rate_limit("contacts_write", RATE_LIMIT_CONTACTS_WRITE))],
+)
+async def update_contact(
+    contact_id: int,
+    contact: ContactCreateUpdate,
+    request: Request,
+    response: Response,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
     """
-    Update a contact by ID.
+    Update a contact of the current user by ID.
+
+    With `If-Match` the update only happens if the contact still has the given
+    ETag; otherwise 412 is returned. A concurrent update between the read and
+    the write is detected by the version column and also results in 412.
 
     Args:
         contact_id (int): ID of the contact to update.
         contact (ContactCreateUpdate): New data for the contact.
-        db (Session, optional): Database session. Defaults to Depends(get_db).
+        request (Request): Incoming request.
+        response (Response): Response whose headers are set.
+        current_user (User): Current authenticated user.
+        db (AsyncSession, optional): Database session. Defaults to Depends(get_db).
 
     Returns:
         ContactResponse: Updated details of the contact.
     """
-    db_contact = db.query(Contact).filter(Contact.id == contact_id).first()
-    if db_contact is None:
-        raise HTTPException(status_code=404, detail="Contact not found")
+    db_contact = await _get_for_write(db, contact_id, current_user.id, request)
     for key, value in contact.dict().items():
         setattr(db_contact, key, value)
-    db.commit()
-    db.refresh(db_contact)
+    await _commit_write(db)
+    await contact_cache.delete(_cache_key(current_user.id, contact_id))
+    response.headers.update(validator_headers(contact_etag(db_contact), db_contact.updated_at))
     return db_contact
 
 
-@router.delete("/contacts/{contact_id}", response_model=ContactResponse)
-def delete_contact(contact_id: int, db: Session = Depends(get_db)):
+@router.delete(
+    "/contacts/{contact_id}", response_model=ContactResponse,
+    dependencies=[Depends(rate_limit("contacts_write", RATE_LIMIT_CONTACTS_WRITE))],
+)
+async def delete_contact(
+    contact_id: int,
+    request: Request,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
     """
-    Delete a contact by ID.
+    Delete a contact of the current user by ID.
+
+    Supports `If-Match` in the same way as `update_contact`.
 
     Args:
         contact_id (int): ID of the contact to delete.
-        db (Session, optional): Database session. Defaults to Depends(get_db).
+        request (Request): Incoming request.
+        current_user (User): Current authenticated user.
+        db (AsyncSession, optional): Database session. Defaults to Depends(get_db).
 
     Returns:
         ContactResponse: Details of the deleted contact.
     """
-    contact = db.query(Contact).filter(Contact.id == contact_id).first()
-    if contact is None:
-        raise HTTPException(status_code=404, detail="Contact not found")
-    db.delete(contact)
-    db.commit()
+    contact = await _get_for_write(db, contact_id, current_user.id, request)
+    await db.delete(contact)
+    await _commit_write(db)
+    await contact_cache.delete(_cache_key(current_user.id, contact_id))
     return contact
 
 
-@router.get("/contacts/birthdays/", response_model=list[ContactResponse])
-def get_birthdays_within_7_days(db: Session = Depends(get_db)):
+def upcoming_birthdays_filter(today: date, days: int):
     """
-    Get contacts with birthdays within the next 7 days.
+    Build a filter on `Contact.birth_md` matching birthdays in the next `days` days.
+
+    Both ends are compared as MMDD numbers, so together with an `owner_id`
+    condition the filter is a range scan of the (owner_id, birth_md) index. A window crossing New Year is split into two ranges
+    (until 31 December and from 1 January). People born on 29 February fall
+    between 28 February and 1 March, so they are included in non-leap years.
 
     Args:
-        db (Session, optional): Database session. Defaults to Depends(get_db).
+        today (date): First day of the window.
+        days (int): Length of the window in days (0 means today only).
 
     Returns:
-        list[ContactResponse]: List of contacts with birthdays within the next 7 days.
+        ClauseElement: Filter for the contacts query.
+    """
+    if days >= 365:
+        return Contact.birth_md.isnot(None)
+    start = birth_md_of(today)
+    end = birth_md_of(today + timedelta(days=days))
+    if start <= end:
+        return Contact.birth_md.between(start, end)
+    return or_(Contact.birth_md >= start, Contact.birth_md <= end)
+
+
+@router.get("/contacts/birthdays/", response_model=list[ContactResponse])
+async def get_upcoming_birthdays(
+    days: int = Query(7, ge=0, le=366, description="Number of days ahead to look for birthdays"),
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
     """
-    today = date.today()
-    next_week = today + timedelta(days=7)
+    Get the current user's contacts with birthdays within the next `days` days (7 by default).
+
+    Args:
+        days (int, optional): Number of days ahead. Defaults to 7.
+        current_user (User): Current authenticated user.
+        db (AsyncSession, optional): Database session. Defaults to Depends(get_db).
 
-    contacts = db.query(Contact).filter(
-        Contact.birth_date.between(today, next_week)
-    ).all()
+    Returns:
+        list[ContactResponse]: List of contacts with upcoming birthdays.
+    """
+    contacts = await db.scalars(select(Contact).where(
+        Contact.owner_id == current_user.id,
+        upcoming_birthdays_filter(date.today(), days)
+    ))
 
-    return contacts
+    return contacts.all()
 
 
-@router.post("/token/", response_model=Token)
-async def login_for_access_token(form_data: OAuth2PasswordBearer = Depends()):
+@router.post("/token/", response_model=Token, dependencies=[Depends(rate_limit("login", RATE_LIMIT_LOGIN))])
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
     """
     Login to get an access token.
 
+    The password is verified in the password-hashing executor, so a login
+    does not block other requests. Limited to RATE_LIMIT_LOGIN attempts
+    per client IP address.
+
     Args:
-        form_data (OAuth2PasswordBearer, optional): Form data with username and password. Defaults to Depends().
+        form_data (OAuth2PasswordRequestForm, optional): Form data with username and password. Defaults to Depends().
+        db (AsyncSession, optional): Database session. Defaults to Depends(get_db).
 
     Returns:
         Token: Access token.
     """
-    return login_for_access_token(form_data)
+    return await auths.login_for_access_token(form_data, db)
 
 
-#cloudinary
+# Avatars
 
 @router.post("/users/avatar/upload/")
-async def upload_avatar(file: UploadFile = File(...), current_user: User = Depends(get_current_user)):
+async def upload_avatar(
+    request: Request,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
     """
     Upload avatar for the user.
 
+    The image is sent as a multipart file or as a raw image body and read in
+    chunks up to AVATAR_MAX_BYTES. It is cropped, resized and re-encoded to
+    WebP (plus a thumbnail) in a process pool, saved to the configured storage
+    and the URL is stored on the user.
+
     Args:
-        file (UploadFile): Avatar file to upload.
+        request (Request): The request with the image.
         current_user (User): Current authenticated user.
+        db (AsyncSession, optional): Database session. Defaults to Depends(get_db).
 
     Returns:
-        dict: Details of the uploaded avatar.
+        dict: URLs of the avatar and its thumbnail.
     """
-    response = cloudinary.uploader.upload(file.file)
-    current_user.avatar_url = response["secure_url"]
-    return {"avatar_url": current_user.avatar_url}
-
+    urls = await store_avatar(current_user.id, await read_upload(request))
+    user = await db.get(User, current_user.id)
+    if user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    user.avatar_url = urls["avatar_url"]
+    await db.commit()
+    await auths.invalidate_user(user.username)
+    return urls
 
-app.include_router(router)
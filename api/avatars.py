@@ -0,0 +1,293 @@
+import asyncio
+import hashlib
+import io
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from fastapi import HTTPException, Request
+from starlette.datastructures import UploadFile as StarletteUploadFile
+from api.config import (
+    AVATAR_STORAGE, AVATAR_LOCAL_DIR, AVATAR_BASE_URL, AVATAR_S3_BUCKET, AVATAR_S3_ENDPOINT_URL,
+    AVATAR_MAX_BYTES, AVATAR_MAX_PIXELS, AVATAR_SIZE, AVATAR_THUMBNAIL_SIZE, AVATAR_WEBP_QUALITY, AVATAR_WORKERS,
+    CLOUDINARY_CLOUD_NAME, CLOUDINARY_API_KEY, CLOUDINARY_API_SECRET,
+)
+
+
+CHUNK_SIZE = 64 * 1024
+
+ACCEPTED_FORMATS = {"JPEG", "PNG", "WEBP", "GIF"}
+
+
+class AvatarError(ValueError):
+    """
+    Raised when an upload is not an image that can be used as an avatar.
+    """
+
+
+def process_avatar(data: bytes, size: int = AVATAR_SIZE, thumbnail_size: int = AVATAR_THUMBNAIL_SIZE,
+                   quality: int = AVATAR_WEBP_QUALITY, max_pixels: int = AVATAR_MAX_PIXELS) -> dict:
+    """
+    Crop an image to a square, resize it and re-encode it as WebP.
+
+    Runs in the avatar process pool, so the CPU-heavy decoding and encoding
+    does not hold the event loop or the GIL of the web worker.
+
+    Args:
+        data (bytes): Uploaded image.
+        size (int, optional): Side of the avatar in pixels. Defaults to AVATAR_SIZE.
+        thumbnail_size (int, optional): Side of the thumbnail in pixels. Defaults to AVATAR_THUMBNAIL_SIZE.
+        quality (int, optional): WebP quality. Defaults to AVATAR_WEBP_QUALITY.
+        max_pixels (int, optional): Largest accepted image (width * height). Defaults to AVATAR_MAX_PIXELS.
+
+    Raises:
+        AvatarError: If the data is not a supported image or is too large.
+
+    Returns:
+        dict: WebP bytes under "avatar" and "thumbnail".
+    """
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    try:
+        image = Image.open(io.BytesIO(data))
+    except (UnidentifiedImageError, Image.DecompressionBombError):
+        raise AvatarError("Unsupported image format")
+    if image.format not in ACCEPTED_FORMATS:
+        raise AvatarError(f"Unsupported image format: {image.format}")
+    # Checked before decoding, so a small file cannot expand into a huge bitmap.
+    if image.width * image.height > max_pixels:
+        raise AvatarError("Image dimensions too large")
+    try:
+        image = ImageOps.exif_transpose(image)
+        image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+        avatar = ImageOps.fit(image, (size, size), Image.LANCZOS)
+    except (OSError, SyntaxError):
+        raise AvatarError("Corrupt image")
+    thumbnail = avatar.resize((thumbnail_size, thumbnail_size), Image.LANCZOS)
+    encoded = {}
+    for name, picture in (("avatar", avatar), ("thumbnail", thumbnail)):
+        buffer = io.BytesIO()
+        picture.save(buffer, "WEBP", quality=quality, method=4)
+        encoded[name] = buffer.getvalue()
+    return encoded
+
+
+_executor = None
+
+
+def get_executor():
+    """
+    Return the process pool used for image processing (created on first use).
+    """
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=AVATAR_WORKERS)
+    return _executor
+
+
+def shutdown_executor():
+    """
+    Shut the image processing pool down (on application shutdown).
+    """
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+
+class LocalStorage:
+    """
+    Store files in a local directory served under `base_url`.
+
+    Also the local stand-in for S3 in development and tests.
+
+    Args:
+        root (str): Directory for the files.
+        base_url (str): URL prefix under which `root` is served.
+    """
+
+    def __init__(self, root: str, base_url: str):
+        self.root = root
+        self.base_url = base_url.rstrip("/")
+
+    def _write(self, key: str, data: bytes):
+        path = os.path.join(self.root, *key.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written under a temporary name first, so readers never see a partial file.
+        descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(descriptor, "wb") as file:
+            file.write(data)
+        os.replace(temporary, path)
+
+    async def save(self, key: str, data: bytes, content_type: str) -> str:
+        await asyncio.to_thread(self._write, key, data)
+        return f"{self.base_url}/{key}"
+
+
+class S3Storage:
+    """
+    Store files in an S3-compatible bucket (AWS S3, MinIO, ...).
+
+    Requires boto3, imported on first use.
+
+    Args:
+        bucket (str): Bucket name.
+        endpoint_url (str, optional): Endpoint of an S3-compatible server. Defaults to AWS.
+        base_url (str, optional): Public URL prefix of the bucket. Defaults to `endpoint_url/bucket`.
+    """
+
+    def __init__(self, bucket: str, endpoint_url: str = None, base_url: str = None):
+        self.bucket = bucket
+        self.endpoint_url = endpoint_url
+        self.base_url = (base_url or f"{endpoint_url or 'https://s3.amazonaws.com'}/{bucket}").rstrip("/")
+        self._client = None
+
+    def _put(self, key: str, data: bytes, content_type: str):
+        if self._client is None:
+            import boto3
+            self._client = boto3.client("s3", endpoint_url=self.endpoint_url)
+        self._client.put_object(
+            Bucket=self.bucket, Key=key, Body=data, ContentType=content_type,
+            CacheControl="public, max-age=31536000, immutable",
+        )
+
+    async def save(self, key: str, data: bytes, content_type: str) -> str:
+        await asyncio.to_thread(self._put, key, data, content_type)
+        return f"{self.base_url}/{key}"
+
+
+class CloudinaryStorage:
+    """
+    Store files in Cloudinary.
+
+    The cloudinary package is imported and configured on the first upload,
+    so it costs nothing at startup when another storage is used.
+
+    Args:
+        cloud_name (str): Cloudinary cloud name.
+        api_key (str): API key.
+        api_secret (str): API secret.
+
+    Raises:
+        ValueError: If any of the credentials is missing.
+    """
+
+    def __init__(self, cloud_name: str, api_key: str, api_secret: str):
+        missing = [name for name, value in (
+            ("CLOUDINARY_CLOUD_NAME", cloud_name), ("CLOUDINARY_API_KEY", api_key), ("CLOUDINARY_API_SECRET", api_secret),
+        ) if not value]
+        if missing:
+            raise ValueError(f"Cloudinary avatar storage requires {', '.join(missing)}")
+        self.cloud_name = cloud_name
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self._configured = False
+
+    def _upload(self, key: str, data: bytes):
+        import cloudinary
+        import cloudinary.uploader
+        if not self._configured:
+            cloudinary.config(cloud_name=self.cloud_name, api_key=self.api_key, api_secret=self.api_secret)
+            self._configured = True
+        public_id = key.rsplit(".", 1)[0]
+        return cloudinary.uploader.upload(io.BytesIO(data), public_id=public_id, overwrite=True, resource_type="image")
+
+    async def save(self, key: str, data: bytes, content_type: str) -> str:
+        response = await asyncio.to_thread(self._upload, key, data)
+        return response["secure_url"]
+
+
+def create_storage(backend: str):
+    """
+    Create the avatar storage: "local", "s3" or "cloudinary".
+    """
+    if backend == "local":
+        return LocalStorage(AVATAR_LOCAL_DIR, AVATAR_BASE_URL)
+    if backend == "s3":
+        return S3Storage(AVATAR_S3_BUCKET, AVATAR_S3_ENDPOINT_URL, AVATAR_BASE_URL if AVATAR_BASE_URL.startswith("http") else None)
+    if backend == "cloudinary":
+        return CloudinaryStorage(CLOUDINARY_CLOUD_NAME, CLOUDINARY_API_KEY, CLOUDINARY_API_SECRET)
+    raise ValueError(f"Unknown avatar storage: {backend}")
+
+
+storage = create_storage(AVATAR_STORAGE)
+
+
+def _too_large(max_bytes: int):
+    return HTTPException(status_code=413, detail=f"Upload larger than {max_bytes} bytes")
+
+
+def limited_request(request: Request, max_bytes: int) -> Request:
+    """
+    Wrap a request so reading more than `max_bytes` of its body fails with 413.
+
+    A declared `Content-Length` over the limit is rejected before anything is
+    read; for chunked bodies the limit is enforced while the chunks arrive.
+    """
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+        raise _too_large(max_bytes)
+    received = 0
+
+    async def receive():
+        nonlocal received
+        message = await request.receive()
+        if message["type"] == "http.request":
+            received += len(message.get("body", b""))
+            if received > max_bytes:
+                raise _too_large(max_bytes)
+        return message
+
+    return Request(request.scope, receive)
+
+
+async def read_upload(request: Request, max_bytes: int = AVATAR_MAX_BYTES) -> bytes:
+    """
+    Read an uploaded image from a multipart form (first file field) or a raw image body.
+
+    Multipart overhead counts toward the limit, so an avatar close to
+    `max_bytes` should be sent as a raw body.
+
+    Raises:
+        HTTPException: 400 without a file, 413 when the upload is too large.
+    """
+    limited = limited_request(request, max_bytes)
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        form = await limited.form(max_files=1)
+        upload = next((value for value in form.values() if isinstance(value, StarletteUploadFile)), None)
+        if upload is None:
+            raise HTTPException(status_code=400, detail="No file uploaded")
+        chunks = []
+        while chunk := await upload.read(CHUNK_SIZE):
+            chunks.append(chunk)
+        await form.close()
+    else:
+        chunks = [chunk async for chunk in limited.stream()]
+    data = b"".join(chunks)
+    if not data:
+        raise HTTPException(status_code=400, detail="No file uploaded")
+    return data
+
+
+async def store_avatar(user_id: int, data: bytes) -> dict:
+    """
+    Process an uploaded image in the process pool and save both sizes to `storage`.
+
+    Keys are derived from the content, so re-uploading the same image is
+    idempotent and a new image never reuses a cached URL.
+
+    Raises:
+        HTTPException: 415 if the upload is not a supported image.
+
+    Returns:
+        dict: "avatar_url" and "thumbnail_url".
+    """
+    try:
+        encoded = await asyncio.get_running_loop().run_in_executor(get_executor(), process_avatar, data)
+    except AvatarError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    digest = hashlib.sha256(encoded["avatar"]).hexdigest()[:16]
+    avatar_url, thumbnail_url = await asyncio.gather(
+        storage.save(f"{user_id}/{digest}.webp", encoded["avatar"], "image/webp"),
+        storage.save(f"{user_id}/{digest}_thumb.webp", encoded["thumbnail"], "image/webp"),
+    )
+    return {"avatar_url": avatar_url, "thumbnail_url": thumbnail_url}
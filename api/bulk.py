@@ -0,0 +1,298 @@
+import codecs
+import csv
+import json
+import re
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.exc import DataError, IntegrityError
+from models import Contact
+from schemas import ContactCreateUpdate
+
+
+CHUNK_SIZE = 64 * 1024
+
+# A single record larger than this is rejected instead of being buffered without limit.
+MAX_RECORD_BYTES = 1024 * 1024
+
+# JSON whitespace (`str.isspace` would also accept characters that are not valid between elements).
+_skip_whitespace = re.compile(r"[ \t\n\r]*").match
+
+
+class BulkFormatError(ValueError):
+    """
+    Raised when the uploaded body cannot be parsed any further.
+    """
+
+
+def detect_format(content_type: str = None, filename: str = None) -> str:
+    """
+    Pick the input format from a content type or a file name.
+
+    Args:
+        content_type (str, optional): Content type of the body or the uploaded file.
+        filename (str, optional): Name of the uploaded file.
+
+    Returns:
+        str: One of "json", "ndjson" or "csv".
+    """
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    filename = (filename or "").lower()
+    if content_type in ("application/x-ndjson", "application/ndjson", "application/jsonl") or filename.endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    if content_type in ("text/csv", "application/csv") or filename.endswith(".csv"):
+        return "csv"
+    return "json"
+
+
+async def _lines(chunks):
+    """
+    Split an async stream of byte chunks into raw lines, line endings included.
+
+    A UTF-8 byte order mark at the start of the stream is dropped.
+    """
+    buffer, start = b"", True
+    async for chunk in chunks:
+        buffer += chunk
+        if start:
+            if len(buffer) < len(codecs.BOM_UTF8) and codecs.BOM_UTF8.startswith(buffer):
+                continue
+            buffer, start = buffer.removeprefix(codecs.BOM_UTF8), False
+        *complete, buffer = buffer.split(b"\n")
+        for line in complete:
+            yield line + b"\n"
+        if len(buffer) > MAX_RECORD_BYTES:
+            raise BulkFormatError("Line too long")
+    if buffer:
+        yield buffer
+
+
+def _invalid_text(error: UnicodeDecodeError) -> str:
+    return f"Invalid UTF-8 at byte {error.start}"
+
+
+async def iter_ndjson(chunks):
+    """
+    Yield `(row, record or error message)` pairs from an NDJSON stream.
+    """
+    row = 0
+    async for line in _lines(chunks):
+        if not line.strip():
+            continue
+        row += 1
+        try:
+            yield row, json.loads(line.decode("utf-8"))
+        except UnicodeDecodeError as e:
+            yield row, _invalid_text(e)
+        except json.JSONDecodeError as e:
+            yield row, f"Invalid JSON: {e.msg}"
+
+
+async def iter_csv(chunks):
+    """
+    Yield `(row, record or error message)` pairs from a CSV stream with a header row.
+
+    Quoted fields may span several lines: physical lines are joined until the
+    record has a balanced number of quote characters, and the `csv` module
+    parses the record with its original line endings. Records that are not
+    valid UTF-8 or CSV are reported as row errors. Empty cells are treated as
+    missing values.
+    """
+    header, record, row = None, b"", 0
+    async for line in _lines(chunks):
+        record += line
+        if record.count(b'"') % 2:
+            if len(record) > MAX_RECORD_BYTES:
+                raise BulkFormatError("Unterminated quoted field")
+            continue
+        data, record = record, b""
+        try:
+            values = next(csv.reader([data.decode("utf-8")])) if data.strip() else []
+        except (UnicodeDecodeError, csv.Error) as e:
+            message = _invalid_text(e) if isinstance(e, UnicodeDecodeError) else f"Invalid CSV: {e}"
+            if header is None:
+                raise BulkFormatError(f"Invalid header row: {message}")
+            row += 1
+            yield row, message
+            continue
+        if not values:
+            continue
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        row += 1
+        if len(values) != len(header):
+            yield row, f"Expected {len(header)} fields, got {len(values)}"
+            continue
+        yield row, {name: value for name, value in zip(header, values) if value != ""}
+    if record:
+        raise BulkFormatError("Unterminated quoted field")
+
+
+async def iter_json_array(chunks):
+    """
+    Yield `(row, record)` pairs from a JSON array without loading the whole array.
+
+    Elements are decoded one by one with `JSONDecoder.raw_decode` as soon as they
+    are complete in the buffer. A syntax error cannot be skipped, so it ends the
+    import with `BulkFormatError`.
+    """
+    decoder = json.JSONDecoder()
+    decode = codecs.getincrementaldecoder("utf-8-sig")()
+    chunks = chunks.__aiter__()
+    # `position` indexes the unconsumed part of `buffer`; the consumed prefix is dropped once per chunk.
+    buffer, position, row, state, eof = "", 0, 0, "start", False
+
+    async def read_more():
+        nonlocal buffer, position, eof
+        buffer = buffer[position:]
+        position = 0
+        try:
+            chunk = await chunks.__anext__()
+        except StopAsyncIteration:
+            chunk, eof = b"", True
+        try:
+            buffer += decode.decode(chunk, final=eof)
+        except UnicodeDecodeError:
+            raise BulkFormatError(f"Invalid UTF-8 after element {row}")
+
+    while True:
+        position = _skip_whitespace(buffer, position).end()
+        if position == len(buffer):
+            if eof:
+                raise BulkFormatError("Unterminated JSON array")
+            await read_more()
+            continue
+        if state == "start":
+            if buffer[position] != "[":
+                raise BulkFormatError("Expected a JSON array")
+            position, state = position + 1, "value"
+            continue
+        if buffer[position] == "]":
+            return
+        if state == "separator":
+            if buffer[position] != ",":
+                raise BulkFormatError(f"Expected ',' after element {row}")
+            position, state = position + 1, "value"
+            continue
+        try:
+            record, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof or len(buffer) - position > MAX_RECORD_BYTES:
+                raise BulkFormatError(f"Invalid JSON in element {row + 1}")
+            await read_more()
+            continue
+        row += 1
+        position, state = end, "separator"
+        yield row, record
+
+
+async def iter_upload(upload, chunk_size: int = CHUNK_SIZE):
+    """
+    Yield the content of an uploaded file in chunks.
+    """
+    while chunk := await upload.read(chunk_size):
+        yield chunk
+
+
+PARSERS = {
+    "json": iter_json_array,
+    "ndjson": iter_ndjson,
+    "csv": iter_csv,
+}
+
+
+def _validation_errors(error: ValidationError):
+    return [{"loc": list(detail["loc"]), "msg": detail["msg"]} for detail in error.errors()]
+
+
+class BulkImporter:
+    """
+    Validate contact records and insert them in batches as contacts of one user.
+
+    Every batch is inserted with a single executemany in its own transaction.
+    When a batch fails (e.g. an e-mail the user already has), its rows are retried one by
+    one in savepoints, so only the offending rows are rejected.
+
+    Args:
+        db (AsyncSession): Database session.
+        owner_id (int): ID of the user who owns the imported contacts.
+        batch_size (int): Number of rows per executemany.
+        max_errors (int): Maximum number of row errors kept in the report.
+    """
+
+    def __init__(self, db, owner_id: int, batch_size: int, max_errors: int):
+        self.db = db
+        self.owner_id = owner_id
+        self.batch_size = batch_size
+        self.max_errors = max_errors
+        self.batch = []
+        self.received = 0
+        self.inserted = 0
+        self.failed = 0
+        self.errors = []
+
+    def _reject(self, row: int, errors):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"row": row, "errors": errors})
+
+    async def add(self, row: int, record):
+        """
+        Validate one record and queue it for insertion.
+
+        Args:
+            row (int): 1-based number of the record in the input.
+            record (dict or str): Parsed record or a parse error message.
+        """
+        self.received += 1
+        if isinstance(record, str):
+            self._reject(row, [{"loc": [], "msg": record}])
+            return
+        try:
+            contact = ContactCreateUpdate.model_validate(record)
+        except ValidationError as e:
+            self._reject(row, _validation_errors(e))
+            return
+        self.batch.append((row, {**contact.model_dump(), "owner_id": self.owner_id}))
+        if len(self.batch) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self):
+        """
+        Insert all queued rows.
+        """
+        if not self.batch:
+            return
+        batch, self.batch = self.batch, []
+        statement = insert(Contact.__table__)
+        try:
+            await self.db.execute(statement, [values for _, values in batch])
+            await self.db.commit()
+            self.inserted += len(batch)
+            return
+        except (IntegrityError, DataError):
+            await self.db.rollback()
+
+        for row, values in batch:
+            try:
+                async with self.db.begin_nested():
+                    await self.db.execute(statement, [values])
+                self.inserted += 1
+            except (IntegrityError, DataError) as e:
+                self._reject(row, [{"loc": [], "msg": str(e.orig)}])
+        await self.db.commit()
+
+    def report(self, error: str = None) -> dict:
+        """
+        Return the summary of the import.
+
+        Args:
+            error (str, optional): Error that stopped parsing of the input. Defaults to None.
+        """
+        return {
+            "received": self.received,
+            "inserted": self.inserted,
+            "failed": self.failed,
+            "errors": self.errors,
+            "error": error,
+        }
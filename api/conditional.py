@@ -0,0 +1,129 @@
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from fastapi import HTTPException, Request, Response
+
+
+def make_etag(*parts) -> str:
+    """
+    Build a strong ETag from the values identifying a version of a resource.
+
+    Args:
+        *parts: Values such as a version number or a modification timestamp.
+
+    Returns:
+        str: Quoted entity tag.
+    """
+    return '"' + "-".join(_etag_part(part) for part in parts) + '"'
+
+
+def _etag_part(value) -> str:
+    if isinstance(value, datetime):
+        return format(int(_as_utc(value).timestamp() * 1_000_000), "x")
+    return str(value)
+
+
+def _as_utc(value: datetime) -> datetime:
+    # Timestamps are stored as naive UTC.
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def contact_etag(contact) -> str:
+    """
+    Return the ETag of a single contact.
+    """
+    return make_etag(contact.version, contact.updated_at)
+
+
+def http_date(value: datetime) -> str:
+    """
+    Format a timestamp as an HTTP date (used for `Last-Modified`).
+    """
+    return format_datetime(_as_utc(value).replace(microsecond=0), usegmt=True)
+
+
+def _parse_http_date(value: str):
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    return _as_utc(parsed) if parsed is not None else None
+
+
+def _etag_list(header: str):
+    return [tag.strip() for tag in header.split(",") if tag.strip()]
+
+
+def _opaque(tag: str) -> str:
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def validator_headers(etag: str, last_modified: datetime = None) -> dict:
+    """
+    Return the `ETag` and `Last-Modified` headers for a representation.
+    """
+    headers = {"ETag": etag}
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+
+def is_conditional(request: Request) -> bool:
+    """
+    Return True if a GET request carries `If-None-Match` or `If-Modified-Since`.
+    """
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
+
+
+def is_not_modified(request: Request, etag: str, last_modified: datetime = None) -> bool:
+    """
+    Evaluate `If-None-Match` and `If-Modified-Since` of a GET request.
+
+    `If-None-Match` takes precedence and uses the weak comparison
+    (RFC 9110, 13.1.2). `If-Modified-Since` is only considered when there is no
+    `If-None-Match`, at one-second resolution.
+
+    Args:
+        request (Request): Incoming request.
+        etag (str): Current ETag of the resource.
+        last_modified (datetime, optional): Current modification time. Defaults to None.
+
+    Returns:
+        bool: True if the client's copy is current and 304 should be returned.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = _etag_list(if_none_match)
+        return "*" in tags or _opaque(etag) in {_opaque(tag) for tag in tags}
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or last_modified is None:
+        return False
+    since = _parse_http_date(if_modified_since)
+    return since is not None and _as_utc(last_modified).replace(microsecond=0) <= since
+
+
+def not_modified_response(etag: str, last_modified: datetime = None) -> Response:
+    """
+    Build an empty 304 response carrying the current validators.
+    """
+    return Response(status_code=304, headers=validator_headers(etag, last_modified))
+
+
+def check_if_match(request: Request, etag: str):
+    """
+    Enforce `If-Match` on a write (optimistic concurrency control).
+
+    Uses the strong comparison: weak tags never match.
+
+    Args:
+        request (Request): Incoming request.
+        etag (str): Current ETag of the resource.
+
+    Raises:
+        HTTPException: 412 if the client's ETag is not the current one.
+    """
+    if_match = request.headers.get("if-match")
+    if if_match is None:
+        return
+    tags = _etag_list(if_match)
+    if "*" not in tags and etag not in tags:
+        raise HTTPException(status_code=412, detail="Precondition Failed")
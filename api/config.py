@@ -4,7 +4,70 @@ import os
 
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
+JWT_JWKS_FILE = os.getenv("JWT_JWKS_FILE")
+JWT_SIGNING_KID = os.getenv("JWT_SIGNING_KID")
+JWT_JWKS_RELOAD_INTERVAL = float(os.getenv("JWT_JWKS_RELOAD_INTERVAL", "5"))
+JWT_CACHE_MAXSIZE = int(os.getenv("JWT_CACHE_MAXSIZE", "10000"))
+REFRESH_TOKEN_EXPIRE_DAYS = float(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "14"))
+TOKEN_STORE_BACKEND = os.getenv("TOKEN_STORE_BACKEND", "memory")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "thread")
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+
+CONTACTS_PAGE_SIZE = int(os.getenv("CONTACTS_PAGE_SIZE", "50"))
+CONTACTS_MAX_PAGE_SIZE = int(os.getenv("CONTACTS_MAX_PAGE_SIZE", "500"))
+CONTACTS_STREAM_BATCH_SIZE = int(os.getenv("CONTACTS_STREAM_BATCH_SIZE", "1000"))
+CONTACTS_BULK_BATCH_SIZE = int(os.getenv("CONTACTS_BULK_BATCH_SIZE", "1000"))
+CONTACTS_BULK_MAX_BATCH_SIZE = int(os.getenv("CONTACTS_BULK_MAX_BATCH_SIZE", "10000"))
+CONTACTS_BULK_MAX_ERRORS = int(os.getenv("CONTACTS_BULK_MAX_ERRORS", "1000"))
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+CONTACT_CACHE_TTL = float(os.getenv("CONTACT_CACHE_TTL", "60"))
+CONTACT_CACHE_MAXSIZE = int(os.getenv("CONTACT_CACHE_MAXSIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "30"))
+USER_CACHE_MAXSIZE = int(os.getenv("USER_CACHE_MAXSIZE", "10000"))
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_MAXSIZE = int(os.getenv("RATE_LIMIT_MAXSIZE", "100000"))
+RATE_LIMIT_DEFAULT = os.getenv("RATE_LIMIT_DEFAULT", "10/minute")
+RATE_LIMIT_CONTACTS_WRITE = os.getenv("RATE_LIMIT_CONTACTS_WRITE", "60/minute")
+RATE_LIMIT_LOGIN = os.getenv("RATE_LIMIT_LOGIN", "10/minute")
+VERIFICATION_TOKEN_TTL_HOURS = float(os.getenv("VERIFICATION_TOKEN_TTL_HOURS", "24"))
+UNVERIFIED_CLEANUP_INTERVAL = float(os.getenv("UNVERIFIED_CLEANUP_INTERVAL", "3600"))
+MAIL_TRANSPORT = os.getenv("MAIL_TRANSPORT", "smtp")
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "465"))
+SMTP_SECURITY = os.getenv("SMTP_SECURITY", "ssl")
+SMTP_USERNAME = os.getenv("SMTP_USERNAME", "email@example.com")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "email_password")
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "30"))
+MAIL_FROM = os.getenv("MAIL_FROM", SMTP_USERNAME)
+MAIL_BATCH_SIZE = int(os.getenv("MAIL_BATCH_SIZE", "50"))
+MAIL_MAX_RETRIES = int(os.getenv("MAIL_MAX_RETRIES", "5"))
+MAIL_RETRY_BACKOFF = float(os.getenv("MAIL_RETRY_BACKOFF", "2"))
+MAIL_DEAD_LETTER_FILE = os.getenv("MAIL_DEAD_LETTER_FILE", "mail_dead_letters.jsonl")
+AVATAR_STORAGE = os.getenv("AVATAR_STORAGE", "local")
+AVATAR_LOCAL_DIR = os.getenv("AVATAR_LOCAL_DIR", "static/avatars")
+AVATAR_BASE_URL = os.getenv("AVATAR_BASE_URL", "/static/avatars")
+AVATAR_S3_BUCKET = os.getenv("AVATAR_S3_BUCKET", "avatars")
+AVATAR_S3_ENDPOINT_URL = os.getenv("AVATAR_S3_ENDPOINT_URL")
+AVATAR_MAX_BYTES = int(os.getenv("AVATAR_MAX_BYTES", str(5 * 1024 * 1024)))
+AVATAR_MAX_PIXELS = int(os.getenv("AVATAR_MAX_PIXELS", "40000000"))
+AVATAR_SIZE = int(os.getenv("AVATAR_SIZE", "512"))
+AVATAR_THUMBNAIL_SIZE = int(os.getenv("AVATAR_THUMBNAIL_SIZE", "128"))
+AVATAR_WEBP_QUALITY = int(os.getenv("AVATAR_WEBP_QUALITY", "85"))
+AVATAR_WORKERS = int(os.getenv("AVATAR_WORKERS", str(min(2, os.cpu_count() or 1))))
+CLOUDINARY_CLOUD_NAME = os.getenv("CLOUDINARY_CLOUD_NAME")
+CLOUDINARY_API_KEY = os.getenv("CLOUDINARY_API_KEY")
+CLOUDINARY_API_SECRET = os.getenv("CLOUDINARY_API_SECRET")
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "1.0"))
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "10"))
+SERVER_TIMING = os.getenv("SERVER_TIMING", "true").lower() in ("1", "true", "yes")
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() in ("1", "true", "yes")
+PROFILING_ADMINS = frozenset(name.strip() for name in os.getenv("PROFILING_ADMINS", "").split(",") if name.strip())
+PROFILING_INTERVAL = float(os.getenv("PROFILING_INTERVAL", "0.01"))
+PROFILING_MAX_SECONDS = float(os.getenv("PROFILING_MAX_SECONDS", "60"))
 
 
 """
@@ -16,5 +79,66 @@ i schematu uwierzytelniania OAuth2.
 Attributes:
     SECRET_KEY (str): Klucz sekretny aplikacji.
     ALGORITHM (str): Algorytm uwierzytelniania.
+    JWT_JWKS_FILE (str): Plik JWKS z kluczami JWT (ES256, EdDSA, ...); bez niego tokeny są podpisywane SECRET_KEY.
+    JWT_SIGNING_KID (str): Identyfikator klucza podpisującego; domyślnie ostatni klucz prywatny w pliku JWKS.
+    JWT_JWKS_RELOAD_INTERVAL (float): Co ile sekund sprawdzać, czy plik JWKS się zmienił.
+    JWT_CACHE_MAXSIZE (int): Maksymalna liczba zweryfikowanych tokenów w cache (0 wyłącza cache).
+    REFRESH_TOKEN_EXPIRE_DAYS (float): Maksymalny czas trwania sesji (ważności tokenów odświeżania) w dniach.
+    TOKEN_STORE_BACKEND (str): Magazyn tokenów odświeżania i listy unieważnień: "memory" albo "redis" (REDIS_URL).
     oauth2_scheme (OAuth2PasswordBearer): Schemat uwierzytelniania OAuth2.
+    BCRYPT_ROUNDS (int): Koszt bcrypt (log2 liczby rund) dla nowych hashy haseł.
+    PASSWORD_HASH_EXECUTOR (str): Pula do hashowania haseł: "thread" albo "process".
+    PASSWORD_HASH_WORKERS (int): Liczba wątków lub procesów hashujących hasła.
+    CONTACTS_PAGE_SIZE (int): Domyślna liczba kontaktów na stronie.
+    CONTACTS_MAX_PAGE_SIZE (int): Maksymalna liczba kontaktów na stronie.
+    CONTACTS_STREAM_BATCH_SIZE (int): Liczba wierszy pobieranych naraz przy strumieniowaniu.
+    CONTACTS_BULK_BATCH_SIZE (int): Domyślna liczba wierszy w jednym INSERT przy imporcie.
+    CONTACTS_BULK_MAX_BATCH_SIZE (int): Maksymalna liczba wierszy w jednym INSERT przy imporcie.
+    CONTACTS_BULK_MAX_ERRORS (int): Maksymalna liczba błędów wierszy w raporcie importu.
+    CACHE_BACKEND (str): Backend cache: "memory", "redis" albo "none".
+    REDIS_URL (str): Adres Redisa dla backendu "redis".
+    CONTACT_CACHE_TTL (float): Czas życia kontaktu w cache w sekundach (0 wyłącza cache).
+    CONTACT_CACHE_MAXSIZE (int): Maksymalna liczba kontaktów w cache w pamięci.
+    USER_CACHE_TTL (float): Czas życia zweryfikowanego użytkownika w cache w sekundach (0 wyłącza cache).
+    USER_CACHE_MAXSIZE (int): Maksymalna liczba użytkowników w cache.
+    RATE_LIMIT_BACKEND (str): Backend limitów żądań: "memory", "redis" (wspólny dla wszystkich procesów) albo "none".
+    RATE_LIMIT_MAXSIZE (int): Maksymalna liczba liczników klientów w pamięci.
+    RATE_LIMIT_DEFAULT (str): Limit żądań dla strony głównej, np. "10/minute".
+    RATE_LIMIT_CONTACTS_WRITE (str): Limit tworzenia kontaktów na użytkownika (albo adres IP).
+    RATE_LIMIT_LOGIN (str): Limit prób logowania na adres IP.
+    VERIFICATION_TOKEN_TTL_HOURS (float): Ważność linku weryfikacyjnego w godzinach; niezweryfikowane konto jest potem usuwane.
+    UNVERIFIED_CLEANUP_INTERVAL (float): Co ile sekund usuwać niezweryfikowane konta z wygasłym linkiem (0 wyłącza).
+    MAIL_TRANSPORT (str): Transport poczty: "smtp" albo "memory" (wiadomości zostają w pamięci).
+    SMTP_HOST (str): Adres serwera SMTP.
+    SMTP_PORT (int): Port serwera SMTP.
+    SMTP_SECURITY (str): Szyfrowanie połączenia SMTP: "ssl", "starttls" albo "none".
+    SMTP_USERNAME (str): Login do serwera SMTP.
+    SMTP_PASSWORD (str): Hasło do serwera SMTP (puste pomija logowanie).
+    SMTP_TIMEOUT (float): Limit czasu operacji SMTP w sekundach.
+    MAIL_FROM (str): Nadawca wiadomości; domyślnie SMTP_USERNAME.
+    MAIL_BATCH_SIZE (int): Maksymalna liczba wiadomości wysyłanych jednym połączeniem naraz.
+    MAIL_MAX_RETRIES (int): Liczba ponowień nieudanej wysyłki.
+    MAIL_RETRY_BACKOFF (float): Opóźnienie pierwszego ponowienia w sekundach (kolejne są podwajane).
+    MAIL_DEAD_LETTER_FILE (str): Plik JSON Lines z wiadomościami, których nie udało się wysłać.
+    AVATAR_STORAGE (str): Magazyn awatarów: "local", "s3" albo "cloudinary".
+    AVATAR_LOCAL_DIR (str): Katalog awatarów dla magazynu "local".
+    AVATAR_BASE_URL (str): Prefiks URL awatarów (dla "local" ścieżka, pod którą serwowany jest AVATAR_LOCAL_DIR).
+    AVATAR_S3_BUCKET (str): Bucket dla magazynu "s3".
+    AVATAR_S3_ENDPOINT_URL (str): Adres serwera zgodnego z S3 (np. MinIO); domyślnie AWS.
+    AVATAR_MAX_BYTES (int): Maksymalny rozmiar przesyłanego pliku w bajtach.
+    AVATAR_MAX_PIXELS (int): Maksymalna liczba pikseli obrazu (szerokość * wysokość).
+    AVATAR_SIZE (int): Bok awatara w pikselach.
+    AVATAR_THUMBNAIL_SIZE (int): Bok miniatury w pikselach.
+    AVATAR_WEBP_QUALITY (int): Jakość kodowania WebP (0-100).
+    AVATAR_WORKERS (int): Liczba procesów przetwarzających obrazy.
+    CLOUDINARY_CLOUD_NAME (str): Nazwa chmury Cloudinary dla magazynu "cloudinary" (wymagana, bez domyślnej wartości).
+    CLOUDINARY_API_KEY (str): Klucz API Cloudinary (wymagany).
+    CLOUDINARY_API_SECRET (str): Sekret API Cloudinary (wymagany).
+    SLOW_REQUEST_SECONDS (float): Czas, po którym żądanie jest logowane jako wolne razem z zapytaniami SQL (0 wyłącza).
+    N_PLUS_ONE_THRESHOLD (int): Liczba powtórzeń jednego zapytania SQL w żądaniu zgłaszana jako N+1 (0 wyłącza).
+    SERVER_TIMING (bool): Czy dodawać do odpowiedzi nagłówek Server-Timing z czasem żądania i zapytań SQL.
+    PROFILING_ENABLED (bool): Czy włączyć profilowanie (nagłówek X-Profile i /debug/profile); domyślnie wyłączone.
+    PROFILING_ADMINS (frozenset): Nazwy użytkowników, którzy mogą profilować (lista rozdzielona przecinkami).
+    PROFILING_INTERVAL (float): Odstęp między próbkami stosów w sekundach.
+    PROFILING_MAX_SECONDS (float): Maksymalny czas profilowania całego procesu w sekundach.
 """
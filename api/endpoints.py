@@ -1,18 +1,18 @@
-from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import RedirectResponse
-from fastapi.templating import Jinja2Templates
-from typing import Dict
-from models import User
+from fastapi import APIRouter, FastAPI, Request, HTTPException, Depends, Form
+from fastapi.responses import HTMLResponse, RedirectResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from api.routes import get_templates
 from auth.auths import send_email
+from auth.registration import UserExistsError, register_user, verify_user
+from db.dbs import get_db
 
 
-app = FastAPI()
-
+# Login, registration and e-mail verification pages, included in `main.app`.
+router = APIRouter()
 
-templates = Jinja2Templates(directory="templates")
 
-# Database to store user information
-users_db: Dict[str, Dict[str, str]] = {}
+# Standalone app with the remaining HTML pages; `/` and `/contacts` clash with routes of `main.app`.
+app = FastAPI()
 
 
 @app.get("/")
@@ -26,10 +26,10 @@ def read_root(request: Request):
     Returns:
         TemplateResponse: Response with the index.html template.
     """
-    return templates.TemplateResponse("index.html", {"request": request})
+    return get_templates().TemplateResponse("index.html", {"request": request})
 
 
-@app.get("/login", response_class=HTMLResponse)
+@router.get("/login", response_class=HTMLResponse)
 async def read_login(request: Request):
     """
     Read the login endpoint.
@@ -40,10 +40,10 @@ async def read_login(request: Request):
     Returns:
         TemplateResponse: Response with the login.html template.
     """
-    return templates.TemplateResponse("login.html", {"request": request})
+    return get_templates().TemplateResponse("login.html", {"request": request})
 
 
-@app.post("/login")
+@router.post("/login")
 def login_user(request: Request):
     """
     Login a user.
@@ -57,7 +57,7 @@ def login_user(request: Request):
     return {"message": "Logowanie udane"}
 
 
-@app.get("/register")
+@router.get("/register")
 def read_register(request: Request):
     """
     Read the register endpoint.
@@ -68,30 +68,46 @@ def read_register(request: Request):
     Returns:
         TemplateResponse: Response with the register.html template.
     """
-    return templates.TemplateResponse("register.html", {"request": request})
+    return get_templates().TemplateResponse("register.html", {"request": request})
 
 
-@app.post("/register")
-def register_user(request: Request, user: User):
+@router.post("/register")
+async def register(
+    request: Request,
+    username: str = Form(...),
+    email: str = Form(...),
+    password: str = Form(...),
+    confirm_password: str = Form(...),
+    db: AsyncSession = Depends(get_db)
+):
     """
     Register a new user.
 
+    The account is stored in the `users` table unverified, and a verification
+    link with a random single-use token is queued for e-mail delivery.
+
     Args:
         request (Request): The request object.
-        user (User): The user information to register.
+        username (str): Username of the new user.
+        email (str): E-mail address of the new user.
+        password (str): Password.
+        confirm_password (str): Password repeated.
+        db (AsyncSession, optional): Database session. Defaults to Depends(get_db).
 
     Returns:
         RedirectResponse: Redirects to the welcome page.
     """
-    if user.username in users_db:
+    if password != confirm_password:
+        raise HTTPException(status_code=400, detail="Hasła nie są takie same")
+    try:
+        user, verification_token = await register_user(db, username, email, password)
+    except UserExistsError:
         raise HTTPException(status_code=400, detail="Użytkownik już istnieje")
 
-    verification_token = "some_random_token"
-    send_email(user.email, verification_token)
+    link = str(request.url_for("verify_email", username=user.username, verification_token=verification_token))
+    send_email(user.email, verification_token, link)
 
-    users_db[user.username] = user.dict()
-
-    return RedirectResponse(url="/welcome")
+    return RedirectResponse(url="/welcome", status_code=303)
 
 
 @app.get("/contacts")
@@ -105,10 +121,10 @@ def read_contacts(request: Request):
     Returns:
         TemplateResponse: Response with the contacts.html template.
     """
-    return templates.TemplateResponse("contacts.html", {"request": request})
+    return get_templates().TemplateResponse("contacts.html", {"request": request})
 
 
-@app.get("/welcome")
+@router.get("/welcome")
 def welcome(request: Request):
     """
     Welcome endpoint.
@@ -119,28 +135,26 @@ def welcome(request: Request):
     Returns:
         TemplateResponse: Response with the welcome.html template.
     """
-    return templates.TemplateResponse("welcome.html", {"request": request})
+    return get_templates().TemplateResponse("welcome.html", {"request": request})
 
 
-@app.get("/verify/{username}/{verification_token}")
-def verify_email(username: str, verification_token: str):
+@router.get("/verify/{username}/{verification_token}")
+async def verify_email(username: str, verification_token: str, db: AsyncSession = Depends(get_db)):
     """
     Verify user's email.
 
     Args:
         username (str): Username of the user.
         verification_token (str): Verification token sent to the user's email.
+        db (AsyncSession, optional): Database session. Defaults to Depends(get_db).
 
     Returns:
         RedirectResponse: Redirects to the login page.
     """
-    if username not in users_db:
-        raise HTTPException(status_code=404, detail="Użytkownik nie istnieje")
+    if not await verify_user(db, username, verification_token):
+        raise HTTPException(status_code=400, detail="Nieprawidłowy lub wygasły token weryfikacyjny")
 
-    expected_token = "some_random_token"
-    if verification_token != expected_token:
-        raise HTTPException(status_code=400, detail="Nieprawidłowy token weryfikacyjny")
+    return RedirectResponse(url="/login")
 
-    users_db[username]["verified"] = True
 
-    return RedirectResponse(url="/login")
+app.include_router(router)
@@ -0,0 +1,191 @@
+import csv
+import io
+import zlib
+from enum import Enum
+from sqlalchemy import select
+from db.dbs import AsyncSessionLocal
+from models import Contact
+from schemas import ContactResponse
+
+
+# Rows are serialized into chunks of roughly this size before being sent,
+# so a large export is not written to the socket one tiny line at a time.
+CHUNK_BYTES = 64 * 1024
+
+CSV_FIELDS = list(ContactResponse.model_fields)
+
+
+class ExportFormat(str, Enum):
+    csv = "csv"
+    ndjson = "ndjson"
+    vcard = "vcard"
+
+
+MEDIA_TYPES = {
+    ExportFormat.csv: ("text/csv; charset=utf-8", "csv"),
+    ExportFormat.ndjson: ("application/x-ndjson", "ndjson"),
+    ExportFormat.vcard: ("text/vcard; charset=utf-8", "vcf"),
+}
+
+
+async def iter_contacts(owner_id: int, build_statement=None, batch_size: int = 1000):
+    """
+    Yield contacts of a user in ID order from a server-side cursor.
+
+    The generator owns its session, because the request-scoped one is closed
+    before a streaming response body is sent. Only `batch_size` rows are held
+    in memory at a time, read in order from the (owner_id, id) index.
+
+    Args:
+        owner_id (int): ID of the user whose contacts are read.
+        build_statement (callable, optional): Function `(db, statement) -> statement` narrowing the select.
+        batch_size (int, optional): Rows fetched per round trip. Defaults to 1000.
+
+    Yields:
+        Contact: Contacts ordered by ID.
+    """
+    async with AsyncSessionLocal() as db:
+        statement = select(Contact).where(Contact.owner_id == owner_id)
+        if build_statement is not None:
+            statement = build_statement(db, statement)
+        statement = statement.order_by(Contact.id).execution_options(yield_per=batch_size)
+        async for contact in await db.stream_scalars(statement):
+            yield contact
+
+
+def _as_response(contact) -> ContactResponse:
+    return ContactResponse.model_validate(contact, from_attributes=True)
+
+
+async def to_ndjson(contacts):
+    """
+    Serialize contacts as NDJSON lines.
+    """
+    async for contact in contacts:
+        yield _as_response(contact).model_dump_json() + "\n"
+
+
+async def to_csv(contacts):
+    """
+    Serialize contacts as CSV with a header row.
+    """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_FIELDS, lineterminator="\r\n")
+    writer.writeheader()
+    async for contact in contacts:
+        writer.writerow(_as_response(contact).model_dump())
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _vcard_escape(value) -> str:
+    return (
+        str(value).replace("\\", "\\\\").replace(",", "\\,").replace(";", "\\;")
+        .replace("\r\n", "\\n").replace("\n", "\\n")
+    )
+
+
+def _vcard_fold(line: str) -> str:
+    # RFC 6350: lines longer than 75 octets are folded with CRLF + space.
+    encoded = line.encode("utf-8")
+    if len(encoded) <= 75:
+        return line + "\r\n"
+    parts, start = [], 0
+    while start < len(encoded):
+        end = min(start + (75 if not parts else 74), len(encoded))
+        while end < len(encoded) and (encoded[end] & 0xC0) == 0x80:
+            end -= 1
+        parts.append(encoded[start:end].decode("utf-8"))
+        start = end
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def contact_to_vcard(contact) -> str:
+    """
+    Render a single contact as a vCard 3.0 entry.
+
+    Args:
+        contact (Contact): Contact to render.
+
+    Returns:
+        str: vCard entry with CRLF line endings.
+    """
+    lines = [
+        "BEGIN:VCARD",
+        "VERSION:3.0",
+        f"UID:contact-{contact.id}",
+        f"N:{_vcard_escape(contact.last_name or '')};{_vcard_escape(contact.first_name or '')};;;",
+        f"FN:{_vcard_escape(' '.join(filter(None, [contact.first_name, contact.last_name])))}",
+    ]
+    if contact.email:
+        lines.append(f"EMAIL;TYPE=INTERNET:{_vcard_escape(contact.email)}")
+    if contact.phone_number:
+        lines.append(f"TEL;TYPE=VOICE:{_vcard_escape(contact.phone_number)}")
+    if contact.birth_date:
+        lines.append(f"BDAY:{contact.birth_date.isoformat()}")
+    if contact.additional_data:
+        lines.append(f"NOTE:{_vcard_escape(contact.additional_data)}")
+    lines.append("END:VCARD")
+    return "".join(_vcard_fold(line) for line in lines)
+
+
+async def to_vcard(contacts):
+    """
+    Serialize contacts as a stream of vCard 3.0 entries.
+    """
+    async for contact in contacts:
+        yield contact_to_vcard(contact)
+
+
+SERIALIZERS = {
+    ExportFormat.csv: to_csv,
+    ExportFormat.ndjson: to_ndjson,
+    ExportFormat.vcard: to_vcard,
+}
+
+
+async def encode_chunks(parts, chunk_bytes: int = CHUNK_BYTES):
+    """
+    Encode text parts to UTF-8 and join them into chunks of about `chunk_bytes`.
+    """
+    pending, size = [], 0
+    async for part in parts:
+        data = part.encode("utf-8")
+        pending.append(data)
+        size += len(data)
+        if size >= chunk_bytes:
+            yield b"".join(pending)
+            pending, size = [], 0
+    if pending:
+        yield b"".join(pending)
+
+
+async def gzip_chunks(chunks, level: int = 6):
+    """
+    Compress a stream of byte chunks into a single gzip stream.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_stream(export_format: ExportFormat, contacts, compress: bool = False):
+    """
+    Build the byte stream of an export.
+
+    Args:
+        export_format (ExportFormat): Output format.
+        contacts (AsyncIterator[Contact]): Contacts to export.
+        compress (bool, optional): Whether to gzip the output. Defaults to False.
+
+    Returns:
+        AsyncIterator[bytes]: Chunks of the response body.
+    """
+    chunks = encode_chunks(SERIALIZERS[export_format](contacts))
+    return gzip_chunks(chunks) if compress else chunks
@@ -0,0 +1,197 @@
+import logging
+import re
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+from api.config import N_PLUS_ONE_THRESHOLD, SERVER_TIMING, SLOW_REQUEST_SECONDS
+from metrics import Counter, Histogram
+
+
+logger = logging.getLogger(__name__)
+
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Time spent handling a request.", ["method", "route", "status"],
+)
+REQUEST_DB_SECONDS = Histogram(
+    "http_request_db_seconds", "Time spent executing SQL statements while handling a request.", ["method", "route"],
+)
+REQUEST_QUERIES = Histogram(
+    "http_request_queries", "Number of SQL statements executed while handling a request.", ["method", "route"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 250),
+)
+N_PLUS_ONE = Counter(
+    "http_n_plus_one_total", "Number of requests that repeated one SQL statement N_PLUS_ONE_THRESHOLD times or more.",
+    ["method", "route"],
+)
+
+# Distinct statements kept per request; further ones still count towards the totals.
+MAX_STATEMENTS = 100
+# Statements listed in a slow request log entry.
+LOGGED_STATEMENTS = 5
+
+_IN_LIST = re.compile(r"\(\s*(?:\?|%s|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%s|%\(\w+\)s|:\w+))+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+_current = ContextVar("request_stats", default=None)
+
+
+def normalize_statement(statement: str) -> str:
+    """
+    Collapse whitespace and expanded `IN (?, ?, ...)` lists, so that the same query
+    with different bound values is counted as one statement.
+    """
+    return _IN_LIST.sub("(...)", _WHITESPACE.sub(" ", statement).strip())
+
+
+@dataclass
+class RequestStats:
+    """
+    SQL statements executed while handling one request.
+
+    `statements` maps a normalized statement to `[executions, seconds]`.
+    """
+    queries: int = 0
+    db_seconds: float = 0.0
+    statements: dict = field(default_factory=dict)
+    slowest_seconds: float = 0.0
+    slowest_statement: str = None
+
+    def record(self, statement: str, seconds: float):
+        self.queries += 1
+        self.db_seconds += seconds
+        key = normalize_statement(statement)
+        entry = self.statements.get(key)
+        if entry is None and len(self.statements) < MAX_STATEMENTS:
+            entry = self.statements[key] = [0, 0.0]
+        if entry is not None:
+            entry[0] += 1
+            entry[1] += seconds
+        if seconds >= self.slowest_seconds:
+            self.slowest_seconds, self.slowest_statement = seconds, key
+
+    def most_repeated(self):
+        """
+        Return `(statement, executions)` of the statement executed most often, or `(None, 0)`.
+        """
+        if not self.statements:
+            return None, 0
+        statement, (count, _) = max(self.statements.items(), key=lambda item: item[1][0])
+        return statement, count
+
+    def server_timing(self, elapsed: float) -> str:
+        """
+        Return the `Server-Timing` header value: total and database time in milliseconds.
+        """
+        return f'app;dur={elapsed * 1000:.1f}, db;dur={self.db_seconds * 1000:.1f};desc="{self.queries} queries"'
+
+
+def current_request_stats():
+    """
+    Return the statistics of the request being handled, or None outside a request.
+    """
+    return _current.get()
+
+
+def instrument_queries(engine):
+    """
+    Attach cursor execution hooks that add SQL statements to the current request's statistics.
+
+    Statements executed outside a request (migrations, scripts, background tasks
+    started before the request) are not timed.
+
+    Args:
+        engine (Engine): A synchronous engine (`async_engine.sync_engine` for an async one).
+    """
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if _current.get() is not None:
+            conn.info["query_started"] = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        stats = _current.get()
+        started = conn.info.pop("query_started", None)
+        if stats is not None and started is not None:
+            stats.record(statement, time.perf_counter() - started)
+
+
+def _route_name(scope) -> str:
+    # The route template keeps the label cardinality bounded; unmatched paths share one label.
+    return getattr(scope.get("route"), "path", None) or "unmatched"
+
+
+class RequestTimingMiddleware:
+    """
+    ASGI middleware recording per-request wall time, database time and SQL statement counts.
+
+    Adds a `Server-Timing` header to every response, feeds the per-route histograms
+    exposed on `/metrics`, logs requests slower than `slow_request_seconds` together
+    with their slowest statements and flags requests that repeat one statement at
+    least `n_plus_one_threshold` times (a typical N+1 query pattern).
+
+    Args:
+        app: The wrapped ASGI application.
+        slow_request_seconds (float, optional): Slow request threshold, 0 disables the log. Defaults to SLOW_REQUEST_SECONDS.
+        n_plus_one_threshold (int, optional): Repetitions of one statement flagged as N+1, 0 disables
+            the check. Defaults to N_PLUS_ONE_THRESHOLD.
+        server_timing (bool, optional): Whether to add the `Server-Timing` header. Defaults to SERVER_TIMING.
+    """
+
+    def __init__(self, app, slow_request_seconds: float = SLOW_REQUEST_SECONDS,
+                 n_plus_one_threshold: int = N_PLUS_ONE_THRESHOLD, server_timing: bool = SERVER_TIMING):
+        self.app = app
+        self.slow_request_seconds = slow_request_seconds
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing:
+                    headers = MutableHeaders(scope=message)
+                    headers.append("Server-Timing", stats.server_timing(time.perf_counter() - started))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            self.record(scope, stats, status, time.perf_counter() - started)
+
+    def record(self, scope, stats: RequestStats, status: int, elapsed: float):
+        """
+        Update the metrics for a finished request and log it if it was slow or looked like N+1.
+        """
+        method, route = scope["method"], _route_name(scope)
+        REQUEST_SECONDS.observe(elapsed, method=method, route=route, status=status)
+        REQUEST_DB_SECONDS.observe(stats.db_seconds, method=method, route=route)
+        REQUEST_QUERIES.observe(stats.queries, method=method, route=route)
+
+        statement, repeated = stats.most_repeated()
+        if self.n_plus_one_threshold and repeated >= self.n_plus_one_threshold:
+            N_PLUS_ONE.inc(method=method, route=route)
+            logger.warning(
+                "Possible N+1 queries in %s %s: statement executed %d times: %s",
+                method, route, repeated, statement[:500],
+            )
+        if self.slow_request_seconds and elapsed >= self.slow_request_seconds:
+            slowest = sorted(stats.statements.items(), key=lambda item: item[1][1], reverse=True)[:LOGGED_STATEMENTS]
+            logger.warning(
+                "Slow request %s %s -> %d: %.1f ms, db %.1f ms in %d queries, slowest %.1f ms%s",
+                method, scope["path"], status, elapsed * 1000, stats.db_seconds * 1000, stats.queries,
+                stats.slowest_seconds * 1000,
+                "".join(f"\n  {count}x {seconds * 1000:.1f} ms: {text[:500]}" for text, (count, seconds) in slowest),
+            )
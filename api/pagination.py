@@ -0,0 +1,67 @@
+import base64
+import binascii
+import json
+from fastapi import HTTPException
+
+
+def encode_cursor(last_id: int) -> str:
+    """
+    Encode the id of the last returned row into an opaque cursor.
+
+    Args:
+        last_id (int): ID of the last row on the current page.
+
+    Returns:
+        str: URL-safe cursor to pass back as `cursor` for the next page.
+    """
+    raw = json.dumps({"id": last_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    """
+    Decode a cursor produced by `encode_cursor`.
+
+    Args:
+        cursor (str): Opaque cursor received from the client.
+
+    Raises:
+        HTTPException: 400 if the cursor is malformed.
+
+    Returns:
+        int: ID after which the next page starts.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        last_id = json.loads(base64.urlsafe_b64decode(padded))["id"]
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(last_id, int):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return last_id
+
+
+async def keyset_page(db, statement, column, cursor: str = None, limit: int = 50):
+    """
+    Fetch one page of a select statement using keyset pagination on a unique, indexed column.
+
+    Only `limit + 1` rows are read from the database, so the cost of a page does
+    not depend on how deep into the table it is.
+
+    Args:
+        db (AsyncSession): Database session.
+        statement (Select): Select statement to paginate.
+        column (Column): Unique column to order and seek by (usually the primary key).
+        cursor (str, optional): Cursor returned with the previous page. Defaults to None.
+        limit (int, optional): Page size. Defaults to 50.
+
+    Returns:
+        tuple: List of rows on the page and the cursor of the next page (None on the last page).
+    """
+    if cursor:
+        statement = statement.where(column > decode_cursor(cursor))
+    rows = (await db.scalars(statement.order_by(column).limit(limit + 1))).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(getattr(rows[-1], column.key))
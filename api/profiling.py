@@ -0,0 +1,231 @@
+import asyncio
+import collections
+import os
+import sys
+import threading
+import time
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from api.config import (
+    PROFILING_ENABLED, PROFILING_ADMINS, PROFILING_INTERVAL, PROFILING_MAX_SECONDS,
+)
+from auth.auths import get_current_active_user
+from auth.jwts import decode_jwt_token
+from auth.tokens import is_revoked
+from models import User
+
+
+router = APIRouter()
+
+# Request header asking for a profile of the request instead of its response.
+PROFILE_HEADER = b"x-profile"
+# Frames kept per stack; deeper frames (closest to the thread's entry point) are dropped.
+MAX_DEPTH = 128
+# Distinct stacks kept per profile; further samples are counted under "[other]".
+MAX_STACKS = 20000
+# Leaf functions of threads waiting for work (event loop selector, idle thread pool workers).
+IDLE_FUNCTIONS = {("selectors.py", "select"), ("threading.py", "wait"), ("queue.py", "get"), ("thread.py", "_worker")}
+
+# Only one profile at a time, so the sampling overhead stays bounded.
+_profiling = threading.Lock()
+
+
+class StackSampler:
+    """
+    Sampling profiler collecting the Python stacks of all threads in collapsed-stack format.
+
+    A background thread reads `sys._current_frames()` every `interval` seconds, so
+    the cost depends on the sampling rate and stack depth, not on the profiled code.
+    The output (`frame;frame;... count` lines) can be rendered by `flamegraph.pl`,
+    speedscope or inferno.
+
+    Args:
+        interval (float, optional): Seconds between samples. Defaults to PROFILING_INTERVAL.
+        include_idle (bool, optional): Whether to keep samples of threads waiting for work. Defaults to False.
+    """
+
+    def __init__(self, interval: float = PROFILING_INTERVAL, include_idle: bool = False):
+        self.interval = max(interval, 0.001)
+        self.include_idle = include_idle
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.sampling_seconds = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sample(self):
+        """
+        Add the current stack of every other thread to the profile.
+        """
+        started = time.perf_counter()
+        own = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            code = frame.f_code
+            if not self.include_idle and (os.path.basename(code.co_filename), code.co_name) in IDLE_FUNCTIONS:
+                continue
+            stack = []
+            while frame is not None and len(stack) < MAX_DEPTH:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            stack.append(names.get(ident, f"thread-{ident}"))
+            key = ";".join(reversed(stack))
+            if key not in self.stacks and len(self.stacks) >= MAX_STACKS:
+                key = "[other]"
+            self.stacks[key] += 1
+        self.samples += 1
+        self.sampling_seconds += time.perf_counter() - started
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self) -> str:
+        """
+        Return the profile in collapsed-stack format, most frequent stacks first.
+        """
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def response(self, elapsed: float, **headers) -> PlainTextResponse:
+        """
+        Return the profile as a plain text response with the sampling statistics in headers.
+        """
+        return PlainTextResponse(self.collapsed(), headers={
+            "X-Profile-Samples": str(self.samples),
+            "X-Profile-Seconds": f"{elapsed:.3f}",
+            "X-Profile-Overhead": f"{self.sampling_seconds / elapsed if elapsed else 0.0:.4f}",
+            "Cache-Control": "no-store",
+            **headers,
+        })
+
+
+def _busy():
+    return HTTPException(status_code=409, detail="Another profile is being captured")
+
+
+def get_admin_user(current_user: User = Depends(get_current_active_user)):
+    """
+    Allow only users listed in PROFILING_ADMINS, and only when profiling is enabled.
+
+    Raises:
+        HTTPException: 404 when profiling is disabled, 403 for other users.
+    """
+    if not PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if current_user.username not in PROFILING_ADMINS:
+        raise HTTPException(status_code=403, detail="Not allowed to profile")
+    return current_user
+
+
+@router.get("/debug/profile", response_class=PlainTextResponse, include_in_schema=False)
+async def profile_worker(
+    seconds: float = Query(10.0, gt=0, le=PROFILING_MAX_SECONDS),
+    interval: float = Query(PROFILING_INTERVAL, ge=0.001, le=1.0),
+    idle: bool = False,
+    current_user: User = Depends(get_admin_user),
+):
+    """
+    Sample every thread of this worker for `seconds` and return the collapsed stacks.
+
+    Args:
+        seconds (float): Profiling time, at most PROFILING_MAX_SECONDS.
+        interval (float): Seconds between samples.
+        idle (bool): Whether to keep samples of threads waiting for work.
+        current_user (User): The authenticated admin.
+
+    Raises:
+        HTTPException: 409 if another profile is being captured.
+
+    Returns:
+        PlainTextResponse: The profile in collapsed-stack format.
+    """
+    if not _profiling.acquire(blocking=False):
+        raise _busy()
+    try:
+        sampler = StackSampler(interval, include_idle=idle)
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            sampler.stop()
+        return sampler.response(time.perf_counter() - started)
+    finally:
+        _profiling.release()
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware profiling single requests sent with the `X-Profile` header.
+
+    The request is handled normally, but its response is replaced by the collapsed
+    stacks sampled while it ran; the original status is returned in `X-Profile-Status`.
+    The header is ignored unless profiling is enabled and the request carries a valid
+    access token of a user listed in PROFILING_ADMINS. The stacks of every thread are
+    sampled, so requests handled concurrently by the same worker show up as well.
+
+    Args:
+        app: The wrapped ASGI application.
+        enabled (bool, optional): Defaults to PROFILING_ENABLED.
+        admins (frozenset, optional): Usernames allowed to profile. Defaults to PROFILING_ADMINS.
+        interval (float, optional): Seconds between samples. Defaults to PROFILING_INTERVAL.
+    """
+
+    def __init__(self, app, enabled: bool = PROFILING_ENABLED, admins: frozenset = PROFILING_ADMINS,
+                 interval: float = PROFILING_INTERVAL):
+        self.app = app
+        self.enabled = enabled
+        self.admins = admins
+        self.interval = interval
+
+    async def is_admin(self, headers: dict) -> bool:
+        scheme, _, token = headers.get(b"authorization", b"").decode("latin-1").partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            return False
+        try:
+            claims = decode_jwt_token(token)
+        except HTTPException:
+            return False
+        return claims.get("sub") in self.admins and not await is_revoked(claims)
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        if PROFILE_HEADER not in headers or not await self.is_admin(headers):
+            await self.app(scope, receive, send)
+            return
+        if not _profiling.acquire(blocking=False):
+            await PlainTextResponse(_busy().detail, status_code=409)(scope, receive, send)
+            return
+        status = 500
+
+        async def discard(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+
+        try:
+            sampler = StackSampler(self.interval)
+            started = time.perf_counter()
+            sampler.start()
+            try:
+                await self.app(scope, receive, discard)
+            finally:
+                sampler.stop()
+            response = sampler.response(time.perf_counter() - started, **{"X-Profile-Status": str(status)})
+        finally:
+            _profiling.release()
+        await response(scope, receive, send)
@@ -0,0 +1,252 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from fastapi import HTTPException, Request, Response
+from api.config import RATE_LIMIT_BACKEND, RATE_LIMIT_MAXSIZE, REDIS_URL
+from auth.jwts import decode_jwt_token
+from cache import redis_client
+from metrics import Counter
+
+
+RATE_LIMITED = Counter("rate_limit_rejected_total", "Number of requests rejected by a rate limit.", ["limit"])
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+def parse_rate(rate: str):
+    """
+    Parse a rate such as "10/minute" or "100/30s".
+
+    Args:
+        rate (str): Number of requests, a slash and a period name or a number of seconds with "s".
+
+    Returns:
+        tuple: (limit, period in seconds).
+    """
+    count, _, period = rate.partition("/")
+    period = period.strip().lower()
+    if period.endswith("s") and period[:-1].isdigit():
+        seconds = int(period[:-1])
+    else:
+        seconds = PERIODS.get(period.rstrip("s"))
+    if not count.strip().isdigit() or not seconds:
+        raise ValueError(f"Invalid rate: {rate!r}")
+    return int(count), seconds
+
+
+@dataclass
+class RateLimitResult:
+    """
+    Outcome of a single rate limit check.
+    """
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_after: float
+    retry_after: float
+
+    def headers(self, period: int) -> dict:
+        """
+        Return the `RateLimit-*` headers (and `Retry-After` for a rejected request).
+        """
+        headers = {
+            "RateLimit-Limit": str(self.limit),
+            "RateLimit-Remaining": str(self.remaining),
+            "RateLimit-Reset": str(math.ceil(self.reset_after)),
+            "RateLimit-Policy": f"{self.limit};w={period}",
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(1, math.ceil(self.retry_after)))
+        return headers
+
+
+def _token_bucket(tokens: float, updated_at: float, now: float, capacity: int, rate: float):
+    # Refill the bucket for the time since the last request and take one token if available.
+    tokens = min(capacity, tokens + max(0.0, now - updated_at) * rate)
+    allowed = tokens >= 1
+    if allowed:
+        tokens -= 1
+    return allowed, tokens
+
+
+def _result(allowed: bool, tokens: float, capacity: int, rate: float) -> RateLimitResult:
+    return RateLimitResult(
+        allowed=allowed,
+        limit=capacity,
+        remaining=int(tokens),
+        reset_after=(capacity - tokens) / rate,
+        retry_after=0.0 if allowed else (1 - tokens) / rate,
+    )
+
+
+class MemoryRateLimiter:
+    """
+    Token-bucket rate limiter keeping the buckets in process memory.
+
+    Each key stores only its token count and the time of the last update, so
+    a check is O(1) in time and memory. At most `maxsize` buckets are kept;
+    the least recently used ones are dropped first (a dropped bucket starts
+    full again).
+
+    Args:
+        maxsize (int, optional): Maximum number of buckets. Defaults to 100000.
+    """
+
+    def __init__(self, maxsize: int = 100000):
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def hit(self, key: str, limit: int, period: float) -> RateLimitResult:
+        """
+        Take one request from the bucket of `key`.
+
+        Args:
+            key (str): Client key, e.g. "user:alice" or "ip:10.0.0.1".
+            limit (int): Bucket capacity (requests allowed in a burst).
+            period (float): Seconds needed to refill a full bucket.
+
+        Returns:
+            RateLimitResult: Whether the request is allowed and the current quota.
+        """
+        return self.hit_nowait(key, limit, period)
+
+    def hit_nowait(self, key: str, limit: int, period: float, now: float = None) -> RateLimitResult:
+        rate = limit / period
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(key, (limit, now))
+            allowed, tokens = _token_bucket(tokens, updated_at, now, limit, rate)
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return _result(allowed, tokens, limit, rate)
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+# KEYS[1] - bucket key; ARGV - capacity, refill rate (tokens/s).
+# The time is read from the Redis server, so clock skew between app instances cannot corrupt
+# a shared bucket (TIME before a write requires effects replication, the default since Redis 5).
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1])
+local updated_at = tonumber(state[2])
+if tokens == nil then
+    tokens = capacity
+    updated_at = now
+end
+tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate * 1000) + 1000)
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisRateLimiter:
+    """
+    Token-bucket rate limiter shared by all workers through Redis.
+
+    The refill and the decrement run in one Lua script, so concurrent requests
+    from several processes cannot overspend a bucket. Buckets expire once they
+    would be full again.
+
+    Args:
+        client (redis.asyncio.Redis): Redis client.
+        prefix (str, optional): Key prefix. Defaults to "ratelimit".
+    """
+
+    def __init__(self, client, prefix: str = "ratelimit"):
+        self.client = client
+        self.prefix = prefix
+        self._script = client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    async def hit(self, key: str, limit: int, period: float) -> RateLimitResult:
+        """
+        Take one request from the bucket of `key`. See `MemoryRateLimiter.hit`.
+        """
+        rate = limit / period
+        allowed, tokens = await self._script(keys=[f"{self.prefix}:{key}"], args=[limit, rate])
+        return _result(bool(allowed), float(tokens), limit, rate)
+
+
+class NullRateLimiter:
+    """
+    Rate limiter that allows every request (rate limiting disabled).
+    """
+
+    async def hit(self, key: str, limit: int, period: float) -> RateLimitResult:
+        return RateLimitResult(True, limit, limit, 0.0, 0.0)
+
+
+def create_rate_limiter(backend: str, redis_url: str = None, maxsize: int = 100000):
+    """
+    Create a rate limiter for the given backend ("memory", "redis" or "none").
+    """
+    if backend == "none":
+        return NullRateLimiter()
+    if backend == "redis":
+        return RedisRateLimiter(redis_client(redis_url))
+    if backend == "memory":
+        return MemoryRateLimiter(maxsize)
+    raise ValueError(f"Unknown rate limit backend: {backend}")
+
+
+def client_key(request: Request) -> str:
+    """
+    Identify the client of a request: the token's subject if it carries a valid
+    bearer token, otherwise the client IP address.
+    """
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and token:
+        try:
+            subject = decode_jwt_token(token).get("sub")
+        except HTTPException:
+            subject = None
+        if subject:
+            return f"user:{subject}"
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+
+def rate_limit(name: str, rate: str, backend=None, key_func=client_key):
+    """
+    Build a dependency enforcing a rate limit on an endpoint.
+
+    Allowed requests get `RateLimit-*` headers; rejected ones fail with 429
+    and `Retry-After`.
+
+    Args:
+        name (str): Name of the limit, used in the bucket key and in metrics.
+        rate (str): Allowed rate, e.g. "10/minute" (see `parse_rate`).
+        backend (optional): Rate limiter. Defaults to the module's `limiter`, looked up per request.
+        key_func (callable, optional): Function `(request) -> str` identifying the client. Defaults to `client_key`.
+
+    Returns:
+        callable: FastAPI dependency.
+    """
+    limit, period = parse_rate(rate)
+
+    async def dependency(request: Request, response: Response):
+        result = await (backend if backend is not None else limiter).hit(f"{name}:{key_func(request)}", limit, period)
+        headers = result.headers(period)
+        if not result.allowed:
+            RATE_LIMITED.inc(limit=name)
+            raise HTTPException(status_code=429, detail="Rate limit exceeded.", headers=headers)
+        response.headers.update(headers)
+
+    return dependency
+
+
+limiter = create_rate_limiter(RATE_LIMIT_BACKEND, REDIS_URL, RATE_LIMIT_MAXSIZE)
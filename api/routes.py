@@ -1,17 +1,28 @@
+from functools import lru_cache
 from fastapi import APIRouter, Depends, Request
-from auth.auths import refresh_access_token
+from auth.auths import refresh_access_token, revoke_access_token
 from fastapi.responses import HTMLResponse
-from fastapi.templating import Jinja2Templates
+from sqlalchemy.ext.asyncio import AsyncSession
+from api.config import RATE_LIMIT_DEFAULT, RATE_LIMIT_LOGIN
+from api.ratelimit import rate_limit
+from db.dbs import get_db
 from models import Token
+from schemas import TokenRefresh
 
 
 router = APIRouter()
 
 
-templates = Jinja2Templates(directory="templates")
+@lru_cache(maxsize=None)
+def get_templates():
+    """
+    Return the HTML templates (jinja2 is imported on first use, not at startup).
+    """
+    from fastapi.templating import Jinja2Templates
+    return Jinja2Templates(directory="templates")
 
 
-@router.get("/", response_class=HTMLResponse)
+@router.get("/", response_class=HTMLResponse, dependencies=[Depends(rate_limit("root", RATE_LIMIT_DEFAULT))])
 def read_root(request: Request):
     """
     Read the root endpoint.
@@ -22,18 +33,29 @@ def read_root(request: Request):
     Returns:
         TemplateResponse: Response with the index.html template.
     """
-    return templates.TemplateResponse("index.html", {"request": request, "message": "Hello, world!"})
+    return get_templates().TemplateResponse("index.html", {"request": request, "message": "Hello, world!"})
 
 
-@router.post("/refresh-token/", response_model=Token)
-async def refresh_token(current_token: str = Depends(refresh_access_token)):
+@router.post("/refresh-token/", response_model=Token, dependencies=[Depends(rate_limit("refresh", RATE_LIMIT_LOGIN))])
+async def refresh_token(body: TokenRefresh, db: AsyncSession = Depends(get_db)):
     """
-    Refresh access token.
+    Exchange a refresh token for a new access token and a new refresh token.
+
+    Refresh tokens are single-use: presenting one that was already used
+    revokes the whole session.
 
     Args:
-        current_token (str): The current access token.
+        body (TokenRefresh): The refresh token from the login or the previous refresh.
+        db (AsyncSession): Database session.
 
     Returns:
-        Token: Response with the new access token.
+        Token: Response with the new access token and refresh token.
+    """
+    return await refresh_access_token(body.refresh_token, db)
+
+
+@router.post("/revoke-token/", status_code=204, dependencies=[Depends(revoke_access_token)])
+async def revoke_token():
+    """
+    Log out: revoke the current access token and its session.
     """
-    return current_token
@@ -1,62 +1,167 @@
+import json
+import os
+import tempfile
+import time
 import unittest
 from unittest.mock import patch, MagicMock
-from datetime import timedelta
+from datetime import datetime, timedelta
 from jose import jwt
 from fastapi import HTTPException, status
 from jwts import create_jwt_token, decode_jwt_token
-from auths import authenticate_user, create_access_token, login_for_access_token, refresh_access_token, get_current_user, get_current_active_user, send_email
+from keys import KeySet, generate_key
+import jwts
+from passlib.context import CryptContext
+from auths import get_user, set_user_active, change_password, authenticate_user, create_access_token, login_for_access_token, refresh_access_token, revoke_access_token, get_current_user, get_current_active_user, send_email
+from auth.tokens import MemoryTokenStore, RedisTokenStore
+from auth.registration import UserExistsError, register_user, verify_user, delete_stale_unverified_users
+from auth.mailer import DeadLetterFile, MailQueue, MemoryTransport, SMTPTransport
+from email.mime.text import MIMEText
+import smtplib
 from api.config import SECRET_KEY, ALGORITHM
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from models import Base, User
+from cache import MemoryCache
+import passwords
 
 
-class TestAuth(unittest.TestCase):
+class TestAuth(unittest.IsolatedAsyncioTestCase):
 
-    def test_authenticate_user_correct_credentials(self):
-        user = authenticate_user("test", "testpassword")
+    async def asyncSetUp(self):
+        context = CryptContext(
+            schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=4, bcrypt__min_rounds=4, bcrypt__max_rounds=4
+        )
+        context_patcher = patch("auth.passwords.pwd_context", context)
+        context_patcher.start()
+        self.addCleanup(context_patcher.stop)
+        cache_patcher = patch("auths.user_cache", MemoryCache("users-test", ttl=60, maxsize=100))
+        self.user_cache = cache_patcher.start()
+        self.addCleanup(cache_patcher.stop)
+        store_patcher = patch("auth.tokens.store", MemoryTokenStore())
+        store_patcher.start()
+        self.addCleanup(store_patcher.stop)
+
+        self.engine = create_async_engine("sqlite+aiosqlite://")
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.db = AsyncSession(self.engine, expire_on_commit=False)
+        self.db.add(User(username="test", email="test@example.com", hashed_password=context.hash("testpassword")))
+        await self.db.commit()
+
+    async def asyncTearDown(self):
+        await self.db.close()
+        await self.engine.dispose()
+
+    async def test_authenticate_user_correct_credentials(self):
+        user = await authenticate_user(self.db, "test", "testpassword")
         self.assertIsNotNone(user)
         self.assertEqual(user.username, "test")
         self.assertEqual(user.email, "test@example.com")
-        self.assertEqual(user.hashed_password, "testpassword")
+        self.assertTrue(user.hashed_password.startswith("$2b$04$"))
+
+    async def test_authenticate_user_incorrect_credentials(self):
+        user = await authenticate_user(self.db, "wrong", "wrongpassword")
+        self.assertIsNone(user)
 
-    def test_authenticate_user_incorrect_credentials(self):
-        user = authenticate_user("wrong", "wrongpassword")
+    async def test_authenticate_user_wrong_password(self):
+        user = await authenticate_user(self.db, "test", "wrongpassword")
         self.assertIsNone(user)
 
+    async def test_authenticate_user_rehashes_on_cost_change(self):
+        context = CryptContext(
+            schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=5, bcrypt__min_rounds=5, bcrypt__max_rounds=5
+        )
+        with patch("auth.passwords.pwd_context", context):
+            user = await authenticate_user(self.db, "test", "testpassword")
+        self.assertTrue(user.hashed_password.startswith("$2b$05$"))
+
+    async def test_authenticate_inactive_user(self):
+        user = await get_user(self.db, "test")
+        await set_user_active(self.db, user, False)
+        self.assertIsNone(await authenticate_user(self.db, "test", "testpassword"))
+
     def test_create_access_token(self):
         token = create_access_token({"sub": "test"}, timedelta(minutes=30))
         self.assertTrue(isinstance(token, str))
 
     @patch("auths.create_access_token", return_value="valid_access_token")
-    def test_login_for_access_token_success(self, mock_create_access_token):
+    async def test_login_for_access_token_success(self, mock_create_access_token):
         form_data = MagicMock()
         form_data.username = "test"
         form_data.password = "testpassword"
-        response = login_for_access_token(form_data)
+        response = await login_for_access_token(form_data, self.db)
         self.assertEqual(response["access_token"], "valid_access_token")
 
-    def test_login_for_access_token_failure(self):
+    async def test_login_for_access_token_failure(self):
         form_data = MagicMock()
         form_data.username = "wrong"
         form_data.password = "wrongpassword"
         with self.assertRaises(HTTPException):
-            login_for_access_token(form_data)
+            await login_for_access_token(form_data, self.db)
 
-    def test_refresh_access_token(self):
-        token = "valid_access_token"
-        refreshed_token = refresh_access_token(token)
+    async def _login(self):
+        form_data = MagicMock()
+        form_data.username = "test"
+        form_data.password = "testpassword"
+        return await login_for_access_token(form_data, self.db)
+
+    async def test_refresh_access_token(self):
+        tokens = await self._login()
+        refreshed_token = await refresh_access_token(tokens["refresh_token"], self.db)
         self.assertTrue(isinstance(refreshed_token, dict))
         self.assertIn("access_token", refreshed_token)
         self.assertIn("token_type", refreshed_token)
+        self.assertNotEqual(refreshed_token["refresh_token"], tokens["refresh_token"])
+        self.assertEqual(decode_jwt_token(refreshed_token["access_token"])["sid"], decode_jwt_token(tokens["access_token"])["sid"])
+
+    async def test_refresh_token_reuse_revokes_session(self):
+        tokens = await self._login()
+        refreshed_token = await refresh_access_token(tokens["refresh_token"], self.db)
+        with self.assertRaises(HTTPException):
+            await refresh_access_token(tokens["refresh_token"], self.db)
+        with self.assertRaises(HTTPException):
+            await refresh_access_token(refreshed_token["refresh_token"], self.db)
+        with self.assertRaises(HTTPException):
+            await get_current_user(refreshed_token["access_token"], self.db)
+
+    async def test_revoked_access_token_is_rejected(self):
+        tokens = await self._login()
+        user = await get_current_user(tokens["access_token"], self.db)
+        self.assertEqual(user.username, "test")
+        await revoke_access_token(tokens["access_token"])
+        with self.assertRaises(HTTPException):
+            await get_current_user(tokens["access_token"], self.db)
+        with self.assertRaises(HTTPException):
+            await refresh_access_token(tokens["refresh_token"], self.db)
 
-    def test_get_current_user_valid_token(self):
+    async def test_get_current_user_valid_token(self):
         token = "valid_access_token"
         with patch("auths.decode_jwt_token", return_value={"sub": "test"}):
-            user = get_current_user(token)
+            user = await get_current_user(token, self.db)
         self.assertIsNotNone(user)
+        self.assertEqual(user.email, "test@example.com")
 
-    def test_get_current_user_invalid_token(self):
+    async def test_get_current_user_invalid_token(self):
         token = "invalid_access_token"
         with self.assertRaises(HTTPException):
-            get_current_user(token)
+            await get_current_user(token, self.db)
+
+    async def test_get_current_user_is_cached(self):
+        with patch("auths.decode_jwt_token", return_value={"sub": "test"}):
+            await get_current_user("token", self.db)
+            with patch("auths.get_user") as mock_get_user:
+                user = await get_current_user("token", self.db)
+        mock_get_user.assert_not_called()
+        self.assertEqual(user.username, "test")
+
+    async def test_password_change_and_deactivation_invalidate_cache(self):
+        with patch("auths.decode_jwt_token", return_value={"sub": "test"}):
+            user = await get_current_user("token", self.db)
+            await change_password(self.db, await get_user(self.db, "test"), "newpassword")
+            self.assertIsNone(self.user_cache.get_nowait("test"))
+            await get_current_user("token", self.db)
+            await set_user_active(self.db, await get_user(self.db, "test"), False)
+            with self.assertRaises(HTTPException):
+                get_current_active_user(await get_current_user("token", self.db))
 
     def test_get_current_active_user_active_user(self):
         user = MagicMock()
@@ -67,14 +172,175 @@ class TestAuth(unittest.TestCase):
         with self.assertRaises(HTTPException):
             get_current_active_user(None)
 
-    @patch("auths.smtplib.SMTP_SSL")
-    def test_send_email(self, mock_smtp):
+    @patch("auths.mail_queue")
+    def test_send_email(self, mock_queue):
         email = "test@example.com"
         token = "test_token"
         send_email(email, token)
-        mock_smtp_instance = mock_smtp.return_value.__enter__.return_value
-        mock_smtp_instance.login.assert_called_once()
-        mock_smtp_instance.sendmail.assert_called_once()
+        message = mock_queue.enqueue.call_args.args[0]
+        self.assertEqual(message["To"], email)
+        self.assertIn(token, message.get_payload()[0].get_payload(decode=True).decode())
+
+
+class TestRegistration(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        context = CryptContext(
+            schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=4, bcrypt__min_rounds=4, bcrypt__max_rounds=4
+        )
+        context_patcher = patch("auth.passwords.pwd_context", context)
+        context_patcher.start()
+        self.addCleanup(context_patcher.stop)
+        self.engine = create_async_engine("sqlite+aiosqlite://")
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.db = AsyncSession(self.engine, expire_on_commit=False)
+
+    async def asyncTearDown(self):
+        await self.db.close()
+        await self.engine.dispose()
+
+    async def test_register_and_verify(self):
+        user, token = await register_user(self.db, "new", "new@example.com", "secret")
+        self.assertFalse(user.is_verified)
+        self.assertNotEqual(user.verification_token_hash, token)
+        self.assertIsNone(await authenticate_user(self.db, "new", "secret"))
+        self.assertFalse(await verify_user(self.db, "new", "wrong-token"))
+        self.assertTrue(await verify_user(self.db, "new", token))
+        self.assertFalse(await verify_user(self.db, "new", token))
+        self.assertIsNotNone(await authenticate_user(self.db, "new", "secret"))
+
+    async def test_duplicate_username_or_email(self):
+        await register_user(self.db, "new", "new@example.com", "secret")
+        with self.assertRaises(UserExistsError):
+            await register_user(self.db, "new", "other@example.com", "secret")
+        with self.assertRaises(UserExistsError):
+            await register_user(self.db, "other", "new@example.com", "secret")
+
+    async def test_expired_accounts_are_cleaned_up(self):
+        user, token = await register_user(self.db, "stale", "stale@example.com", "secret")
+        await register_user(self.db, "fresh", "fresh@example.com", "secret")
+        user.verification_expires_at = datetime(2000, 1, 1)
+        await self.db.commit()
+        self.assertFalse(await verify_user(self.db, "stale", token))
+        self.assertEqual(await delete_stale_unverified_users(self.db, batch_size=1), 1)
+        self.assertIsNone(await get_user(self.db, "stale"))
+        self.assertIsNotNone(await get_user(self.db, "fresh"))
+
+
+class TestTokenStore(unittest.IsolatedAsyncioTestCase):
+
+    async def test_memory_store_expires_entries(self):
+        store = MemoryTokenStore()
+        with patch("auth.tokens.time.time", return_value=100.0):
+            await store.put("a", "1", 10)
+            self.assertEqual(await store.exists("a", "b"), 1)
+        with patch("auth.tokens.time.time", return_value=111.0):
+            self.assertEqual(await store.exists("a"), 0)
+            await store.put("b", "1", 10)
+        self.assertEqual(len(store), 1)
+
+    async def test_take_is_single_use(self):
+        stores = [MemoryTokenStore()]
+        try:
+            import fakeredis
+            stores.append(RedisTokenStore(fakeredis.FakeAsyncRedis()))
+        except ImportError:
+            pass
+        for store in stores:
+            await store.put("refresh:x", "value", 60)
+            self.assertEqual(await store.take("refresh:x"), "value")
+            self.assertIsNone(await store.take("refresh:x"))
+
+
+class FlakyTransport(MemoryTransport):
+
+    def __init__(self, failures, error):
+        super().__init__()
+        self.failures = failures
+        self.error = error
+
+    def send(self, message):
+        if self.failures:
+            self.failures -= 1
+            raise self.error
+        super().send(message)
+
+
+class TestMailQueue(unittest.TestCase):
+
+    def _message(self, to="test@example.com"):
+        message = MIMEText("body")
+        message["To"] = to
+        message["Subject"] = "Weryfikacja konta"
+        return message
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.dead_letters = DeadLetterFile(os.path.join(directory.name, "dead.jsonl"))
+
+    def test_messages_are_sent_in_background(self):
+        transport = MemoryTransport()
+        mail_queue = MailQueue(transport, self.dead_letters)
+        for _ in range(3):
+            mail_queue.enqueue(self._message())
+        mail_queue.stop(timeout=5)
+        self.assertEqual(len(transport.sent), 3)
+
+    @patch("auth.mailer.smtplib.SMTP_SSL")
+    def test_smtp_connection_is_reused(self, mock_smtp):
+        transport = SMTPTransport("smtp.example.com", 465, "user", "password")
+        mail_queue = MailQueue(transport, self.dead_letters)
+        for _ in range(3):
+            mail_queue.enqueue(self._message())
+        mail_queue.stop(timeout=5)
+        mock_smtp.assert_called_once()
+        mock_smtp.return_value.login.assert_called_once()
+        self.assertEqual(mock_smtp.return_value.send_message.call_count, 3)
+        mock_smtp.return_value.quit.assert_called_once()
+
+    def test_retry_with_backoff(self):
+        transport = FlakyTransport(2, smtplib.SMTPServerDisconnected("gone"))
+        mail_queue = MailQueue(transport, self.dead_letters, backoff=0.01)
+        mail_queue.enqueue(self._message())
+        deadline = time.monotonic() + 5
+        while not transport.sent and time.monotonic() < deadline:
+            time.sleep(0.01)
+        mail_queue.stop(timeout=5)
+        self.assertEqual(len(transport.sent), 1)
+        self.assertEqual(self.dead_letters.drain(), [])
+
+    def test_permanent_failure_goes_to_dead_letters(self):
+        transport = FlakyTransport(1, smtplib.SMTPRecipientsRefused({"nobody@example.com": (550, b"no such user")}))
+        mail_queue = MailQueue(transport, self.dead_letters)
+        mail_queue.enqueue(self._message("nobody@example.com"))
+        mail_queue.stop(timeout=5)
+        self.assertEqual(transport.sent, [])
+        self.assertEqual(mail_queue.retry_dead_letters(), 1)
+        mail_queue.stop(timeout=5)
+        self.assertEqual(transport.sent[0]["To"], "nobody@example.com")
+
+    def test_unexpected_error_does_not_stop_the_queue(self):
+        transport = FlakyTransport(1, UnicodeEncodeError("ascii", "ż", 0, 1, "ordinal not in range"))
+        mail_queue = MailQueue(transport, self.dead_letters)
+        mail_queue.enqueue(self._message("broken@example.com"))
+        mail_queue.enqueue(self._message())
+        mail_queue.stop(timeout=5)
+        self.assertEqual([message["To"] for message in transport.sent], ["test@example.com"])
+        self.assertEqual(len(self.dead_letters.drain()), 1)
+
+    def test_failed_thread_is_restarted(self):
+        transport = MemoryTransport()
+        mail_queue = MailQueue(transport, self.dead_letters)
+        with patch.object(mail_queue, "_send", side_effect=RuntimeError("boom")), self.assertLogs("auth.mailer", "ERROR"):
+            mail_queue.enqueue(self._message())
+            deadline = time.monotonic() + 5
+            while mail_queue._thread is not None and time.monotonic() < deadline:
+                time.sleep(0.01)
+        mail_queue.enqueue(self._message())
+        mail_queue.stop(timeout=5)
+        self.assertEqual(len(transport.sent), 1)
 
 
 class TestJWT(unittest.TestCase):
@@ -99,5 +365,97 @@ class TestJWT(unittest.TestCase):
         self.assertEqual(context.exception.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
+class TestPasswords(unittest.IsolatedAsyncioTestCase):
+
+    def _context(self, rounds):
+        return CryptContext(
+            schemes=["bcrypt"], deprecated="auto",
+            bcrypt__rounds=rounds, bcrypt__min_rounds=rounds, bcrypt__max_rounds=rounds,
+        )
+
+    async def test_hash_and_verify(self):
+        with patch("passwords.pwd_context", self._context(4)):
+            hashed = await passwords.hash_password("secret")
+            self.assertEqual(await passwords.verify_password("secret", hashed), (True, None))
+            self.assertEqual(await passwords.verify_password("wrong", hashed), (False, None))
+            self.assertEqual(await passwords.verify_password("secret", "not-a-hash"), (False, None))
+
+    async def test_rehash_when_cost_changes(self):
+        with patch("passwords.pwd_context", self._context(4)):
+            hashed = await passwords.hash_password("secret")
+        with patch("passwords.pwd_context", self._context(5)):
+            valid, new_hash = await passwords.verify_password("secret", hashed)
+        self.assertTrue(valid)
+        self.assertTrue(new_hash.startswith("$2b$05$"))
+
+
+class TestJWTKeys(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "jwks.json")
+        cache_patcher = patch("jwts.claims_cache", MemoryCache("jwt-test", ttl=0, maxsize=100))
+        self.claims_cache = cache_patcher.start()
+        self.addCleanup(cache_patcher.stop)
+
+    def _write_keys(self, *keys):
+        with open(self.path, "w") as file:
+            json.dump({"keys": list(keys)}, file)
+        # Wymuś inny czas modyfikacji także przy szybkim zapisie.
+        stat = os.stat(self.path)
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    def _use_keyset(self):
+        patcher = patch("jwts.keyset", KeySet(self.path, reload_interval=0))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_sign_and_verify_with_kid(self):
+        for algorithm in ("ES256", "EdDSA"):
+            with self.subTest(algorithm=algorithm):
+                self._write_keys(generate_key(algorithm, kid=f"{algorithm}-1"))
+                self._use_keyset()
+                token = create_jwt_token({"sub": "test"}, timedelta(minutes=5))
+                header = jwt.get_unverified_header(token)
+                self.assertEqual(header, {"alg": algorithm, "typ": "JWT", "kid": f"{algorithm}-1"})
+                self.assertEqual(decode_jwt_token(token)["sub"], "test")
+
+    def test_claims_cache_skips_signature_check(self):
+        self._write_keys(generate_key("ES256", kid="k1"))
+        self._use_keyset()
+        token = create_jwt_token({"sub": "test"}, timedelta(minutes=5))
+        with patch("jwts._verify", wraps=jwts._verify) as verify:
+            decode_jwt_token(token)
+            payload = decode_jwt_token(token)
+        verify.assert_called_once()
+        self.assertEqual(payload["sub"], "test")
+
+    def test_expired_token_is_rejected(self):
+        self._write_keys(generate_key("EdDSA", kid="k1"))
+        self._use_keyset()
+        token = create_jwt_token({"sub": "test"}, timedelta(seconds=-1))
+        with self.assertRaises(HTTPException):
+            decode_jwt_token(token)
+        self.assertEqual(len(self.claims_cache), 0)
+
+    def test_key_rotation_without_restart(self):
+        old_key, new_key = generate_key("ES256", kid="old"), generate_key("EdDSA", kid="new")
+        self._write_keys(old_key)
+        self._use_keyset()
+        old_token = create_jwt_token({"sub": "test"}, timedelta(minutes=5))
+        decode_jwt_token(old_token)
+
+        self._write_keys(old_key, new_key)
+        new_token = create_jwt_token({"sub": "test"}, timedelta(minutes=5))
+        self.assertEqual(jwt.get_unverified_header(new_token)["kid"], "new")
+        self.assertEqual(decode_jwt_token(old_token)["sub"], "test")
+
+        self._write_keys({k: v for k, v in new_key.items() if k != "d"})
+        self.assertEqual(decode_jwt_token(new_token)["sub"], "test")
+        with self.assertRaises(HTTPException):
+            decode_jwt_token(old_token)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,42 +1,118 @@
 from fastapi import HTTPException, Depends, status
 from datetime import timedelta
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
-import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from models import Token, User
 from auth.jwts import create_jwt_token, decode_jwt_token
-from api.config import SECRET_KEY, ALGORITHM, oauth2_scheme
+from auth.passwords import hash_password, verify_password
+from auth.tokens import new_id, issue_refresh_token, use_refresh_token, revoke_token, revoke_session, is_revoked
+from auth.mailer import mail_queue
+from api.config import oauth2_scheme, USER_CACHE_TTL, USER_CACHE_MAXSIZE, MAIL_FROM
+from db.dbs import get_db
+from cache import create_cache
 
 
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 
-EMAIL_ADDRESS = "email@example.com"  #TODO
-EMAIL_PASSWORD = "email_password"   #TODO
+# Zweryfikowani użytkownicy według `sub` z tokenu (kolumny użytkownika jako słownik).
+# Cache jest lokalny dla procesu, więc zmiana w innym procesie jest widoczna najpóźniej po USER_CACHE_TTL.
+user_cache = create_cache("users", "memory", USER_CACHE_TTL, maxsize=USER_CACHE_MAXSIZE)
 
 
-def authenticate_user(username: str, password: str):
+def _user_columns(user: User) -> dict:
+    return {column.key: getattr(user, column.key) for column in User.__table__.columns}
+
+
+async def invalidate_user(username: str):
+    """
+    Usuwa użytkownika z cache zweryfikowanych użytkowników.
+
+    Args:
+        username (str): Nazwa użytkownika (`sub` tokenu).
+    """
+    await user_cache.delete(username)
+
+
+async def get_user(db: AsyncSession, username: str):
+    """
+    Zwraca użytkownika o podanej nazwie.
+
+    Args:
+        db (AsyncSession): Sesja bazy danych.
+        username (str): Nazwa użytkownika.
+
+    Returns:
+        User: Obiekt użytkownika albo None, jeśli nie istnieje.
+    """
+    return await db.scalar(select(User).where(User.username == username))
+
+
+async def authenticate_user(db: AsyncSession, username: str, password: str):
     """
     Funkcja do autentykacji użytkownika.
 
+    Hasło jest sprawdzane w puli wykonawców (`auth.passwords`), więc nie blokuje
+    pętli zdarzeń. Konta nieaktywne i niezweryfikowane nie mogą się zalogować. Jeśli hash ma inny koszt niż BCRYPT_ROUNDS, jest od razu
+    zastępowany nowym.
+
     Args:
+        db (AsyncSession): Sesja bazy danych.
         username (str): Nazwa użytkownika.
         password (str): Hasło użytkownika.
 
     Returns:
         User: Zwraca obiekt użytkownika, jeśli autentykacja zakończyła się sukcesem, w przeciwnym razie None.
     """
-    if username == "test" and password == "testpassword":
-        return User(username="test", email="test@example.com", hashed_password="testpassword")
-    return None
+    user = await get_user(db, username)
+    if user is None or not user.is_active or not user.is_verified:
+        return None
+    valid, new_hash = await verify_password(password, user.hashed_password)
+    if not valid:
+        return None
+    if new_hash is not None:
+        user.hashed_password = new_hash
+        await db.commit()
+    return user
+
+
+async def change_password(db: AsyncSession, user: User, new_password: str):
+    """
+    Zmienia hasło użytkownika i usuwa go z cache zweryfikowanych użytkowników.
+
+    Args:
+        db (AsyncSession): Sesja bazy danych.
+        user (User): Użytkownik wczytany w tej sesji.
+        new_password (str): Nowe hasło w postaci jawnej.
+    """
+    user.hashed_password = await hash_password(new_password)
+    await db.commit()
+    await invalidate_user(user.username)
+
+
+async def set_user_active(db: AsyncSession, user: User, active: bool):
+    """
+    Aktywuje lub dezaktywuje użytkownika i usuwa go z cache zweryfikowanych użytkowników.
+
+    Args:
+        db (AsyncSession): Sesja bazy danych.
+        user (User): Użytkownik wczytany w tej sesji.
+        active (bool): Czy konto ma być aktywne.
+    """
+    user.is_active = active
+    await db.commit()
+    await invalidate_user(user.username)
 
 
 def create_access_token(data: dict, expires_delta: timedelta):
     """
     Funkcja tworząca token dostępu.
 
+    Token dostaje unikalny `jti`, po którym można go unieważnić.
+
     Args:
         data (dict): Dane do zakodowania w tokenie.
         expires_delta (timedelta): Okres czasu ważności tokenu.
@@ -44,20 +120,32 @@ def create_access_token(data: dict, expires_delta: timedelta):
     Returns:
         str: Zakodowany token JWT.
     """
-    return create_jwt_token(data, expires_delta)
+    return create_jwt_token({"jti": new_id(), **data}, expires_delta)
+
 
+def _credentials_exception():
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
 
-def login_for_access_token(form_data: OAuth2PasswordBearer = Depends()):
+
+async def login_for_access_token(form_data: OAuth2PasswordBearer = Depends(), db: AsyncSession = Depends(get_db)):
     """
     Endpoint do logowania użytkownika i uzyskiwania tokena dostępu.
 
+    Logowanie rozpoczyna sesję (`sid`): oprócz tokenu dostępu zwracany jest
+    nieprzezroczysty token odświeżania tej sesji.
+
     Args:
         form_data (OAuth2PasswordBearer): Dane logowania użytkownika.
+        db (AsyncSession): Sesja bazy danych.
 
     Returns:
-        dict: Zwraca token dostępu i typ tokenu.
+        dict: Zwraca token dostępu, typ tokenu i token odświeżania.
     """
-    user = authenticate_user(form_data.username, form_data.password)
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -65,64 +153,89 @@ def login_for_access_token(form_data: OAuth2PasswordBearer = Depends()):
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    sid = new_id()
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_jwt_token(data={"sub": user.username}, expires_delta=access_token_expires)
-    return {"access_token": access_token, "token_type": "bearer"}
+    access_token = create_access_token(data={"sub": user.username, "sid": sid}, expires_delta=access_token_expires)
+    refresh_token = await issue_refresh_token(user.username, sid)
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
 
 
-def refresh_access_token(current_token: str = Depends(oauth2_scheme)):
+async def refresh_access_token(refresh_token: str, db: AsyncSession = Depends(get_db)):
     """
     Endpoint odświeżający token dostępu.
 
+    Token odświeżania jest jednorazowy: w odpowiedzi przychodzi nowy, a stary
+    przestaje działać (rotacja). Nowy token odświeżania należy do tej samej sesji
+    i wygasa razem z nią.
+
     Args:
-        current_token (str): Obecny token dostępu.
+        refresh_token (str): Token odświeżania z logowania albo poprzedniego odświeżenia.
+        db (AsyncSession): Sesja bazy danych.
+
+    Raises:
+        HTTPException: 401, gdy token jest nieważny, zużyty albo sesja została unieważniona.
 
     Returns:
-        dict: Zwraca odświeżony token dostępu i typ tokenu.
+        dict: Zwraca nowy token dostępu, typ tokenu i nowy token odświeżania.
     """
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-
-    try:
-        payload = decode_jwt_token(current_token)
-        sub = payload.get("sub")
-        if sub is None:
-            raise credentials_exception
-    except:
-        raise credentials_exception
+    session = await use_refresh_token(refresh_token)
+    if session is None:
+        raise _credentials_exception()
+    user = await get_user(db, session["sub"])
+    if user is None or not user.is_active:
+        await revoke_session(session["sid"])
+        raise _credentials_exception()
 
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    refreshed_token = create_jwt_token(data={"sub": sub}, expires_delta=access_token_expires)
+    access_token = create_access_token(data={"sub": user.username, "sid": session["sid"]}, expires_delta=access_token_expires)
+    new_refresh_token = await issue_refresh_token(user.username, session["sid"], session["exp"])
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": new_refresh_token}
 
-    return {"access_token": refreshed_token, "token_type": "bearer"}
+
+async def revoke_access_token(token: str = Depends(oauth2_scheme)):
+    """
+    Wylogowanie: unieważnia token dostępu i jego sesję (razem z tokenami odświeżania).
+
+    Args:
+        token (str): Token dostępu.
+    """
+    payload = decode_jwt_token(token)
+    if payload.get("jti"):
+        await revoke_token(payload["jti"], payload.get("exp"))
+    if payload.get("sid"):
+        await revoke_session(payload["sid"])
 
 
-def get_current_user(token: str = Depends(oauth2_scheme)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
     """
     Funkcja uzyskująca aktualnego użytkownika na podstawie tokena dostępu.
 
+    Użytkownik jest wczytywany z bazy tylko przy pierwszym żądaniu; później,
+    przez USER_CACHE_TTL sekund, jest odtwarzany z cache według `sub` tokenu.
+    Unieważnienie tokenu lub sesji jest sprawdzane przy każdym żądaniu
+    (także dla tokenów z `claims_cache`), bez zapytania do bazy.
+
     Args:
         token (str): Token dostępu.
+        db (AsyncSession): Sesja bazy danych.
 
     Returns:
         User: Zwraca obiekt użytkownika na podstawie tokenu.
     """
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-        token_data = Token(username=username)
-    except JWTError:
+    credentials_exception = _credentials_exception()
+    payload = decode_jwt_token(token)
+    username = payload.get("sub")
+    if username is None or await is_revoked(payload):
         raise credentials_exception
+
+    columns = await user_cache.get(username)
+    if columns is not None:
+        return User(**columns)
+    user = await get_user(db, username)
+    if user is None:
+        raise credentials_exception
+    await user_cache.set(username, _user_columns(user))
+    return user
     
     
 def get_current_active_user(current_user: User = Depends(get_current_user)):
@@ -138,29 +251,32 @@ def get_current_active_user(current_user: User = Depends(get_current_user)):
     Returns:
         User: Zwraca aktualnego aktywnego użytkownika.
     """
-    if current_user is None:
+    if current_user is None or not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
 
-def send_email(email: str, token: str):
+def send_email(email: str, token: str, link: str = None):
     """
     Funkcja wysyłająca e-mail weryfikacyjny.
 
+    Wiadomość trafia do kolejki `auth.mailer.mail_queue` i jest wysyłana w tle,
+    więc funkcja nie czeka na serwer SMTP.
+
     Args:
         email (str): Adres e-mail odbiorcy.
         token (str): Token weryfikacyjny.
+        link (str, optional): Adres strony weryfikacji z tokenem. Defaults to None.
     """
     subject = "Weryfikacja konta"
     message = f"Witaj! Twój token weryfikacyjny to: {token}"
+    if link:
+        message += f"\nAby potwierdzić konto, otwórz: {link}"
 
     msg = MIMEMultipart()
-    msg["From"] = EMAIL_ADDRESS
+    msg["From"] = MAIL_FROM
     msg["To"] = email
     msg["Subject"] = subject
 
     msg.attach(MIMEText(message, "plain"))
-
-    with smtplib.SMTP_SSL("smtp.gmail.com", 465) as server:
-        server.login(EMAIL_ADDRESS, EMAIL_PASSWORD)
-        server.sendmail(EMAIL_ADDRESS, email, msg.as_string())
\ No newline at end of file
+    mail_queue.enqueue(msg)
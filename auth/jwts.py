@@ -1,7 +1,21 @@
+import hashlib
+import time
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status
-from api.config import SECRET_KEY, ALGORITHM, oauth2_scheme
+from api.config import (
+    SECRET_KEY, ALGORITHM, oauth2_scheme,
+    JWT_JWKS_FILE, JWT_SIGNING_KID, JWT_JWKS_RELOAD_INTERVAL, JWT_CACHE_MAXSIZE,
+)
+from auth.keys import KeySet
+from cache import MemoryCache
+
+
+# Klucze z pliku JWKS; bez niego tokeny są podpisywane i weryfikowane SECRET_KEY/ALGORITHM.
+keyset = KeySet(JWT_JWKS_FILE, JWT_JWKS_RELOAD_INTERVAL, JWT_SIGNING_KID) if JWT_JWKS_FILE else None
+
+# Zweryfikowane tokeny: skrót SHA-256 tokenu -> (kid, claims). Wpis wygasa razem z `exp` tokenu.
+claims_cache = MemoryCache("jwt_claims", ttl=0, maxsize=JWT_CACHE_MAXSIZE)
 
 
 def create_jwt_token(data: dict, expires_delta: timedelta):
@@ -18,14 +32,36 @@ def create_jwt_token(data: dict, expires_delta: timedelta):
     to_encode = data.copy()
     expire = datetime.utcnow() + expires_delta
     to_encode.update({"exp": expire})
+    if keyset is not None:
+        kid, algorithm, key = keyset.signing_key()
+        return jwt.encode(to_encode, key, algorithm=algorithm, headers={"kid": kid})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 
+def _verify(token: str):
+    """
+    Sprawdza podpis i ważność tokenu, zwracając `(claims, kid)`.
+    """
+    if keyset is None:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]), None
+    kid = jwt.get_unverified_header(token).get("kid")
+    found = keyset.verification_key(kid) if kid else None
+    if found is None:
+        raise JWTError("Unknown key id")
+    algorithm, key = found
+    # Tylko algorytm przypisany do klucza, więc nagłówek "alg" nie może go zmienić.
+    return jwt.decode(token, key, algorithms=[algorithm]), kid
+
+
 def decode_jwt_token(token: str = Depends(oauth2_scheme)):
     """
     Dekoduje token JWT.
 
+    Zweryfikowane tokeny trafiają do `claims_cache` (kluczem jest skrót tokenu),
+    więc kolejne żądania z tym samym tokenem pomijają sprawdzanie podpisu aż do
+    `exp`. Wpis jest pomijany, jeśli klucz, którym podpisano token, zniknął z JWKS.
+
     Args:
         token (str): Token JWT do zdekodowania.
 
@@ -40,8 +76,23 @@ def decode_jwt_token(token: str = Depends(oauth2_scheme)):
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    cache_key = hashlib.sha256(token.encode()).digest() if isinstance(token, str) else None
+    if cache_key is not None and JWT_CACHE_MAXSIZE > 0:
+        cached = claims_cache.get_nowait(cache_key)
+        if cached is not None:
+            kid, claims = cached
+            if kid is None or kid in keyset:
+                return dict(claims)
+            claims_cache.delete_nowait(cache_key)
+
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
+        payload, kid = _verify(token)
     except JWTError:
         raise credentials_exception
+
+    exp = payload.get("exp")
+    if cache_key is not None and JWT_CACHE_MAXSIZE > 0 and isinstance(exp, (int, float)):
+        ttl = exp - time.time()
+        if ttl > 0:
+            claims_cache.set_nowait(cache_key, (kid, dict(payload)), ttl)
+    return payload
@@ -0,0 +1,251 @@
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from jose import jwk
+from jose.exceptions import JWKError
+from jose.utils import base64url_decode, base64url_encode
+
+
+logger = logging.getLogger(__name__)
+
+
+# Algorytm domyślny dla typu klucza JWK bez pola "alg".
+DEFAULT_ALGORITHMS = {
+    ("EC", "P-256"): "ES256",
+    ("OKP", "Ed25519"): "EdDSA",
+    ("RSA", None): "RS256",
+}
+
+
+class Ed25519Key(jwk.Key):
+    """
+    Klucz EdDSA (Ed25519) dla python-jose, który nie obsługuje go samodzielnie.
+
+    Przyjmuje JWK typu OKP (RFC 8037) albo obiekt klucza z biblioteki `cryptography`.
+    """
+
+    def __init__(self, key, algorithm):
+        from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey, Ed25519PublicKey
+
+        if algorithm != "EdDSA":
+            raise JWKError(f"Algorithm {algorithm} is not supported by Ed25519Key")
+        self._algorithm = algorithm
+        self._private = None
+        if isinstance(key, Ed25519PrivateKey):
+            self._private = key
+            self._public = key.public_key()
+        elif isinstance(key, Ed25519PublicKey):
+            self._public = key
+        elif isinstance(key, dict) and key.get("kty") == "OKP" and key.get("crv") == "Ed25519":
+            if "d" in key:
+                self._private = Ed25519PrivateKey.from_private_bytes(base64url_decode(key["d"].encode()))
+                self._public = self._private.public_key()
+            else:
+                self._public = Ed25519PublicKey.from_public_bytes(base64url_decode(key["x"].encode()))
+        else:
+            raise JWKError("Expected an OKP Ed25519 key")
+
+    def sign(self, msg):
+        if self._private is None:
+            raise JWKError("Cannot sign with a public key")
+        return self._private.sign(msg)
+
+    def verify(self, msg, sig):
+        from cryptography.exceptions import InvalidSignature
+
+        try:
+            self._public.verify(sig, msg)
+            return True
+        except InvalidSignature:
+            return False
+
+    def is_public(self):
+        return self._private is None
+
+    def public_key(self):
+        return Ed25519Key(self._public, self._algorithm)
+
+    def to_dict(self):
+        from cryptography.hazmat.primitives import serialization
+
+        raw = self._public.public_bytes(serialization.Encoding.Raw, serialization.PublicFormat.Raw)
+        data = {"kty": "OKP", "crv": "Ed25519", "alg": self._algorithm, "x": base64url_encode(raw).decode()}
+        if self._private is not None:
+            private = self._private.private_bytes(
+                serialization.Encoding.Raw, serialization.PrivateFormat.Raw, serialization.NoEncryption()
+            )
+            data["d"] = base64url_encode(private).decode()
+        return data
+
+
+jwk.register_key("EdDSA", Ed25519Key)
+
+
+def key_algorithm(key_data: dict) -> str:
+    """
+    Zwraca algorytm podpisu klucza JWK (pole "alg" albo domyślny dla typu klucza).
+    """
+    if key_data.get("alg"):
+        return key_data["alg"]
+    kty = key_data.get("kty")
+    algorithm = DEFAULT_ALGORITHMS.get((kty, key_data.get("crv"))) or DEFAULT_ALGORITHMS.get((kty, None))
+    if algorithm is None:
+        raise JWKError(f"Cannot determine the algorithm of key {key_data.get('kid')}")
+    return algorithm
+
+
+class KeySet:
+    """
+    Zbiór kluczy JWT wczytywany z lokalnego pliku JWKS.
+
+    Plik jest ponownie wczytywany, gdy zmieni się jego czas modyfikacji
+    (sprawdzany najwyżej co `reload_interval` sekund albo od razu po trafieniu
+    na nieznany `kid`), więc klucze można rotować bez restartu aplikacji.
+    Każdy klucz musi mieć `kid`. Tokeny są podpisywane kluczem `signing_kid`,
+    a bez niego ostatnim kluczem prywatnym (z polem "d") w pliku.
+
+    Args:
+        path (str): Ścieżka do pliku JWKS.
+        reload_interval (float): Minimalny odstęp między sprawdzeniami pliku w sekundach.
+        signing_kid (str, optional): Identyfikator klucza podpisującego. Defaults to None.
+    """
+
+    def __init__(self, path: str, reload_interval: float = 5.0, signing_kid: str = None):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.signing_kid = signing_kid
+        self._keys = {}
+        self._signers = {}
+        self._mtime = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with open(self.path) as file:
+            document = json.load(file)
+        keys, signers = {}, {}
+        for key_data in document.get("keys", []):
+            kid = key_data.get("kid")
+            if not kid:
+                raise JWKError("Every key in the JWKS file needs a kid")
+            algorithm = key_algorithm(key_data)
+            key = jwk.construct(key_data, algorithm)
+            if key_data.get("kty") == "oct":
+                keys[kid] = signers[kid] = (algorithm, key)
+            else:
+                keys[kid] = (algorithm, key.public_key() if "d" in key_data else key)
+                if "d" in key_data:
+                    signers[kid] = (algorithm, key)
+        self._keys, self._signers = keys, signers
+
+    def refresh(self, force: bool = False):
+        """
+        Wczytuje plik ponownie, jeśli się zmienił.
+
+        Args:
+            force (bool, optional): Sprawdź plik niezależnie od `reload_interval`. Defaults to False.
+        """
+        now = time.monotonic()
+        if not force and self._checked_at is not None and now - self._checked_at < self.reload_interval:
+            return
+        with self._lock:
+            self._checked_at = now
+            mtime = os.stat(self.path).st_mtime_ns
+            if mtime == self._mtime:
+                return
+            try:
+                self._load()
+            except (ValueError, JWKError):
+                # Uszkodzony plik przy pierwszym wczytaniu jest błędem konfiguracji;
+                # później zostają poprzednie klucze, a plik jest sprawdzany ponownie.
+                if self._mtime is None:
+                    raise
+                logger.warning("Could not reload JWKS file %s, keeping the previous keys", self.path, exc_info=True)
+                return
+            self._mtime = mtime
+
+    def verification_key(self, kid: str):
+        """
+        Zwraca `(algorytm, klucz)` dla identyfikatora klucza albo None.
+        """
+        self.refresh()
+        if kid not in self._keys:
+            self.refresh(force=True)
+        return self._keys.get(kid)
+
+    def __contains__(self, kid: str) -> bool:
+        self.refresh()
+        return kid in self._keys
+
+    def signing_key(self):
+        """
+        Zwraca `(kid, algorytm, klucz)` klucza używanego do podpisywania tokenów.
+
+        Raises:
+            JWKError: Gdy w pliku nie ma klucza prywatnego.
+        """
+        self.refresh()
+        kid = self.signing_kid or next(reversed(self._signers), None)
+        if kid not in self._signers:
+            raise JWKError("No private signing key in the JWKS file")
+        algorithm, key = self._signers[kid]
+        return kid, algorithm, key
+
+
+def generate_key(algorithm: str, kid: str = None) -> dict:
+    """
+    Generuje nowy klucz prywatny ES256 albo EdDSA jako JWK.
+
+    Args:
+        algorithm (str): "ES256" albo "EdDSA".
+        kid (str, optional): Identyfikator klucza. Defaults to losowy.
+
+    Returns:
+        dict: Klucz JWK z częścią prywatną.
+    """
+    if algorithm == "ES256":
+        from cryptography.hazmat.primitives.asymmetric import ec
+        key_data = jwk.construct(ec.generate_private_key(ec.SECP256R1()), algorithm).to_dict()
+    elif algorithm == "EdDSA":
+        from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+        key_data = Ed25519Key(Ed25519PrivateKey.generate(), algorithm).to_dict()
+    else:
+        raise ValueError(f"Unsupported algorithm: {algorithm}")
+    key_data.update({"kid": kid or uuid.uuid4().hex, "alg": algorithm, "use": "sig"})
+    return key_data
+
+
+def main():
+    """
+    Dodaje nowy klucz do pliku JWKS (rotacja kluczy).
+
+    Uruchomienie:
+        python -m auth.keys --file jwks.json --alg ES256 [--kid 2024-06] [--keep 2]
+    """
+    parser = argparse.ArgumentParser(description="Add a new signing key to a JWKS file.")
+    parser.add_argument("--file", required=True)
+    parser.add_argument("--alg", choices=["ES256", "EdDSA"], default="ES256")
+    parser.add_argument("--kid")
+    parser.add_argument("--keep", type=int, default=0, help="keep only the newest N keys (0 keeps all)")
+    args = parser.parse_args()
+
+    document = {"keys": []}
+    if os.path.exists(args.file):
+        with open(args.file) as file:
+            document = json.load(file)
+    document["keys"].append(generate_key(args.alg, args.kid))
+    if args.keep:
+        document["keys"] = document["keys"][-args.keep:]
+    temporary = f"{args.file}.tmp"
+    with open(temporary, "w") as file:
+        json.dump(document, file, indent=2)
+    os.replace(temporary, args.file)
+    print(document["keys"][-1]["kid"])
+
+
+if __name__ == "__main__":
+    main()
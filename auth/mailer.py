@@ -0,0 +1,326 @@
+import email
+import heapq
+import itertools
+import json
+import logging
+import queue
+import smtplib
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.message import Message
+from api.config import (
+    MAIL_TRANSPORT, SMTP_HOST, SMTP_PORT, SMTP_SECURITY, SMTP_USERNAME, SMTP_PASSWORD, SMTP_TIMEOUT,
+    MAIL_BATCH_SIZE, MAIL_MAX_RETRIES, MAIL_RETRY_BACKOFF, MAIL_DEAD_LETTER_FILE,
+)
+from metrics import Counter, Gauge
+
+
+logger = logging.getLogger(__name__)
+
+
+MAIL_SENT = Counter("mail_sent_total", "Liczba wysłanych wiadomości e-mail.")
+MAIL_RETRIES = Counter("mail_retries_total", "Liczba nieudanych prób wysłania zaplanowanych do ponowienia.")
+MAIL_DEAD_LETTERS = Counter("mail_dead_letters_total", "Liczba wiadomości odłożonych do dead-letter.")
+SMTP_CONNECTIONS = Counter("smtp_connections_total", "Liczba otwartych połączeń SMTP.")
+
+
+class SMTPTransport:
+    """
+    Transport SMTP utrzymujący jedno połączenie dla kolejnych wiadomości.
+
+    Połączenie jest otwierane (i logowanie wykonywane) przy pierwszej wiadomości
+    i używane ponownie, dopóki kolejka go nie zamknie albo nie wystąpi błąd połączenia.
+    Do testów lokalnych wystarczy serwer debugujący, np.
+    `python -m aiosmtpd -n -l localhost:1025` z SMTP_SECURITY="none".
+
+    Args:
+        host (str): Adres serwera SMTP.
+        port (int): Port serwera SMTP.
+        username (str, optional): Login; bez niego logowanie jest pomijane. Defaults to None.
+        password (str, optional): Hasło. Defaults to None.
+        security (str, optional): "ssl", "starttls" albo "none". Defaults to "ssl".
+        timeout (float, optional): Limit czasu operacji sieciowych w sekundach. Defaults to 30.
+    """
+
+    def __init__(self, host: str, port: int, username: str = None, password: str = None,
+                 security: str = "ssl", timeout: float = 30):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.security = security
+        self.timeout = timeout
+        self._server = None
+
+    def _connect(self):
+        if self.security == "ssl":
+            server = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.security == "starttls":
+                server.starttls()
+        if self.username and self.password:
+            server.login(self.username, self.password)
+        SMTP_CONNECTIONS.inc()
+        return server
+
+    def send(self, message: Message):
+        if self._server is None:
+            self._server = self._connect()
+        self._server.send_message(message)
+
+    def close(self):
+        server, self._server = self._server, None
+        if server is None:
+            return
+        try:
+            server.quit()
+        except (smtplib.SMTPException, OSError):
+            server.close()
+
+
+class MemoryTransport:
+    """
+    Transport zapisujący wiadomości na liście `sent` (testy i środowisko deweloperskie).
+    """
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, message: Message):
+        self.sent.append(message)
+
+    def close(self):
+        pass
+
+
+def create_transport(name: str):
+    """
+    Tworzy transport poczty: "smtp" (według ustawień SMTP_*) albo "memory".
+    """
+    if name == "smtp":
+        return SMTPTransport(SMTP_HOST, SMTP_PORT, SMTP_USERNAME, SMTP_PASSWORD, SMTP_SECURITY, SMTP_TIMEOUT)
+    if name == "memory":
+        return MemoryTransport()
+    raise ValueError(f"Unknown mail transport: {name}")
+
+
+class DeadLetterFile:
+    """
+    Wiadomości, których nie udało się wysłać, zapisywane jako linie JSON.
+
+    Args:
+        path (str): Ścieżka do pliku.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def append(self, message: Message, attempts: int, error: str):
+        record = {
+            "time": datetime.now(timezone.utc).isoformat(),
+            "to": message["To"],
+            "subject": message["Subject"],
+            "attempts": attempts,
+            "error": error,
+            "message": message.as_string(),
+        }
+        with self._lock, open(self.path, "a", encoding="utf-8") as file:
+            file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def drain(self):
+        """
+        Zwraca zapisane wiadomości i czyści plik.
+        """
+        with self._lock:
+            try:
+                with open(self.path, encoding="utf-8") as file:
+                    records = [json.loads(line) for line in file if line.strip()]
+            except FileNotFoundError:
+                return []
+            open(self.path, "w").close()
+        return [email.message_from_string(record["message"]) for record in records]
+
+
+@dataclass
+class _Envelope:
+    message: Message
+    attempts: int = 0
+
+
+_STOP = object()
+
+
+def _is_permanent(error: Exception) -> bool:
+    # Odpowiedzi 5xx (np. nieistniejący adresat) i błędy samej wiadomości (np. kodowania nagłówka)
+    # nie zmienią się przy ponowieniu.
+    if not isinstance(error, (smtplib.SMTPException, OSError)):
+        return True
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    return isinstance(error, smtplib.SMTPResponseException) and 500 <= error.smtp_code < 600
+
+
+class MailQueue:
+    """
+    Kolejka wysyłki poczty obsługiwana przez wątek w tle.
+
+    `enqueue` tylko wstawia wiadomość do kolejki, więc żądanie HTTP nie czeka
+    na SMTP. Wątek wysyła wiadomości partiami (do `batch_size` naraz) przez
+    jedno połączenie transportu, które zamyka po `idle_timeout` sekundach
+    bezczynności. Nieudane wysyłki są ponawiane z wykładniczym opóźnieniem;
+    po `max_retries` ponowieniach albo przy błędzie trwałym (5xx) wiadomość
+    trafia do `dead_letters`.
+
+    Args:
+        transport: Obiekt z metodami `send(message)` i `close()`.
+        dead_letters (DeadLetterFile, optional): Magazyn niewysłanych wiadomości. Defaults to None (tylko log).
+        batch_size (int, optional): Maksymalna liczba wiadomości w partii. Defaults to 50.
+        max_retries (int, optional): Liczba ponowień. Defaults to 5.
+        backoff (float, optional): Opóźnienie pierwszego ponowienia w sekundach (podwajane). Defaults to 2.
+        max_backoff (float, optional): Maksymalne opóźnienie ponowienia. Defaults to 300.
+        idle_timeout (float, optional): Czas bezczynności, po którym połączenie jest zamykane. Defaults to 60.
+    """
+
+    def __init__(self, transport, dead_letters: DeadLetterFile = None, batch_size: int = 50, max_retries: int = 5,
+                 backoff: float = 2.0, max_backoff: float = 300.0, idle_timeout: float = 60.0):
+        self.transport = transport
+        self.dead_letters = dead_letters
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.idle_timeout = idle_timeout
+        self._queue = queue.Queue()
+        self._retries = []
+        self._sequence = itertools.count()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def enqueue(self, message: Message):
+        """
+        Wstawia wiadomość do kolejki (uruchamia wątek przy pierwszym użyciu).
+        """
+        self._queue.put(_Envelope(message))
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="mail-queue", daemon=True)
+                self._thread.start()
+
+    def retry_dead_letters(self) -> int:
+        """
+        Wstawia ponownie do kolejki wiadomości z `dead_letters`.
+
+        Returns:
+            int: Liczba wiadomości.
+        """
+        messages = self.dead_letters.drain() if self.dead_letters is not None else []
+        for message in messages:
+            self.enqueue(message)
+        return len(messages)
+
+    def stop(self, timeout: float = None):
+        """
+        Wysyła to, co jest w kolejce (bez czekania na ponowienia), i zatrzymuje wątek.
+
+        Wiadomości, których nie udało się wtedy wysłać, trafiają do `dead_letters`.
+        """
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+
+    def qsize(self) -> int:
+        return self._queue.qsize() + len(self._retries)
+
+    def _run(self):
+        try:
+            while True:
+                batch, stopping = self._next_batch()
+                if batch:
+                    self._send(batch, final=stopping)
+                elif not stopping:
+                    # Nic do wysłania: nie trzymamy otwartego połączenia z serwerem.
+                    self.transport.close()
+                if stopping:
+                    self.transport.close()
+                    return
+        except Exception:
+            logger.exception("Mail queue thread failed; it will be restarted by the next message")
+        finally:
+            # Zakończony wątek nie może blokować uruchomienia nowego w `enqueue`.
+            with self._lock:
+                if self._thread is threading.current_thread():
+                    self._thread = None
+
+    def _next_batch(self):
+        timeout = self.idle_timeout
+        if self._retries:
+            timeout = max(0.0, min(timeout, self._retries[0][0] - time.monotonic()))
+        batch, stopping = [], False
+        try:
+            item = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            item = None
+        while item is not None:
+            if item is _STOP:
+                stopping = True
+            else:
+                batch.append(item)
+            if len(batch) >= self.batch_size and not stopping:
+                break
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                item = None
+        now = time.monotonic()
+        while self._retries and (stopping or (self._retries[0][0] <= now and len(batch) < self.batch_size)):
+            batch.append(heapq.heappop(self._retries)[2])
+        return batch, stopping
+
+    def _send(self, batch, final: bool):
+        for envelope in batch:
+            try:
+                self.transport.send(envelope.message)
+            except Exception as error:
+                if isinstance(error, OSError) or isinstance(error, smtplib.SMTPException) \
+                        and not isinstance(error, (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused)):
+                    # Błąd połączenia: następna wiadomość otworzy nowe.
+                    self.transport.close()
+                self._failed(envelope, error, final)
+            else:
+                MAIL_SENT.inc()
+
+    def _failed(self, envelope: _Envelope, error: Exception, final: bool):
+        envelope.attempts += 1
+        if final or envelope.attempts > self.max_retries or _is_permanent(error):
+            MAIL_DEAD_LETTERS.inc()
+            logger.warning("Giving up on mail to %s after %d attempts: %r",
+                           envelope.message["To"], envelope.attempts, error)
+            if self.dead_letters is not None:
+                try:
+                    self.dead_letters.append(envelope.message, envelope.attempts, repr(error))
+                except Exception:
+                    logger.exception("Could not write the mail to %s to the dead-letter file", envelope.message["To"])
+            return
+        MAIL_RETRIES.inc()
+        delay = min(self.max_backoff, self.backoff * 2 ** (envelope.attempts - 1))
+        heapq.heappush(self._retries, (time.monotonic() + delay, next(self._sequence), envelope))
+
+
+mail_queue = MailQueue(
+    create_transport(MAIL_TRANSPORT),
+    DeadLetterFile(MAIL_DEAD_LETTER_FILE),
+    batch_size=MAIL_BATCH_SIZE,
+    max_retries=MAIL_MAX_RETRIES,
+    backoff=MAIL_RETRY_BACKOFF,
+)
+
+
+Gauge("mail_queue_size", "Liczba wiadomości czekających na wysłanie (także na ponowienie).",
+      collect=lambda: {(): mail_queue.qsize()})
@@ -0,0 +1,89 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from passlib.context import CryptContext
+from api.config import BCRYPT_ROUNDS, PASSWORD_HASH_EXECUTOR, PASSWORD_HASH_WORKERS
+
+
+# Kontekst hashowania. Minimalny i maksymalny koszt są równe skonfigurowanemu,
+# więc `verify_and_update` zwraca nowy hash po każdej zmianie BCRYPT_ROUNDS (w górę i w dół).
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+
+_executor = None
+
+
+def get_executor():
+    """
+    Zwraca pulę wykonawców używaną do hashowania (tworzoną przy pierwszym użyciu).
+
+    Liczba wątków lub procesów jest ograniczona przez PASSWORD_HASH_WORKERS,
+    więc fala logowań nie zajmie wszystkich rdzeni ani domyślnej puli wątków
+    używanej przez FastAPI dla synchronicznych zależności.
+    """
+    global _executor
+    if _executor is None:
+        if PASSWORD_HASH_EXECUTOR == "process":
+            _executor = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS)
+        else:
+            _executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+    return _executor
+
+
+def shutdown_executor():
+    """
+    Zamyka pulę wykonawców (przy wyłączaniu aplikacji).
+    """
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify_and_update(password: str, hashed_password: str):
+    try:
+        return pwd_context.verify_and_update(password, hashed_password)
+    except ValueError:
+        # Nierozpoznany format hasha traktujemy jak błędne hasło.
+        return False, None
+
+
+async def hash_password(password: str) -> str:
+    """
+    Hashuje hasło poza pętlą zdarzeń.
+
+    Args:
+        password (str): Hasło w postaci jawnej.
+
+    Returns:
+        str: Hash bcrypt.
+    """
+    return await asyncio.get_running_loop().run_in_executor(get_executor(), _hash, password)
+
+
+async def verify_password(password: str, hashed_password: str):
+    """
+    Sprawdza hasło poza pętlą zdarzeń.
+
+    Args:
+        password (str): Hasło w postaci jawnej.
+        hashed_password (str): Zapisany hash.
+
+    Returns:
+        tuple: (czy hasło jest poprawne, nowy hash albo None). Nowy hash jest
+        zwracany, gdy zapisany ma inny koszt niż BCRYPT_ROUNDS i należy go zapisać.
+    """
+    if not hashed_password:
+        return False, None
+    return await asyncio.get_running_loop().run_in_executor(
+        get_executor(), _verify_and_update, password, hashed_password
+    )
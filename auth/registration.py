@@ -0,0 +1,166 @@
+import argparse
+import asyncio
+import hashlib
+import hmac
+import logging
+import secrets
+from datetime import timedelta
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import User, utcnow
+from auth.passwords import hash_password
+from api.config import VERIFICATION_TOKEN_TTL_HOURS
+
+
+logger = logging.getLogger(__name__)
+
+
+VERIFICATION_TOKEN_TTL = timedelta(hours=VERIFICATION_TOKEN_TTL_HOURS)
+
+
+class UserExistsError(ValueError):
+    """
+    Nazwa użytkownika albo adres e-mail są już zajęte.
+    """
+
+
+def _token_hash(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+async def register_user(db: AsyncSession, username: str, email: str, password: str):
+    """
+    Tworzy niezweryfikowane konto z losowym tokenem weryfikacyjnym.
+
+    Unikalność nazwy i adresu e-mail zapewniają unikalne indeksy tabeli
+    `users`, więc dwie równoległe rejestracje (także w różnych procesach)
+    nie utworzą dwóch kont. W bazie zapisywany jest tylko skrót tokenu.
+
+    Args:
+        db (AsyncSession): Sesja bazy danych.
+        username (str): Nazwa użytkownika.
+        email (str): Adres e-mail.
+        password (str): Hasło w postaci jawnej.
+
+    Raises:
+        UserExistsError: Gdy nazwa użytkownika albo e-mail są zajęte.
+
+    Returns:
+        tuple: (użytkownik, token weryfikacyjny do wysłania e-mailem).
+    """
+    token = secrets.token_urlsafe(32)
+    user = User(
+        username=username,
+        email=email,
+        hashed_password=await hash_password(password),
+        is_verified=False,
+        verification_token_hash=_token_hash(token),
+        verification_expires_at=utcnow() + VERIFICATION_TOKEN_TTL,
+    )
+    db.add(user)
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise UserExistsError(username)
+    return user, token
+
+
+async def verify_user(db: AsyncSession, username: str, token: str) -> bool:
+    """
+    Potwierdza adres e-mail użytkownika tokenem z wiadomości weryfikacyjnej.
+
+    Args:
+        db (AsyncSession): Sesja bazy danych.
+        username (str): Nazwa użytkownika.
+        token (str): Token weryfikacyjny.
+
+    Returns:
+        bool: True, jeśli konto zostało zweryfikowane; False dla złego lub wygasłego tokenu
+        i dla konta, które już jest zweryfikowane.
+    """
+    user = await db.scalar(select(User).where(User.username == username))
+    if user is None or user.is_verified or user.verification_token_hash is None:
+        return False
+    if user.verification_expires_at is None or user.verification_expires_at < utcnow():
+        return False
+    if not hmac.compare_digest(user.verification_token_hash, _token_hash(token)):
+        return False
+    user.is_verified = True
+    user.verification_token_hash = None
+    user.verification_expires_at = None
+    await db.commit()
+    return True
+
+
+async def delete_stale_unverified_users(db: AsyncSession, batch_size: int = 1000) -> int:
+    """
+    Usuwa niezweryfikowane konta, których link weryfikacyjny wygasł.
+
+    Konta są usuwane partiami po `batch_size`, każda partia w osobnej
+    transakcji, więc duże sprzątanie nie blokuje tabeli na długo. Zapytanie
+    korzysta z indeksu `ix_users_unverified_expiry`.
+
+    Args:
+        db (AsyncSession): Sesja bazy danych.
+        batch_size (int, optional): Liczba kont usuwanych w jednej transakcji. Defaults to 1000.
+
+    Returns:
+        int: Liczba usuniętych kont.
+    """
+    now = utcnow()
+    deleted = 0
+    while True:
+        ids = (await db.scalars(
+            select(User.id)
+            .where(User.is_verified.is_(False), User.verification_expires_at < now)
+            .limit(batch_size)
+        )).all()
+        if not ids:
+            return deleted
+        await db.execute(delete(User).where(User.id.in_(ids)).execution_options(synchronize_session=False))
+        await db.commit()
+        deleted += len(ids)
+
+
+async def cleanup_loop(session_factory, interval: float):
+    """
+    Co `interval` sekund usuwa niezweryfikowane konta z wygasłym linkiem.
+
+    Uruchamiane w tle przez aplikację; przy wielu procesach każdy z nich
+    sprząta niezależnie, co jest bezpieczne, bo usuwanie jest idempotentne.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with session_factory() as db:
+                deleted = await delete_stale_unverified_users(db)
+            if deleted:
+                logger.info("Deleted %d stale unverified accounts", deleted)
+        except Exception:
+            logger.exception("Cleanup of unverified accounts failed")
+
+
+def main():
+    """
+    Jednorazowe sprzątanie niezweryfikowanych kont (np. z crona).
+
+    Uruchomienie:
+        python -m auth.registration --batch-size 1000
+    """
+    from db.dbs import AsyncSessionLocal
+
+    parser = argparse.ArgumentParser(description="Delete unverified accounts with an expired verification link.")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    async def run():
+        async with AsyncSessionLocal() as db:
+            return await delete_stale_unverified_users(db, args.batch_size)
+
+    print(asyncio.run(run()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+import hashlib
+import heapq
+import json
+import secrets
+import threading
+import time
+import uuid
+from datetime import timedelta
+from api.config import TOKEN_STORE_BACKEND, REDIS_URL, REFRESH_TOKEN_EXPIRE_DAYS
+from cache import redis_client
+from metrics import Counter
+
+
+TOKENS_REVOKED = Counter("auth_tokens_revoked_total", "Liczba unieważnionych tokenów i sesji.", ["kind"])
+REFRESH_REUSE = Counter("auth_refresh_token_reuse_total", "Liczba prób ponownego użycia tokenu odświeżania.")
+
+REFRESH_TOKEN_EXPIRE = timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+
+
+class MemoryTokenStore:
+    """
+    Magazyn tokenów w pamięci procesu: klucz -> wartość z czasem wygaśnięcia.
+
+    Wpisy nie są usuwane z braku miejsca (utrata unieważnienia byłaby luką),
+    tylko po wygaśnięciu; kopiec czasów wygaśnięcia pozwala sprzątać je przy
+    zapisie bez przeglądania całego słownika. Odczyt to jedno wyszukiwanie w słowniku.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._expiry = []
+        self._lock = threading.Lock()
+
+    def _purge(self, now: float):
+        while self._expiry and self._expiry[0][0] <= now:
+            expires_at, key = heapq.heappop(self._expiry)
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= now:
+                del self._entries[key]
+
+    def _get(self, key: str, now: float):
+        entry = self._entries.get(key)
+        if entry is None or entry[1] <= now:
+            return None
+        return entry[0]
+
+    async def put(self, key: str, value: str, ttl: float):
+        now = time.time()
+        with self._lock:
+            self._purge(now)
+            self._entries[key] = (value, now + ttl)
+            heapq.heappush(self._expiry, (now + ttl, key))
+
+    async def take(self, key: str):
+        """
+        Zwraca wartość i usuwa wpis (atomowo), albo None.
+        """
+        with self._lock:
+            value = self._get(key, time.time())
+            self._entries.pop(key, None)
+        return value
+
+    async def exists(self, *keys: str) -> int:
+        now = time.time()
+        return sum(self._get(key, now) is not None for key in keys)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisTokenStore:
+    """
+    Magazyn tokenów w Redisie, wspólny dla wszystkich procesów.
+
+    Wpisy wygasają po TTL ustawionym w Redisie, `take` używa GETDEL, więc
+    token odświeżania może zostać wymieniony tylko raz.
+
+    Args:
+        client (redis.asyncio.Redis): Klient Redisa.
+        prefix (str, optional): Prefiks kluczy. Defaults to "auth".
+    """
+
+    def __init__(self, client, prefix: str = "auth"):
+        self.client = client
+        self.prefix = prefix
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}:{key}"
+
+    async def put(self, key: str, value: str, ttl: float):
+        await self.client.set(self._key(key), value, px=max(1, int(ttl * 1000)))
+
+    async def take(self, key: str):
+        value = await self.client.getdel(self._key(key))
+        return value.decode() if isinstance(value, bytes) else value
+
+    async def exists(self, *keys: str) -> int:
+        return await self.client.exists(*(self._key(key) for key in keys))
+
+
+def create_token_store(backend: str, redis_url: str = None):
+    """
+    Tworzy magazyn tokenów: "memory" (w procesie) albo "redis" (wspólny dla procesów).
+    """
+    if backend == "redis":
+        return RedisTokenStore(redis_client(redis_url))
+    if backend == "memory":
+        return MemoryTokenStore()
+    raise ValueError(f"Unknown token store backend: {backend}")
+
+
+store = create_token_store(TOKEN_STORE_BACKEND, REDIS_URL)
+
+
+def new_id() -> str:
+    """
+    Zwraca losowy identyfikator tokenu (`jti`) albo sesji (`sid`).
+    """
+    return uuid.uuid4().hex
+
+
+def _refresh_key(token: str) -> str:
+    # W magazynie jest tylko skrót, więc wyciek magazynu nie ujawnia tokenów.
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _ttl(exp) -> float:
+    return exp - time.time() if isinstance(exp, (int, float)) else REFRESH_TOKEN_EXPIRE.total_seconds()
+
+
+async def issue_refresh_token(sub: str, sid: str, expires_at: float = None) -> str:
+    """
+    Wydaje nieprzezroczysty token odświeżania dla sesji `sid`.
+
+    Args:
+        sub (str): Nazwa użytkownika.
+        sid (str): Identyfikator sesji (rodziny tokenów odświeżania).
+        expires_at (float, optional): Koniec sesji (czas uniksowy). Defaults to teraz + REFRESH_TOKEN_EXPIRE_DAYS.
+
+    Returns:
+        str: Token odświeżania.
+    """
+    if expires_at is None:
+        expires_at = time.time() + REFRESH_TOKEN_EXPIRE.total_seconds()
+    token = secrets.token_urlsafe(32)
+    value = json.dumps({"sub": sub, "sid": sid, "exp": expires_at})
+    await store.put(f"refresh:{_refresh_key(token)}", value, expires_at - time.time())
+    return token
+
+
+async def use_refresh_token(token: str):
+    """
+    Zużywa token odświeżania (rotacja: każdy token działa tylko raz).
+
+    Ponowne użycie zużytego tokenu oznacza, że mógł zostać skradziony, więc
+    cała sesja jest unieważniana.
+
+    Args:
+        token (str): Token odświeżania.
+
+    Returns:
+        dict: `sub`, `sid` i `exp` sesji albo None, jeśli token jest nieważny.
+    """
+    key = _refresh_key(token)
+    value = await store.take(f"refresh:{key}")
+    if value is None:
+        sid = await store.take(f"used:{key}")
+        if sid is not None:
+            REFRESH_REUSE.inc()
+            await revoke_session(sid)
+        return None
+    session = json.loads(value)
+    if await store.exists(f"revoked-sid:{session['sid']}"):
+        return None
+    await store.put(f"used:{key}", session["sid"], _ttl(session["exp"]))
+    return session
+
+
+async def revoke_token(jti: str, exp):
+    """
+    Unieważnia token dostępu do chwili jego wygaśnięcia.
+
+    Args:
+        jti (str): Identyfikator tokenu.
+        exp (float): Czas wygaśnięcia tokenu (czas uniksowy).
+    """
+    ttl = _ttl(exp)
+    if ttl > 0:
+        await store.put(f"revoked-jti:{jti}", "1", ttl)
+        TOKENS_REVOKED.inc(kind="access")
+
+
+async def revoke_session(sid: str):
+    """
+    Unieważnia sesję: jej tokeny odświeżania i wszystkie wydane w niej tokeny dostępu.
+    """
+    await store.put(f"revoked-sid:{sid}", "1", REFRESH_TOKEN_EXPIRE.total_seconds())
+    TOKENS_REVOKED.inc(kind="session")
+
+
+async def is_revoked(claims: dict) -> bool:
+    """
+    Sprawdza, czy token dostępu albo jego sesja zostały unieważnione.
+
+    Jedno zapytanie do magazynu (w Redisie jedno EXISTS), bez bazy danych.
+    Tokeny bez `jti` i `sid` (wydane przed ich wprowadzeniem) nie mogą być unieważnione.
+    """
+    keys = []
+    if claims.get("jti"):
+        keys.append(f"revoked-jti:{claims['jti']}")
+    if claims.get("sid"):
+        keys.append(f"revoked-sid:{claims['sid']}")
+    return bool(keys) and await store.exists(*keys) > 0
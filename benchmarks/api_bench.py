@@ -0,0 +1,420 @@
+"""
+Przepustowość i opóźnienia API (p50/p95/p99) pod obciążeniem.
+
+Skrypt przygotowuje bazę (domyślnie tymczasowy SQLite, albo `--database-url`,
+np. lokalny MySQL) z `--users` użytkownikami i `--contacts` kontaktami
+z generatora `db.data_faker`, uruchamia aplikację (`uvicorn main:app`
+w osobnym procesie albo `--server asgi` w tym samym procesie) i przez
+`--duration` sekund wysyła żądania z `--concurrency` równoległych
+klientów httpx. Każdy klient loguje się jako inny użytkownik i losuje
+operacje według `--mix`: lista, wyszukiwanie, odczyt, tworzenie, zmiana
+i usuwanie kontaktu, urodziny, logowanie (`/token/`) i odświeżenie tokenu.
+
+Wynik (liczba żądań, błędy, RPS i percentyle opóźnień dla każdej operacji)
+jest zapisywany jako JSON (`--output`). Z `--baseline` wynik jest porównywany
+z zapisanym wcześniej: wzrost p95 albo spadek RPS operacji o więcej niż
+`--max-regression` kończy skrypt kodem 1. Limity żądań są na czas pomiaru
+wyłączane (chyba że podano `--rate-limits`).
+
+Uruchomienie:
+    python -m benchmarks.api_bench --users 100 --contacts 100000 --concurrency 32 --duration 30 --output api.json
+    python -m benchmarks.api_bench --baseline api.json --max-regression 0.2
+    python -m benchmarks.api_bench --url http://localhost:8000 --password password
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MIX = "list=20,search=15,get=25,create=10,update=10,delete=5,birthdays=10,refresh=3,token=2"
+
+
+def parse_mix(mix: str) -> dict:
+    """
+    Zamienia "list=20,get=25,..." na słownik wag operacji.
+
+    Raises:
+        ValueError: Dla nieznanej operacji albo ujemnej wagi.
+    """
+    weights = {}
+    for item in mix.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in VirtualUser.OPERATIONS or not weight or float(weight) < 0:
+            raise ValueError(f"Invalid mix entry: {item!r} (operations: {', '.join(VirtualUser.OPERATIONS)})")
+        weights[name] = float(weight)
+    return weights
+
+
+def percentile(values: list, q: float) -> float:
+    """
+    Percentyl `q` (0-100) posortowanej listy metodą najbliższej rangi.
+    """
+    if not values:
+        return 0.0
+    rank = max(1, -(-len(values) * q // 100))
+    return values[int(rank) - 1]
+
+
+def summarize(samples: dict, elapsed: float) -> dict:
+    """
+    Liczy statystyki pomiaru.
+
+    Args:
+        samples (dict): Operacja -> lista par (opóźnienie w sekundach, czy żądanie się udało).
+        elapsed (float): Czas pomiaru w sekundach.
+
+    Returns:
+        dict: "total" i "operations" z liczbą żądań, błędami, RPS i percentylami w ms.
+    """
+    operations = {}
+    for name, results in sorted(samples.items()):
+        latencies = sorted(latency * 1000 for latency, _ in results)
+        operations[name] = {
+            "requests": len(results),
+            "errors": sum(1 for _, ok in results if not ok),
+            "rps": round(len(results) / elapsed, 2),
+            "p50_ms": round(percentile(latencies, 50), 3),
+            "p95_ms": round(percentile(latencies, 95), 3),
+            "p99_ms": round(percentile(latencies, 99), 3),
+            "max_ms": round(latencies[-1], 3) if latencies else 0.0,
+        }
+    everything = sorted(latency * 1000 for results in samples.values() for latency, _ in results)
+    total = {
+        "requests": len(everything),
+        "errors": sum(stats["errors"] for stats in operations.values()),
+        "rps": round(len(everything) / elapsed, 2),
+        "p50_ms": round(percentile(everything, 50), 3),
+        "p95_ms": round(percentile(everything, 95), 3),
+        "p99_ms": round(percentile(everything, 99), 3),
+        "seconds": round(elapsed, 3),
+    }
+    return {"total": total, "operations": operations}
+
+
+def compare(result: dict, baseline: dict, max_regression: float = 0.2) -> list:
+    """
+    Porównuje wynik z bazowym.
+
+    Regresją jest wzrost p95 albo spadek RPS o więcej niż `max_regression`
+    (ułamek) dla operacji obecnej w obu wynikach, a także błędy operacji,
+    która w wyniku bazowym ich nie miała.
+
+    Returns:
+        list: Opisy regresji (pusta, jeśli ich nie ma).
+    """
+    regressions = []
+    for name, current in result["operations"].items():
+        base = baseline.get("operations", {}).get(name)
+        if base is None:
+            continue
+        if base["p95_ms"] and current["p95_ms"] > base["p95_ms"] * (1 + max_regression):
+            regressions.append(f"{name}: p95 {current['p95_ms']:.1f} ms vs {base['p95_ms']:.1f} ms")
+        if base["rps"] and current["rps"] < base["rps"] * (1 - max_regression):
+            regressions.append(f"{name}: {current['rps']:.1f} RPS vs {base['rps']:.1f} RPS")
+        if current["errors"] and not base["errors"]:
+            regressions.append(f"{name}: {current['errors']} errors (baseline: none)")
+    return regressions
+
+
+class VirtualUser:
+    """
+    Klient wykonujący operacje jako jeden użytkownik.
+
+    Args:
+        client (httpx.AsyncClient): Klient HTTP.
+        username (str): Nazwa użytkownika.
+        password (str): Hasło.
+        search_terms (list): Prefiksy do wyszukiwania.
+        rng (random.Random): Generator losowy klienta.
+    """
+
+    OPERATIONS = ("list", "search", "get", "create", "update", "delete", "birthdays", "refresh", "token")
+
+    def __init__(self, client, username: str, password: str, search_terms: list, rng: random.Random):
+        self.client = client
+        self.username = username
+        self.password = password
+        self.search_terms = search_terms
+        self.rng = rng
+        self.headers = {}
+        self.refresh_token = None
+        self.contact_ids = []
+        self.created_ids = []
+        self.sequence = 0
+
+    async def login(self) -> bool:
+        response = await self.client.post("/token/", data={"username": self.username, "password": self.password})
+        if response.status_code != 200:
+            return False
+        self._use_token(response.json())
+        return True
+
+    def _use_token(self, token: dict):
+        self.headers = {"Authorization": f"Bearer {token['access_token']}"}
+        self.refresh_token = token.get("refresh_token")
+
+    def _contact(self) -> dict:
+        self.sequence += 1
+        return {
+            "first_name": "Bench",
+            "last_name": f"Load{self.rng.randrange(10 ** 6)}",
+            "email": f"bench.{self.username}.{self.sequence}.{self.rng.randrange(10 ** 9)}@example.com",
+            "phone_number": "555-000-0000",
+            "birth_date": date(1990, self.rng.randrange(1, 13), self.rng.randrange(1, 29)).isoformat(),
+            "additional_data": "api_bench",
+        }
+
+    async def prepare(self) -> bool:
+        """
+        Loguje się i pobiera identyfikatory pierwszej strony kontaktów (poza pomiarem).
+        """
+        if not await self.login():
+            return False
+        response = await self.client.get("/contacts/", params={"limit": 100}, headers=self.headers)
+        if response.status_code == 200:
+            self.contact_ids = [item["id"] for item in response.json()["items"]]
+        return True
+
+    async def run(self, operation: str):
+        """
+        Wykonuje operację.
+
+        Returns:
+            tuple: (nazwa wykonanej operacji, czy się udała). Bez kontaktów do odczytu
+            albo usunięcia zamiast nich tworzony jest kontakt.
+        """
+        if operation in ("get", "update") and not self.contact_ids or operation == "delete" and not self.created_ids:
+            operation = "create"
+        client, headers = self.client, self.headers
+        if operation == "list":
+            response = await client.get("/contacts/", params={"limit": 50}, headers=headers)
+        elif operation == "search":
+            response = await client.get("/contacts/", params={"search": self.rng.choice(self.search_terms)}, headers=headers)
+        elif operation == "get":
+            response = await client.get(f"/contacts/{self.rng.choice(self.contact_ids)}", headers=headers)
+        elif operation == "create":
+            response = await client.post("/contacts/", json=self._contact(), headers=headers)
+            if response.status_code == 200:
+                self.created_ids.append(response.json()["id"])
+        elif operation == "update":
+            response = await client.put(f"/contacts/{self.rng.choice(self.contact_ids)}", json=self._contact(), headers=headers)
+        elif operation == "delete":
+            response = await client.delete(f"/contacts/{self.created_ids.pop()}", headers=headers)
+        elif operation == "birthdays":
+            response = await client.get("/contacts/birthdays/", params={"days": 30}, headers=headers)
+        elif operation == "refresh":
+            response = await client.post("/refresh-token/", json={"refresh_token": self.refresh_token})
+            if response.status_code == 200:
+                self._use_token(response.json())
+        else:
+            response = await client.post("/token/", data={"username": self.username, "password": self.password})
+            if response.status_code == 200:
+                self._use_token(response.json())
+        return operation, response.status_code < 400
+
+
+async def drive(client, usernames: list, password: str, search_terms: list, concurrency: int, duration: float,
+                warmup: float = 0.0, mix: dict = None, seed: int = 0) -> dict:
+    """
+    Wysyła żądania z `concurrency` klientów przez `warmup` + `duration` sekund.
+
+    Returns:
+        dict: Wynik `summarize` dla okresu po rozgrzewce.
+    """
+    mix = mix or parse_mix(DEFAULT_MIX)
+    operations, weights = list(mix), list(mix.values())
+    users = [
+        VirtualUser(client, usernames[i % len(usernames)], password, search_terms, random.Random(f"{seed}:{i}"))
+        for i in range(concurrency)
+    ]
+    prepared = await asyncio.gather(*(user.prepare() for user in users))
+    if not all(prepared):
+        raise RuntimeError("Login failed; check --password and that the users exist (seeded users are user<id>)")
+
+    samples = {name: [] for name in operations}
+    loop = asyncio.get_running_loop()
+    measure_from = loop.time() + warmup
+    deadline = measure_from + duration
+
+    async def worker(user):
+        while loop.time() < deadline:
+            started = time.perf_counter()
+            try:
+                name, ok = await user.run(user.rng.choices(operations, weights)[0])
+            except Exception:
+                name, ok = "error", False
+            if loop.time() >= measure_from:
+                samples.setdefault(name, []).append((time.perf_counter() - started, ok))
+
+    await asyncio.gather(*(worker(user) for user in users))
+    return summarize({name: results for name, results in samples.items() if results}, duration)
+
+
+def prepare_database(users: int, contacts: int, seed: int):
+    """
+    Tworzy schemat bazy DATABASE_URL i, jeśli jest pusta, wypełnia ją danymi z `db.data_faker`.
+    """
+    from sqlalchemy import func, select
+    from db.dbs import engine, init_db
+    from db.data_faker import seed_database
+    from models import Contact
+
+    init_db()
+    with engine.connect() as conn:
+        existing = conn.scalar(select(func.count()).select_from(Contact.__table__))
+    if existing:
+        print(f"Baza ma już {existing} kontaktów, pomijam generowanie danych.", file=sys.stderr)
+    else:
+        seed_database(engine, users, contacts, seed=seed)
+    engine.dispose()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.contextmanager
+def uvicorn_server(workers: int = 1, timeout: float = 60.0):
+    """
+    Uruchamia `uvicorn main:app` w osobnym procesie i zwraca jego adres.
+    """
+    import httpx
+
+    port = _free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=ROOT,
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        started = time.monotonic()
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError("uvicorn exited during startup")
+            try:
+                httpx.get(f"{url}/openapi.json", timeout=1.0)
+                break
+            except httpx.TransportError:
+                if time.monotonic() - started > timeout:
+                    raise RuntimeError("uvicorn did not start in time")
+                time.sleep(0.2)
+        yield url
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+async def run_benchmark(args, search_terms: list) -> dict:
+    import httpx
+
+    usernames = [f"user{i}" for i in range(1, args.users + 1)]
+    limits = httpx.Limits(max_connections=args.concurrency)
+    options = dict(
+        usernames=usernames, password=args.password, search_terms=search_terms, concurrency=args.concurrency,
+        duration=args.duration, warmup=args.warmup, mix=parse_mix(args.mix), seed=args.seed,
+    )
+    if args.server == "asgi":
+        from main import app
+
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", limits=limits) as client:
+                return await drive(client, **options)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=30.0) as client:
+        return await drive(client, **options)
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50, help="liczba użytkowników (i kont logujących się klientów)")
+    parser.add_argument("--contacts", type=int, default=50000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--database-url", help="baza do wypełnienia (domyślnie tymczasowy SQLite)")
+    parser.add_argument("--server", choices=["uvicorn", "asgi"], default="uvicorn")
+    parser.add_argument("--server-workers", type=int, default=1, help="procesy uvicorn")
+    parser.add_argument("--url", help="adres działającego serwera (bez uruchamiania aplikacji i generowania danych)")
+    parser.add_argument("--password", default="password")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=20.0, help="czas pomiaru w sekundach")
+    parser.add_argument("--warmup", type=float, default=3.0, help="rozgrzewka bez pomiaru w sekundach")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="wagi operacji")
+    parser.add_argument("--rate-limits", action="store_true", help="nie wyłączaj limitów żądań")
+    parser.add_argument("--output", help="plik JSON z wynikiem")
+    parser.add_argument("--baseline", help="plik JSON z wynikiem bazowym do porównania")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="dopuszczalna regresja p95/RPS (ułamek)")
+    args = parser.parse_args()
+
+    server = args.url or args.server
+    with tempfile.TemporaryDirectory() as directory:
+        if args.url is None:
+            # Konfiguracja aplikacji jest czytana ze zmiennych środowiskowych (także przez proces uvicorn).
+            os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(directory, 'bench.db')}"
+            os.environ.setdefault("SECRET_KEY", "api-bench")
+            os.environ.setdefault("ALGORITHM", "HS256")
+            os.environ["MAIL_TRANSPORT"] = "memory"
+            os.environ["UNVERIFIED_CLEANUP_INTERVAL"] = "0"
+            if not args.rate_limits:
+                os.environ["RATE_LIMIT_BACKEND"] = "none"
+            os.environ["PYTHONPATH"] = os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")]))
+            prepare_database(args.users, args.contacts, args.seed)
+
+        from db.data_faker import word_pools
+        search_terms = sorted({name[:3] for name in word_pools(args.seed)["last_names"]})
+
+        if args.url is None and args.server == "uvicorn":
+            with uvicorn_server(args.server_workers) as url:
+                args.url = url
+                result = asyncio.run(run_benchmark(args, search_terms))
+        else:
+            result = asyncio.run(run_benchmark(args, search_terms))
+
+    result["meta"] = {
+        "server": server,
+        "users": args.users, "contacts": args.contacts, "concurrency": args.concurrency,
+        "duration": args.duration, "mix": args.mix, "python": platform.python_version(),
+        "platform": platform.platform(), "revision": _git_revision(),
+    }
+
+    print(f"{'operacja':<12}{'żądania':>10}{'błędy':>8}{'RPS':>10}{'p50 [ms]':>11}{'p95 [ms]':>11}{'p99 [ms]':>11}")
+    for name, stats in list(result["operations"].items()) + [("razem", result["total"])]:
+        print(f"{name:<12}{stats['requests']:>10}{stats['errors']:>8}{stats['rps']:>10.1f}"
+              f"{stats['p50_ms']:>11.1f}{stats['p95_ms']:>11.1f}{stats['p99_ms']:>11.1f}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(result, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            regressions = compare(result, json.load(file), args.max_regression)
+        for regression in regressions:
+            print(f"REGRESJA: {regression}")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
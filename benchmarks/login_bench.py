@@ -0,0 +1,85 @@
+"""
+Przepustowość logowania: weryfikacja bcrypt w pętli zdarzeń kontra w puli wykonawców.
+
+Dla każdego trybu wykonywane jest `--logins` weryfikacji hasła przy `--concurrency`
+równoległych żądaniach. Oprócz liczby logowań na sekundę mierzone jest największe
+opóźnienie pętli zdarzeń, czyli jak długo inne żądania musiałyby czekać.
+
+Uruchomienie:
+    python -m benchmarks.login_bench --logins 64 --concurrency 16 --rounds 12 --workers 4
+"""
+import argparse
+import asyncio
+import os
+import time
+
+
+async def heartbeat(stop: asyncio.Event, interval: float = 0.005):
+    """
+    Mierzy największe opóźnienie pętli zdarzeń (w sekundach).
+    """
+    worst = 0.0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - started - interval)
+    return worst
+
+
+async def run(verify, hashed: str, logins: int, concurrency: int):
+    """
+    Wykonuje `logins` weryfikacji, najwyżej `concurrency` naraz.
+
+    Returns:
+        tuple: (logowania na sekundę, największe opóźnienie pętli w ms).
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def login():
+        async with semaphore:
+            valid, _ = await verify("benchmark-password", hashed)
+            assert valid
+
+    stop = asyncio.Event()
+    lag = asyncio.create_task(heartbeat(stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    return logins / elapsed, await lag * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--executor", choices=["thread", "process"], default="thread")
+    args = parser.parse_args()
+
+    # Konfiguracja jest czytana przy imporcie modułu.
+    os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+    os.environ["PASSWORD_HASH_WORKERS"] = str(args.workers)
+    os.environ["PASSWORD_HASH_EXECUTOR"] = args.executor
+    from auth.passwords import pwd_context, verify_password, shutdown_executor
+
+    hashed = pwd_context.hash("benchmark-password")
+
+    async def verify_on_loop(password, hashed_password):
+        return pwd_context.verify_and_update(password, hashed_password)
+
+    results = {
+        "w pętli zdarzeń": asyncio.run(run(verify_on_loop, hashed, args.logins, args.concurrency)),
+        f"pula ({args.executor}, {args.workers})": asyncio.run(run(verify_password, hashed, args.logins, args.concurrency)),
+    }
+    shutdown_executor()
+
+    print(f"bcrypt cost={args.rounds}, logins={args.logins}, concurrency={args.concurrency}")
+    print(f"{'tryb':<24}{'logowania/s':>14}{'max opóźnienie pętli [ms]':>28}")
+    for mode, (rate, lag) in results.items():
+        print(f"{mode:<24}{rate:>14.1f}{lag:>28.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Koszt jednego sprawdzenia limitu żądań: dawny dekorator skanujący listę kontra token bucket.
+
+Dawny `rate_limited` trzymał czasy wszystkich wywołań na liście i przy każdym
+żądaniu przeglądał ją całą, więc koszt rósł z liczbą obsłużonych żądań.
+Token bucket przechowuje dla klienta tylko liczbę żetonów i czas ostatniej
+aktualizacji, więc koszt sprawdzenia jest stały. Dla każdej liczby wcześniejszych
+żądań mierzony jest średni czas `--checks` kolejnych sprawdzeń.
+
+Uruchomienie:
+    python -m benchmarks.ratelimit_bench --sizes 100,1000,10000,100000 --checks 1000 [--redis redis://localhost:6379/0]
+"""
+import argparse
+import asyncio
+import time
+
+from api.ratelimit import MemoryRateLimiter, RedisRateLimiter
+
+
+def list_scan_check(calls: list, now: float, max_calls: int, time_frame: float) -> bool:
+    """
+    Sprawdzenie z dawnego dekoratora `rate_limited` (bez wyjątku HTTP).
+    """
+    calls_in_time_frame = [call for call in calls if call > now - time_frame]
+    if len(calls_in_time_frame) >= max_calls:
+        return False
+    calls.append(now)
+    return True
+
+
+def bench_list_scan(previous: int, checks: int) -> float:
+    # Limit nie jest osiągany, więc lista rośnie jak przy ruchu poniżej limitu.
+    now = time.time()
+    calls = [now - i * 1e-3 for i in range(previous)]
+    started = time.perf_counter()
+    for _ in range(checks):
+        list_scan_check(calls, now, previous + checks + 1, 3600)
+    return (time.perf_counter() - started) / checks
+
+
+def bench_token_bucket(previous: int, checks: int) -> float:
+    limiter = MemoryRateLimiter()
+    for i in range(previous):
+        limiter.hit_nowait("user:bench", previous + checks + 1, 3600, now=float(i))
+    started = time.perf_counter()
+    for _ in range(checks):
+        limiter.hit_nowait("user:bench", previous + checks + 1, 3600)
+    return (time.perf_counter() - started) / checks
+
+
+async def bench_redis(url: str, previous: int, checks: int) -> float:
+    from cache import redis_client
+
+    limiter = RedisRateLimiter(redis_client(url), prefix="ratelimit-bench")
+    limit = previous + checks + 1
+    for _ in range(previous):
+        await limiter.hit(f"user:{previous}", limit, 3600)
+    started = time.perf_counter()
+    for _ in range(checks):
+        await limiter.hit(f"user:{previous}", limit, 3600)
+    return (time.perf_counter() - started) / checks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100,1000,10000,100000", help="liczby wcześniejszych żądań")
+    parser.add_argument("--checks", type=int, default=1000)
+    parser.add_argument("--redis", help="adres Redisa (albo fakeredis://) dla backendu redis")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    columns = ["lista [µs]", "token bucket [µs]"] + (["redis [µs]"] if args.redis else [])
+    print(f"{'wcześniejsze żądania':<22}" + "".join(f"{column:>20}" for column in columns))
+    for size in sizes:
+        timings = [bench_list_scan(size, args.checks), bench_token_bucket(size, args.checks)]
+        if args.redis:
+            # Przy Redisie wcześniejsze żądania są wysyłane naprawdę, więc rozmiary ograniczamy.
+            timings.append(asyncio.run(bench_redis(args.redis, min(size, 10000), args.checks)))
+        print(f"{size:<22}" + "".join(f"{timing * 1e6:>20.2f}" for timing in timings))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Porównanie wyszukiwania kontaktów: ILIKE '%q%' kontra indeks pełnotekstowy (FTS5).
+
+Fraza pasująca do niemal wszystkich wierszy (np. "example") jest najdroższa dla FTS,
+bo ranking wymaga oceny każdego dopasowania.
+
+Uruchomienie:
+    python -m benchmarks.search_bench --rows 200000 --repeat 20
+"""
+import argparse
+import asyncio
+import random
+import string
+import tempfile
+import time
+from sqlalchemy import create_engine, Column, Integer, String, MetaData, Table, or_
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from db.search import init_search, search_contact_ids
+
+
+SYLLABLES = ["ko", "wal", "ski", "no", "wak", "le", "wan", "dow", "mi", "ra", "ta", "zy", "ber", "an", "na", "jo", "han"]
+QUERIES = ["kowal", "anna", "lewan", "dowmi", "wakta", "abcdef", "brak", "example"]
+
+
+metadata = MetaData()
+contacts = Table(
+    "contacts",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("first_name", String, index=True),
+    Column("last_name", String, index=True),
+    Column("email", String, index=True),
+)
+
+
+def seed(engine, rows: int, batch_size: int = 10000):
+    """
+    Wypełnia tabelę kontaktów losowymi (deterministycznymi) danymi.
+    """
+    rnd = random.Random(42)
+    with engine.begin() as conn:
+        for start in range(0, rows, batch_size):
+            batch = []
+            for i in range(start, min(start + batch_size, rows)):
+                first = "".join(rnd.choices(SYLLABLES, k=2)).capitalize()
+                last = "".join(rnd.choices(SYLLABLES, k=3)).capitalize()
+                suffix = "".join(rnd.choices(string.ascii_lowercase, k=6))
+                batch.append({
+                    "first_name": first,
+                    "last_name": last,
+                    "email": f"{first.lower()}.{suffix}{i}@example.com",
+                })
+            conn.execute(contacts.insert(), batch)
+
+
+def _ilike_query(db, q: str):
+    return db.query(contacts.c.id).filter(or_(
+        contacts.c.first_name.ilike(f"%{q}%"),
+        contacts.c.last_name.ilike(f"%{q}%"),
+        contacts.c.email.ilike(f"%{q}%"),
+    ))
+
+
+def ilike_all(db, q: str, limit: int):
+    """
+    Dawna ścieżka endpointu: wszystkie dopasowania, bez limitu.
+    """
+    return [row.id for row in _ilike_query(db, q)]
+
+
+def ilike_page(db, q: str, limit: int):
+    """
+    ILIKE z limitem strony (skanowanie kończy się po `limit` dopasowaniach).
+    """
+    return [row.id for row in _ilike_query(db, q).order_by(contacts.c.id).limit(limit)]
+
+
+def measure(func, db, repeat: int, limit: int):
+    """
+    Zwraca średni czas (ms) jednego zapytania dla każdej frazy z QUERIES.
+    """
+    results = {}
+    for q in QUERIES:
+        started = time.perf_counter()
+        for _ in range(repeat):
+            func(db, q, limit)
+        results[q] = (time.perf_counter() - started) / repeat * 1000
+    return results
+
+
+async def measure_async(func, url: str, repeat: int, limit: int):
+    """
+    Jak `measure`, ale dla funkcji asynchronicznej wywoływanej z sesją AsyncSession.
+    """
+    engine = create_async_engine(url)
+    results = {}
+    async with AsyncSession(engine) as db:
+        for q in QUERIES:
+            started = time.perf_counter()
+            for _ in range(repeat):
+                await func(db, q, limit)
+            results[q] = (time.perf_counter() - started) / repeat * 1000
+    await engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{tmp}/bench.db")
+        metadata.create_all(engine)
+        seed(engine, args.rows)
+        init_search(engine)
+        db = sessionmaker(bind=engine)()
+
+        full = measure(ilike_all, db, args.repeat, args.limit)
+        page = measure(ilike_page, db, args.repeat, args.limit)
+        db.close()
+        engine.dispose()
+        fts = asyncio.run(measure_async(search_contact_ids, f"sqlite+aiosqlite:///{tmp}/bench.db", args.repeat, args.limit))
+
+    print(f"{'fraza':<12}{'ILIKE [ms]':>12}{'ILIKE+LIMIT':>13}{'FTS [ms]':>10}{'vs ILIKE':>10}")
+    for q in QUERIES:
+        print(f"{q:<12}{full[q]:>12.2f}{page[q]:>13.2f}{fts[q]:>10.2f}{full[q] / fts[q]:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Czas importu aplikacji (zimny start procesu) mierzony przez `python -X importtime`.
+
+Każdy pomiar to osobny proces `python -X importtime -c "import main"`, więc
+wynik obejmuje cały import aplikacji bez cache modułów z poprzednich pomiarów.
+Raportowana jest mediana łącznego czasu importu i moduły o największym
+czasie własnym. Import nie może łączyć się z bazą ani ładować ciężkich,
+opcjonalnych zależności (`HEAVY_MODULES`); są one importowane dopiero przy
+pierwszym użyciu. Przekroczenie budżetu (`--budget-ms`) albo załadowanie
+któregoś z tych modułów kończy skrypt kodem 1, więc można go użyć w CI.
+
+Uruchomienie:
+    python -m benchmarks.startup_bench --runs 5 --budget-ms 1500 [--module main]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Pakiety, które nie powinny być ładowane przy starcie aplikacji.
+HEAVY_MODULES = ("alembic", "cloudinary", "jinja2", "faker", "PIL", "boto3")
+
+
+def parse_importtime(output: str) -> dict:
+    """
+    Odczytuje wynik `-X importtime`.
+
+    Args:
+        output (str): Standardowe wyjście błędów procesu.
+
+    Returns:
+        dict: Nazwa modułu -> (czas własny, czas łączny) w mikrosekundach.
+    """
+    modules = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def measure(module: str = "main", env: dict = None) -> dict:
+    """
+    Importuje `module` w nowym procesie i zwraca czasy importu wszystkich modułów.
+
+    Raises:
+        RuntimeError: Gdy import się nie powiódł.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    return parse_importtime(result.stderr)
+
+
+def heavy_modules(modules: dict) -> list:
+    """
+    Zwraca załadowane pakiety z `HEAVY_MODULES`.
+    """
+    return sorted({name.split(".")[0] for name in modules} & set(HEAVY_MODULES))
+
+
+def startup_env(directory: str) -> dict:
+    """
+    Środowisko pomiaru: bez DATABASE_URL używana jest nieistniejąca baza SQLite,
+    więc pomiar nie zależy od dostępności bazy (i wykrywa połączenie przy imporcie).
+    """
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(directory, 'startup_bench.db')}")
+    env.setdefault("SECRET_KEY", "startup-bench")
+    env.setdefault("ALGORITHM", "HS256")
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [ROOT, env.get("PYTHONPATH")]))
+    return env
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main", help="importowany moduł")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, help="maksymalna mediana czasu importu w ms")
+    parser.add_argument("--top", type=int, default=15, help="liczba modułów w raporcie")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        env = startup_env(directory)
+        runs = [measure(args.module, env) for _ in range(args.runs)]
+        database_created = os.path.exists(os.path.join(directory, "startup_bench.db"))
+
+    totals = [run[args.module][1] / 1000 for run in runs]
+    median = statistics.median(totals)
+    print(f"import {args.module}: mediana {median:.1f} ms (min {min(totals):.1f}, max {max(totals):.1f}, {args.runs} pomiarów)")
+    print(f"{'moduł':<50}{'własny [ms]':>14}{'łączny [ms]':>14}")
+    slowest = sorted(runs[0].items(), key=lambda item: item[1][0], reverse=True)[:args.top]
+    for name, (self_us, cumulative_us) in slowest:
+        print(f"{name:<50}{self_us / 1000:>14.1f}{cumulative_us / 1000:>14.1f}")
+
+    failures = []
+    loaded = heavy_modules(runs[0])
+    if loaded:
+        failures.append(f"ciężkie moduły ładowane przy starcie: {', '.join(loaded)}")
+    if database_created:
+        failures.append("import utworzył plik bazy danych (połączenie z bazą przy imporcie)")
+    if args.budget_ms is not None and median > args.budget_ms:
+        failures.append(f"mediana {median:.1f} ms przekracza budżet {args.budget_ms:.0f} ms")
+    for failure in failures:
+        print(f"BŁĄD: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
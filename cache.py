@@ -0,0 +1,198 @@
+import threading
+import time
+from collections import OrderedDict
+from metrics import Counter, Gauge
+
+
+CACHE_HITS = Counter("cache_hits_total", "Liczba trafień w cache.", ["cache"])
+CACHE_MISSES = Counter("cache_misses_total", "Liczba chybień w cache.", ["cache"])
+CACHE_EVICTIONS = Counter("cache_evictions_total", "Liczba wpisów usuniętych z cache z braku miejsca.", ["cache"])
+CACHE_EXPIRATIONS = Counter("cache_expirations_total", "Liczba wpisów usuniętych z cache po upływie TTL.", ["cache"])
+CACHE_INVALIDATIONS = Counter("cache_invalidations_total", "Liczba wpisów unieważnionych przez zapis.", ["cache"])
+
+
+_cache_names = set()
+
+
+def _hit_ratios():
+    ratios = {}
+    for name in sorted(_cache_names):
+        hits, misses = CACHE_HITS.value(cache=name), CACHE_MISSES.value(cache=name)
+        if hits + misses:
+            ratios[(name,)] = hits / (hits + misses)
+    return ratios
+
+
+Gauge("cache_hit_ratio", "Udział trafień we wszystkich odczytach z cache.", ["cache"], collect=_hit_ratios)
+
+
+class MemoryCache:
+    """
+    Cache LRU w pamięci procesu z czasem życia wpisów (TTL).
+
+    Args:
+        name (str): Nazwa cache używana w metrykach.
+        ttl (float): Czas życia wpisu w sekundach.
+        maxsize (int): Maksymalna liczba wpisów.
+    """
+
+    def __init__(self, name: str, ttl: float, maxsize: int):
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        _cache_names.add(name)
+        self._lock = threading.Lock()
+
+    async def get(self, key: str):
+        return self.get_nowait(key)
+
+    async def set(self, key: str, value, ttl: float = None):
+        self.set_nowait(key, value, ttl)
+
+    async def delete(self, *keys: str):
+        self.delete_nowait(*keys)
+
+    def get_nowait(self, key: str):
+        """
+        Zwraca wartość z cache albo None, jeśli jej nie ma lub wygasła.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                del self._entries[key]
+                CACHE_EXPIRATIONS.inc(cache=self.name)
+                entry = None
+            if entry is None:
+                CACHE_MISSES.inc(cache=self.name)
+                return None
+            self._entries.move_to_end(key)
+        CACHE_HITS.inc(cache=self.name)
+        return entry[1]
+
+    def set_nowait(self, key: str, value, ttl: float = None):
+        """
+        Zapisuje wartość, usuwając najdawniej używane wpisy po przekroczeniu `maxsize`.
+        """
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                CACHE_EVICTIONS.inc(cache=self.name)
+
+    def delete_nowait(self, *keys: str):
+        """
+        Usuwa wpisy (np. po zmianie danych w bazie).
+        """
+        with self._lock:
+            for key in keys:
+                if self._entries.pop(key, None) is not None:
+                    CACHE_INVALIDATIONS.inc(cache=self.name)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisCache:
+    """
+    Cache w Redisie, współdzielony przez wszystkie procesy aplikacji.
+
+    Wpisy wygasają po TTL ustawionym w Redisie; usuwanie z braku miejsca
+    zależy od polityki `maxmemory-policy` serwera i nie jest liczone w metrykach.
+
+    Args:
+        name (str): Nazwa cache używana w metrykach i jako prefiks kluczy.
+        ttl (float): Czas życia wpisu w sekundach.
+        client (redis.asyncio.Redis): Klient Redisa.
+    """
+
+    def __init__(self, name: str, ttl: float, client):
+        self.name = name
+        self.ttl = ttl
+        self.client = client
+        _cache_names.add(name)
+
+    def _key(self, key: str) -> str:
+        return f"{self.name}:{key}"
+
+    async def get(self, key: str):
+        value = await self.client.get(self._key(key))
+        if value is None:
+            CACHE_MISSES.inc(cache=self.name)
+            return None
+        CACHE_HITS.inc(cache=self.name)
+        return value.decode() if isinstance(value, bytes) else value
+
+    async def set(self, key: str, value, ttl: float = None):
+        await self.client.set(self._key(key), value, px=int((self.ttl if ttl is None else ttl) * 1000))
+
+    async def delete(self, *keys: str):
+        if keys:
+            deleted = await self.client.delete(*(self._key(key) for key in keys))
+            CACHE_INVALIDATIONS.inc(deleted, cache=self.name)
+
+
+class NullCache:
+    """
+    Cache, który niczego nie przechowuje (wyłączony cache).
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+    async def get(self, key: str):
+        return None
+
+    async def set(self, key: str, value, ttl: float = None):
+        pass
+
+    async def delete(self, *keys: str):
+        pass
+
+
+_redis_clients = {}
+
+
+def redis_client(url: str):
+    """
+    Zwraca współdzielonego klienta Redisa dla danego adresu.
+
+    Adres `fakeredis://` tworzy klienta fakeredis (lokalny zamiennik do testów).
+    """
+    if url not in _redis_clients:
+        if url.startswith("fakeredis://"):
+            import fakeredis
+            _redis_clients[url] = fakeredis.FakeAsyncRedis()
+        else:
+            import redis.asyncio
+            _redis_clients[url] = redis.asyncio.from_url(url)
+    return _redis_clients[url]
+
+
+def create_cache(name: str, backend: str, ttl: float, maxsize: int = 10000, redis_url: str = None):
+    """
+    Tworzy cache o wybranym backendzie.
+
+    Args:
+        name (str): Nazwa cache.
+        backend (str): "memory", "redis" albo "none".
+        ttl (float): Czas życia wpisu w sekundach.
+        maxsize (int, optional): Maksymalna liczba wpisów w cache w pamięci. Defaults to 10000.
+        redis_url (str, optional): Adres Redisa dla backendu "redis". Defaults to None.
+
+    Returns:
+        MemoryCache | RedisCache | NullCache: Obiekt cache.
+    """
+    if backend == "none" or ttl <= 0:
+        return NullCache(name)
+    if backend == "redis":
+        return RedisCache(name, ttl, redis_client(redis_url))
+    if backend == "memory":
+        return MemoryCache(name, ttl, maxsize)
+    raise ValueError(f"Unknown cache backend: {backend}")
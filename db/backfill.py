@@ -0,0 +1,265 @@
+"""
+Migracje danych uruchamiane online: uzupełnianie nowych kolumn partiami.
+
+Zmiana schematu dużej tabeli odbywa się w trzech krokach:
+
+1. migracja Alembica "expand" dodaje kolumnę jako NULL-owalną (bez przepisywania tabeli),
+2. backfill z tego modułu uzupełnia ją partiami, przy działającej aplikacji,
+3. migracja "contract" (np. NOT NULL, usunięcie starych indeksów) sprawdza
+   funkcją `ensure_backfilled`, że backfill został zakończony.
+
+Każda partia to osobna, krótka transakcja: wybór kolejnych `batch_size`
+wierszy po kluczu głównym (keyset), aktualizacja i zapis punktu kontrolnego
+w tabeli `data_migrations`. Przerwany backfill (Ctrl+C, restart, błąd)
+wznawia się od ostatniej zatwierdzonej partii, a przerwy między partiami
+(`pause`) ograniczają obciążenie bazy.
+
+Uruchomienie:
+    python -m db.backfill status
+    python -m db.backfill run contacts_birth_md --batch-size 1000 --pause 0.1
+    python -m db.backfill run --all
+"""
+import argparse
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Callable
+from sqlalchemy import (
+    Boolean, Column, DateTime, Integer, MetaData, String, Table, bindparam, exists, select, update,
+)
+from models import Contact, User, birth_md_of, utcnow
+
+
+logger = logging.getLogger(__name__)
+
+
+metadata = MetaData()
+
+# Punkty kontrolne backfilli: ostatni przetworzony klucz główny i liczba zmienionych wierszy.
+checkpoints = Table(
+    "data_migrations",
+    metadata,
+    Column("name", String(100), primary_key=True),
+    Column("last_id", Integer, nullable=False, default=0),
+    Column("rows", Integer, nullable=False, default=0),
+    Column("done", Boolean, nullable=False, default=False),
+    Column("updated_at", DateTime, nullable=False, default=utcnow, onupdate=utcnow),
+)
+
+
+@dataclass
+class Backfill:
+    """
+    Opis migracji danych.
+
+    Attributes:
+        name (str): Nazwa (klucz punktu kontrolnego).
+        table (Table): Tabela z jednokolumnowym, całkowitym kluczem głównym `id`.
+        columns (tuple): Kolumny odczytywane dla każdego wiersza.
+        pending (Callable): Funkcja zwracająca warunek wierszy, które wymagają uzupełnienia.
+        apply (Callable): Funkcja `(conn, rows) -> int` aktualizująca partię; zwraca liczbę zmienionych wierszy.
+    """
+    name: str
+    table: Table
+    columns: tuple
+    pending: Callable
+    apply: Callable
+
+
+BACKFILLS = {}
+
+
+def backfill(name: str, table: Table, columns: tuple, pending: Callable):
+    """
+    Rejestruje funkcję aktualizującą partię jako backfill o nazwie `name`.
+    """
+    def register(apply):
+        BACKFILLS[name] = Backfill(name, table, columns, pending, apply)
+        return apply
+    return register
+
+
+def _checkpoint(conn, name: str):
+    return conn.execute(select(checkpoints).where(checkpoints.c.name == name)).first()
+
+
+def _save_checkpoint(conn, name: str, last_id: int, rows: int, done: bool):
+    values = {"last_id": last_id, "rows": rows, "done": done, "updated_at": utcnow()}
+    result = conn.execute(update(checkpoints).where(checkpoints.c.name == name).values(**values))
+    if result.rowcount == 0:
+        conn.execute(checkpoints.insert().values(name=name, **values))
+
+
+def run_backfill(engine, name: str, batch_size: int = 1000, pause: float = 0.1,
+                 max_batches: int = None, restart: bool = False) -> dict:
+    """
+    Uruchamia (albo wznawia) backfill partiami.
+
+    Niedokończony backfill jest wznawiany od punktu kontrolnego. Ponowne
+    uruchomienie zakończonego przechodzi tabelę jeszcze raz, więc uzupełnia
+    też wiersze zapisane w międzyczasie przez starszą wersję aplikacji.
+
+    Args:
+        engine (Engine): Silnik bazy danych.
+        name (str): Nazwa backfillu z `BACKFILLS`.
+        batch_size (int, optional): Liczba wierszy w partii. Defaults to 1000.
+        pause (float, optional): Przerwa między partiami w sekundach. Defaults to 0.1.
+        max_batches (int, optional): Zatrzymuje się po tylu partiach (wznowienie kolejnym wywołaniem).
+            Defaults to None (do końca).
+        restart (bool, optional): Zaczyna od początku tabeli także wtedy, gdy backfill nie jest zakończony.
+            Defaults to False.
+
+    Returns:
+        dict: Stan backfillu: `last_id`, `rows` i `done`.
+    """
+    job = BACKFILLS[name]
+    key = job.table.c.id
+    metadata.create_all(engine, tables=[checkpoints])
+    with engine.begin() as conn:
+        state = _checkpoint(conn, name)
+    if state is not None and not state.done and not restart:
+        last_id, rows = state.last_id, state.rows
+    else:
+        last_id, rows = 0, 0
+    done = False
+    batches = 0
+    while not done and (max_batches is None or batches < max_batches):
+        started = time.monotonic()
+        with engine.begin() as conn:
+            batch = conn.execute(
+                select(key, *job.columns)
+                .where(key > last_id, job.pending())
+                .order_by(key)
+                .limit(batch_size)
+            ).all()
+            if batch:
+                rows += job.apply(conn, batch)
+                last_id = batch[-1].id
+            done = len(batch) < batch_size
+            _save_checkpoint(conn, name, last_id, rows, done)
+        batches += 1
+        logger.info("Backfill %s: %d rows up to id %d (%.3fs)", name, len(batch), last_id, time.monotonic() - started)
+        if not done and pause:
+            time.sleep(pause)
+    return {"last_id": last_id, "rows": rows, "done": done}
+
+
+def pending_rows(conn, name: str) -> bool:
+    """
+    Sprawdza, czy w tabeli są jeszcze wiersze do uzupełnienia przez backfill.
+    """
+    job = BACKFILLS[name]
+    return bool(conn.scalar(select(exists().where(job.pending()))))
+
+
+def ensure_backfilled(conn, *names: str):
+    """
+    Przerywa migrację "contract", jeśli któryś z backfilli nie został dokończony.
+
+    Sprawdzane są dane, a nie tylko punkty kontrolne, więc na pustej bazie
+    (np. przy `alembic upgrade head` od zera) warunek jest od razu spełniony.
+
+    Raises:
+        RuntimeError: Gdy w bazie są wiersze wymagające uzupełnienia.
+    """
+    unfinished = [name for name in names if pending_rows(conn, name)]
+    if unfinished:
+        commands = "; ".join(f"python -m db.backfill run {name}" for name in unfinished)
+        raise RuntimeError(f"Unfinished data migrations: {', '.join(unfinished)}. Run: {commands}")
+
+
+# Migracje danych
+#
+# Kolumna `contacts.updated_at` ma `onupdate`, więc backfille przepisują ją
+# jawnie na samą siebie: uzupełnienie danych nie zmienia ETagów kontaktów.
+
+contacts = Contact.__table__
+users = User.__table__
+
+
+@backfill(
+    "contacts_birth_md", contacts, (contacts.c.birth_date,),
+    lambda: contacts.c.birth_md.is_(None) & contacts.c.birth_date.isnot(None),
+)
+def backfill_birth_md(conn, rows) -> int:
+    statement = (
+        update(contacts)
+        .where(contacts.c.id == bindparam("row_id"), contacts.c.birth_md.is_(None))
+        .values(birth_md=bindparam("birth_md"), updated_at=contacts.c.updated_at)
+    )
+    conn.execute(statement, [{"row_id": row.id, "birth_md": birth_md_of(row.birth_date)} for row in rows])
+    return len(rows)
+
+
+@backfill("contacts_updated_at", contacts, (), lambda: contacts.c.updated_at.is_(None))
+def backfill_contacts_updated_at(conn, rows) -> int:
+    # Nieznany czas zmiany: ETag zmieni się jednorazowo, co najwyżej wymusi ponowne pobranie.
+    return conn.execute(
+        update(contacts)
+        .where(contacts.c.id.in_([row.id for row in rows]), contacts.c.updated_at.is_(None))
+        .values(updated_at=utcnow())
+    ).rowcount
+
+
+@backfill("users_created_at", users, (), lambda: users.c.created_at.is_(None))
+def backfill_users_created_at(conn, rows) -> int:
+    return conn.execute(
+        update(users)
+        .where(users.c.id.in_([row.id for row in rows]), users.c.created_at.is_(None))
+        .values(created_at=utcnow())
+    ).rowcount
+
+
+@backfill("contacts_owner", contacts, (), lambda: contacts.c.owner_id.is_(None))
+def backfill_contacts_owner(conn, rows) -> int:
+    # Kontakty sprzed wprowadzenia właścicieli trafiają do użytkownika BACKFILL_CONTACTS_OWNER.
+    username = os.getenv("BACKFILL_CONTACTS_OWNER")
+    owner_id = conn.scalar(select(users.c.id).where(users.c.username == username)) if username else None
+    if owner_id is None:
+        raise RuntimeError("Set BACKFILL_CONTACTS_OWNER to the username that should own existing contacts")
+    return conn.execute(
+        update(contacts)
+        .where(contacts.c.id.in_([row.id for row in rows]), contacts.c.owner_id.is_(None))
+        .values(owner_id=owner_id, updated_at=contacts.c.updated_at)
+    ).rowcount
+
+
+def main():
+    """
+    Uruchamia backfille z wiersza poleceń (zob. opis modułu).
+    """
+    from db.dbs import engine
+
+    parser = argparse.ArgumentParser(description="Run online data migrations in throttled, resumable batches.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("status", help="show checkpoints and whether rows are still pending")
+    run = commands.add_parser("run", help="run or resume data migrations")
+    run.add_argument("names", nargs="*", metavar="name", help=", ".join(BACKFILLS))
+    run.add_argument("--all", action="store_true", help="run every registered data migration")
+    run.add_argument("--batch-size", type=int, default=1000)
+    run.add_argument("--pause", type=float, default=0.1, help="seconds to sleep between batches")
+    run.add_argument("--max-batches", type=int, help="stop after this many batches")
+    run.add_argument("--restart", action="store_true", help="ignore the checkpoint and start from the first row")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    if args.command == "status":
+        metadata.create_all(engine, tables=[checkpoints])
+        with engine.connect() as conn:
+            for name in BACKFILLS:
+                state = _checkpoint(conn, name)
+                progress = f"last_id={state.last_id} rows={state.rows} done={state.done}" if state else "not started"
+                print(f"{name:<22} {progress:<40} pending={pending_rows(conn, name)}")
+        return
+
+    names = list(BACKFILLS) if args.all else args.names
+    if not names or set(names) - set(BACKFILLS):
+        parser.error(f"give --all or data migration names from: {', '.join(BACKFILLS)}")
+    for name in names:
+        state = run_backfill(engine, name, args.batch_size, args.pause, args.max_batches, args.restart)
+        print(name, state)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,53 @@
+"""
+Generator danych testowych.
+
+`seed_fake_data` zapisuje 50 losowych kontaktów do lokalnej bazy `./contacts.db`.
+
+Do testów wydajności moduł generuje bazy w skali produkcyjnej (miliony
+kontaktów i tysiące użytkowników). Partie wierszy są generowane równolegle
+w puli procesów i deterministycznie: ten sam `--seed` i `--batch-size` dają
+te same dane. Faker buduje tylko pule imion, nazwisk, domen i tekstów, a
+wiersze są składane z nich przez `random.Random` z ziarnem partii, co jest
+o rzędy wielkości szybsze niż wywoływanie Fakera dla każdego pola.
+
+Wiersze trafiają do bazy DATABASE_URL wielowierszowymi INSERT-ami (jedna
+transakcja na partię) albo do plików CSV, razem ze skryptami
+`LOAD DATA LOCAL INFILE` (MySQL) i `\\copy` (PostgreSQL). Postęp i końcowa
+przepustowość są raportowane w wierszach na sekundę.
+
+Uruchomienie:
+    python -m db.data_faker --users 10000 --contacts 1000000 --seed 42 --workers 8
+    python -m db.data_faker --users 10000 --contacts 5000000 --format csv --out-dir fake_data
+"""
+import argparse
+import csv
+import os
+import random
+import re
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
 from faker import Faker
-from sqlalchemy import create_engine, Column, Integer, String, Date, Text, MetaData, Table
+from sqlalchemy import create_engine, func, select
 from sqlalchemy.orm import sessionmaker
-import random
+from models import Base, Contact, User, birth_md_of
+from db.search import create_search_index, drop_search_index
 
 fake = Faker()
 
-engine = create_engine("sqlite:///./contacts.db", echo=True)
-Base = MetaData()
-
-contacts = Table(
-    'contacts',
-    Base,
-    Column('id', Integer, primary_key=True, index=True),
-    Column('first_name', String, index=True),
-    Column('last_name', String, index=True),
-    Column('email', String, unique=True, index=True),
-    Column('phone_number', String),
-    Column('birth_date', Date),
-    Column('additional_data', Text, nullable=True),
-)
+engine = create_engine("sqlite:///./contacts.db")
+
+contacts = Contact.__table__
+users = User.__table__
 
-Base.create_all(engine)
 Session = sessionmaker(bind=engine)
 
 def create_fake_contact():
     """
     Generuje losowe dane dla kontaktu.
-    
+
     Returns:
         dict: Słownik zawierający losowe dane dla kontaktu.
     """
@@ -39,16 +60,345 @@ def create_fake_contact():
         "additional_data": fake.text()
     }
 
-def seed_fake_data():
+def seed_fake_data(owner_id: int = 1):
     """
     Generuje i zapisuje fikcyjne dane kontaktów do bazy danych.
+
+    Args:
+        owner_id (int, optional): Identyfikator użytkownika, do którego należą kontakty. Defaults to 1.
     """
-    contacts_data = [create_fake_contact() for _ in range(50)]
+    Base.metadata.create_all(engine)
+    contacts_data = [{**create_fake_contact(), "owner_id": owner_id} for _ in range(50)]
 
     with engine.connect() as conn:
-        for contact in contacts_data:
-            conn.execute(contacts.insert().values(contact))
+        conn.execute(contacts.insert(), contacts_data)
+
+
+# Generowanie dużych zbiorów danych
+
+USER_COLUMNS = ("id", "username", "email", "hashed_password", "is_active", "is_verified", "created_at")
+CONTACT_COLUMNS = (
+    "id", "owner_id", "first_name", "last_name", "email", "phone_number",
+    "birth_date", "birth_md", "additional_data", "version", "updated_at",
+)
+
+# Stała data odniesienia, żeby dane nie zależały od dnia uruchomienia.
+REFERENCE_TIME = datetime(2024, 1, 1)
+BIRTH_DATES = (date(1934, 1, 1).toordinal(), date(2006, 1, 1).toordinal())
+POOL_SIZE = 2000
+
+_pools = {}
+
+
+def word_pools(seed: int) -> dict:
+    """
+    Zwraca pule imion, nazwisk, domen i tekstów wygenerowane Fakerem z ziarnem `seed`.
+
+    Pule są budowane raz na proces i ziarno.
+    """
+    if seed not in _pools:
+        faker = Faker()
+        faker.seed_instance(seed)
+        _pools[seed] = {
+            "first_names": [faker.first_name() for _ in range(POOL_SIZE)],
+            "last_names": [faker.last_name() for _ in range(POOL_SIZE)],
+            "domains": sorted({faker.free_email_domain() for _ in range(100)} | {faker.domain_name() for _ in range(100)}),
+            "texts": [faker.text(max_nb_chars=200).replace("\n", " ") for _ in range(POOL_SIZE)],
+        }
+    return _pools[seed]
+
+
+def _email_part(name: str) -> str:
+    return re.sub(r"[^a-z0-9]", "", name.lower())
+
+
+def user_rows(seed: int, first_id: int, count: int, hashed_password: str) -> list:
+    """
+    Generuje `count` użytkowników o kolejnych identyfikatorach od `first_id`.
+
+    Wszyscy dostają ten sam (podany) hash hasła, bo liczenie bcrypt dla
+    każdego konta trwałoby dłużej niż całe generowanie.
+
+    Returns:
+        list: Słowniki z kolumnami `USER_COLUMNS`.
+    """
+    rng = random.Random(f"{seed}:users:{first_id}")
+    return [
+        {
+            "id": user_id,
+            "username": f"user{user_id}",
+            "email": f"user{user_id}@example.com",
+            "hashed_password": hashed_password,
+            "is_active": True,
+            "is_verified": True,
+            "created_at": REFERENCE_TIME - timedelta(seconds=rng.randrange(3 * 365 * 86400)),
+        }
+        for user_id in range(first_id, first_id + count)
+    ]
+
+
+def contact_rows(seed: int, first_id: int, count: int, owner_first: int, owner_count: int) -> list:
+    """
+    Generuje `count` kontaktów o kolejnych identyfikatorach od `first_id`.
+
+    Właściciele są losowani spośród `owner_count` użytkowników od `owner_first`.
+    Adres e-mail zawiera identyfikator kontaktu, więc jest unikalny także
+    w obrębie jednego właściciela (indeks `ix_contacts_owner_email`).
+
+    Returns:
+        list: Słowniki z kolumnami `CONTACT_COLUMNS`.
+    """
+    pools = word_pools(seed)
+    rng = random.Random(f"{seed}:contacts:{first_id}")
+    rows = []
+    for contact_id in range(first_id, first_id + count):
+        first_name = rng.choice(pools["first_names"])
+        last_name = rng.choice(pools["last_names"])
+        birth_date = date.fromordinal(rng.randrange(*BIRTH_DATES))
+        rows.append({
+            "id": contact_id,
+            "owner_id": owner_first + rng.randrange(owner_count),
+            "first_name": first_name,
+            "last_name": last_name,
+            "email": f"{_email_part(first_name)}.{_email_part(last_name)}.{contact_id}@{rng.choice(pools['domains'])}",
+            "phone_number": f"{rng.randrange(100, 1000)}-{rng.randrange(100, 1000)}-{rng.randrange(1000, 10000)}",
+            "birth_date": birth_date,
+            "birth_md": birth_md_of(birth_date),
+            "additional_data": rng.choice(pools["texts"]) if rng.random() < 0.7 else None,
+            "version": 1,
+            "updated_at": REFERENCE_TIME - timedelta(seconds=rng.randrange(365 * 86400)),
+        })
+    return rows
+
+
+def _csv_value(value):
+    if value is None:
+        return r"\N"
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    return value
+
+
+def write_csv(path: str, columns: tuple, rows: list):
+    """
+    Zapisuje wiersze do pliku CSV z nagłówkiem (NULL jako `\\N`).
+    """
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow([_csv_value(row[column]) for column in columns])
+
+
+def _generate_batch(job: tuple):
+    # Uruchamiane w procesie roboczym: generuje partię i zwraca ją albo zapisuje do pliku.
+    kind, seed, first_id, count, extra, path = job
+    if kind == "users":
+        rows, columns = user_rows(seed, first_id, count, *extra), USER_COLUMNS
+    else:
+        rows, columns = contact_rows(seed, first_id, count, *extra), CONTACT_COLUMNS
+    if path is None:
+        return rows
+    write_csv(path, columns, rows)
+    return len(rows)
+
+
+class Progress:
+    """
+    Raportuje postęp i przepustowość generowania (co `interval` sekund) na stderr.
+
+    Args:
+        name (str): Nazwa tabeli.
+        total (int): Docelowa liczba wierszy.
+        interval (float, optional): Odstęp między raportami w sekundach. Defaults to 2.
+    """
+
+    def __init__(self, name: str, total: int, interval: float = 2.0):
+        self.name = name
+        self.total = total
+        self.interval = interval
+        self.rows = 0
+        self.started = self.reported = time.monotonic()
+
+    def add(self, rows: int):
+        self.rows += rows
+        now = time.monotonic()
+        if now - self.reported >= self.interval:
+            self.reported = now
+            print(f"{self.name}: {self.rows}/{self.total} ({self.rate():,.0f} rows/s)", file=sys.stderr)
+
+    def rate(self) -> float:
+        return self.rows / max(time.monotonic() - self.started, 1e-9)
+
+    def summary(self) -> dict:
+        return {"rows": self.rows, "seconds": time.monotonic() - self.started, "rows_per_second": round(self.rate())}
+
+
+def _batches(kind: str, seed: int, first_id: int, total: int, batch_size: int, extra: tuple, out_dir: str = None):
+    for start in range(first_id, first_id + total, batch_size):
+        count = min(batch_size, first_id + total - start)
+        path = os.path.join(out_dir, f"{kind}-{start:010d}.csv") if out_dir else None
+        yield (kind, seed, start, count, extra, path)
+
+
+def _run_jobs(executor, jobs, window: int):
+    # Jak executor.map, ale z ograniczoną liczbą partii w locie, żeby przy wolniejszej
+    # bazie wygenerowane i jeszcze niezapisane wiersze nie zajmowały coraz więcej pamięci.
+    pending = deque()
+    for job in jobs:
+        pending.append(executor.submit(_generate_batch, job))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _default_password_hash() -> str:
+    from auth.passwords import pwd_context
+    return pwd_context.hash("password")
+
+
+def _next_id(conn, table) -> int:
+    return (conn.scalar(select(func.max(table.c.id))) or 0) + 1
+
+
+def seed_database(engine, users_count: int, contacts_count: int, seed: int = 0, batch_size: int = 10000,
+                  workers: int = None, owner_id: int = 1, hashed_password: str = None) -> dict:
+    """
+    Generuje użytkowników i kontakty i zapisuje je do bazy partiami.
+
+    Partie są generowane w puli procesów, a zapisywane w procesie głównym,
+    każda jednym wielowierszowym INSERT-em we własnej transakcji. Nowe
+    identyfikatory zaczynają się za największymi istniejącymi. Dla SQLite
+    na czas ładowania wyłączane jest `synchronous`.
+
+    Indeks pełnotekstowy jest na czas ładowania usuwany i budowany od nowa
+    na końcu (w SQLite triggery FTS spowalniają INSERT kilkukrotnie), więc
+    wyszukiwanie nie działa, dopóki ładowanie się nie skończy.
+
+    Args:
+        engine (Engine): Silnik bazy danych z utworzonym schematem.
+        users_count (int): Liczba użytkowników; przy 0 wszystkie kontakty należą do `owner_id`.
+        contacts_count (int): Liczba kontaktów.
+        seed (int, optional): Ziarno generatora. Defaults to 0.
+        batch_size (int, optional): Liczba wierszy w partii. Defaults to 10000.
+        workers (int, optional): Liczba procesów generujących. Defaults to None (liczba CPU).
+        owner_id (int, optional): Właściciel kontaktów, gdy `users_count` jest 0. Defaults to 1.
+        hashed_password (str, optional): Hash hasła użytkowników. Defaults to None (hash hasła "password").
+
+    Returns:
+        dict: Liczba wierszy, czas i przepustowość dla "users" i "contacts".
+    """
+    if hashed_password is None and users_count:
+        hashed_password = _default_password_hash()
+    report = {}
+    with engine.connect() as conn, ProcessPoolExecutor(max_workers=workers) as executor:
+        if conn.dialect.name == "sqlite":
+            conn.exec_driver_sql("PRAGMA synchronous = OFF")
+        first_user, first_contact = _next_id(conn, users), _next_id(conn, contacts)
+        owners = (first_user, users_count) if users_count else (owner_id, 1)
+        window = 2 * (workers or os.cpu_count() or 1)
+        with conn.begin():
+            drop_search_index(conn)
+        for table, total, first_id, extra in (
+            (users, users_count, first_user, (hashed_password,)),
+            (contacts, contacts_count, first_contact, owners),
+        ):
+            progress = Progress(table.name, total)
+            for rows in _run_jobs(executor, _batches(table.name, seed, first_id, total, batch_size, extra), window):
+                with conn.begin():
+                    conn.execute(table.insert(), rows)
+                progress.add(len(rows))
+            report[table.name] = progress.summary()
+        with conn.begin():
+            create_search_index(conn)
+        # Przepustowość kontaktów obejmuje odbudowę indeksu.
+        report[contacts.name] = progress.summary()
+    return report
+
+
+LOAD_MYSQL = (
+    "LOAD DATA LOCAL INFILE '{path}' INTO TABLE {table} CHARACTER SET utf8mb4 "
+    "FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' ESCAPED BY '' "
+    "LINES TERMINATED BY '\\r\\n' IGNORE 1 LINES ({columns});"
+)
+LOAD_POSTGRESQL = "\\copy {table} ({columns}) FROM '{path}' WITH (FORMAT csv, HEADER true, NULL '\\N')"
+
+
+def export_files(out_dir: str, users_count: int, contacts_count: int, seed: int = 0, batch_size: int = 10000,
+                 workers: int = None, owner_id: int = 1, hashed_password: str = None) -> dict:
+    """
+    Generuje użytkowników i kontakty do plików CSV (plik na partię) do załadowania do pustej bazy.
+
+    Procesy robocze zapisują pliki same, więc generowanie skaluje się
+    z liczbą procesów. Obok plików powstają skrypty `load_mysql.sql`
+    (`mysql --local-infile=1 baza < load_mysql.sql`) i `load_postgresql.sql`
+    (`psql -f load_postgresql.sql`). Identyfikatory zaczynają się od 1.
+
+    Args:
+        out_dir (str): Katalog na pliki.
+        users_count (int): Liczba użytkowników; przy 0 wszystkie kontakty należą do `owner_id`.
+        contacts_count (int): Liczba kontaktów.
+        seed (int, optional): Ziarno generatora. Defaults to 0.
+        batch_size (int, optional): Liczba wierszy w pliku. Defaults to 10000.
+        workers (int, optional): Liczba procesów generujących. Defaults to None (liczba CPU).
+        owner_id (int, optional): Właściciel kontaktów, gdy `users_count` jest 0. Defaults to 1.
+        hashed_password (str, optional): Hash hasła użytkowników. Defaults to None (hash hasła "password").
+
+    Returns:
+        dict: Liczba wierszy, czas i przepustowość dla "users" i "contacts".
+    """
+    if hashed_password is None and users_count:
+        hashed_password = _default_password_hash()
+    os.makedirs(out_dir, exist_ok=True)
+    owners = (1, users_count) if users_count else (owner_id, 1)
+    report, files = {}, []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for table, total, extra, columns in (
+            (users, users_count, (hashed_password,), USER_COLUMNS),
+            (contacts, contacts_count, owners, CONTACT_COLUMNS),
+        ):
+            progress = Progress(table.name, total)
+            jobs = list(_batches(table.name, seed, 1, total, batch_size, extra, out_dir))
+            for rows in executor.map(_generate_batch, jobs):
+                progress.add(rows)
+            files += [(table.name, ", ".join(columns), os.path.abspath(job[-1])) for job in jobs]
+            report[table.name] = progress.summary()
+    for name, template in (("load_mysql.sql", LOAD_MYSQL), ("load_postgresql.sql", LOAD_POSTGRESQL)):
+        with open(os.path.join(out_dir, name), "w", encoding="utf-8") as file:
+            for table, columns, path in files:
+                file.write(template.format(table=table, columns=columns, path=path) + "\n")
+    return report
+
+
+def main():
+    """
+    Generuje dużą bazę testową z wiersza poleceń (zob. opis modułu).
+    """
+    parser = argparse.ArgumentParser(description="Generate large, deterministic contact databases for benchmarks.")
+    parser.add_argument("--users", type=int, default=1000, help="number of users (0: all contacts go to --owner-id)")
+    parser.add_argument("--contacts", type=int, default=100000, help="number of contacts")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=10000, help="rows per INSERT or CSV file")
+    parser.add_argument("--workers", type=int, help="generator processes (default: CPU count)")
+    parser.add_argument("--owner-id", type=int, default=1, help="owner of the contacts with --users 0")
+    parser.add_argument("--format", choices=("db", "csv"), default="db",
+                        help="insert into DATABASE_URL, or write CSV files with LOAD DATA / COPY scripts")
+    parser.add_argument("--out-dir", default="fake_data", help="directory for --format csv")
+    args = parser.parse_args()
+
+    options = dict(seed=args.seed, batch_size=args.batch_size, workers=args.workers, owner_id=args.owner_id)
+    if args.format == "csv":
+        report = export_files(args.out_dir, args.users, args.contacts, **options)
+    else:
+        from db.dbs import engine as database, init_db
+        init_db()
+        report = seed_database(database, args.users, args.contacts, **options)
+    for name, stats in report.items():
+        print(f"{name}: {stats['rows']} rows in {stats['seconds']:.1f}s ({stats['rows_per_second']:,} rows/s)")
+
 
 if __name__ == "__main__":
-    seed_fake_data()
-    print("Fikcyjne dane zostały zapisane i zaimportowane do bazy.")
+    main()
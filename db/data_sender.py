@@ -1,44 +1,469 @@
-import mysql.connector
-import os 
+"""
+Import zrzutu SQL (np. z mysqldump) do bazy DATABASE_URL.
+
+Plik jest czytany strumieniowo, więc rozmiar zrzutu nie ogranicza pamięci.
+`StatementReader` dzieli go na instrukcje z uwzględnieniem literałów,
+komentarzy i polecenia `DELIMITER`, a `import_sql_dump` łączy kolejne
+INSERT-y do tej samej tabeli w wielowierszowe partie i zatwierdza
+transakcję co `commit_every` instrukcji. Pozycja w pliku jest zapisywana
+w tabeli `data_imports` w tej samej transakcji co importowane wiersze, więc
+przerwany import można wznowić (`--resume`) bez powtarzania zatwierdzonych
+INSERT-ów; instrukcje sesji (`SET NAMES`, `FOREIGN_KEY_CHECKS`, `SQL_MODE`...)
+są przy wznowieniu wykonywane ponownie. Wyjątkiem są instrukcje DDL, które
+MySQL zatwierdza niejawnie: przerwanie tuż po takiej instrukcji, a przed
+zapisem punktu kontrolnego, powtórzy ją przy wznowieniu.
+
+Uruchomienie:
+    python -m db.data_sender data_for_db.sql --batch-rows 500 --commit-every 1000 [--resume]
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+import time
 from dotenv import load_dotenv
+from sqlalchemy import BigInteger, Column, MetaData, String, Table, Text, select
 
 
 load_dotenv()
 
 
-def import_data_to_mysql():
+logger = logging.getLogger(__name__)
+
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class SQLSyntaxError(ValueError):
+    """
+    Niedomknięty literał albo komentarz na końcu pliku.
+    """
+
+
+class StatementReader:
     """
-    Importuje dane z pliku SQL do bazy danych MySQL.
+    Dzieli strumień SQL na instrukcje, nie wczytując całego pliku do pamięci.
+
+    Średnik (albo bieżący ogranicznik) kończy instrukcję tylko poza literałami
+    `'...'` i `"..."` (ze znakami ucieczki `\\` i podwojonym cudzysłowem),
+    identyfikatorami `` `...` `` i komentarzami `-- `, `#` i `/* */`. Polecenie
+    klienta MySQL `DELIMITER $$` zmienia ogranicznik (definicje triggerów
+    i procedur). Komentarze MySQL `/*! ... */` są traktowane jak kod.
+
+    Iteracja zwraca pary (instrukcja bez ogranicznika, pozycja w pliku
+    w bajtach za ogranicznikiem); od tej pozycji można wznowić czytanie.
+
+    Args:
+        file: Plik otwarty w trybie binarnym, ustawiony na pozycji `offset`.
+        delimiter (str, optional): Początkowy ogranicznik instrukcji. Defaults to ";".
+        offset (int, optional): Pozycja pliku, od której zaczyna się czytanie. Defaults to 0.
+        chunk_size (int, optional): Rozmiar czytanych bloków w bajtach. Defaults to CHUNK_SIZE.
+        backslash_escapes (bool, optional): Czy `\\` w literałach jest znakiem ucieczki (jak w MySQL).
+            Defaults to True.
     """
-    DATABASE_URL = os.getenv("DATABASE_URL")
-    
-    mysql_conn = mysql.connector.connect(
-        host="localhost",
-        user="Camilleus",
-        password="fghg1234",
-        database="konigcontacts"
+
+    _DELIMITER_COMMAND = re.compile(rb"[ \t\r\n]*DELIMITER[ \t]+(\S+)[^\n]*(?:\n|\Z)", re.IGNORECASE)
+
+    def __init__(self, file, delimiter: str = ";", offset: int = 0, chunk_size: int = CHUNK_SIZE,
+                 backslash_escapes: bool = True):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.backslash_escapes = backslash_escapes
+        self._buffer = b""
+        self._base = offset
+        self._eof = False
+        self._quoted = {}
+        for quote in (b"'", b'"', b"`"):
+            escape = b"\\" if backslash_escapes and quote != b"`" else b""
+            other = b"[^" + re.escape(escape + quote) + b"]*"
+            pair = (b"\\\\.|" if escape else b"") + quote + quote
+            self._quoted[quote] = (
+                re.compile(quote + other + b"(?:(?:" + pair + b")" + other + b")*" + quote, re.DOTALL),
+                re.compile(b"[" + re.escape(escape + quote) + b"]"),
+            )
+        self._set_delimiter(delimiter.encode())
+
+    @property
+    def delimiter(self) -> str:
+        return self._delimiter.decode()
+
+    def _set_delimiter(self, delimiter: bytes):
+        self._delimiter = delimiter
+        self._tokens = re.compile(rb"['\"`#]|--|/\*|" + re.escape(delimiter))
+
+    def _fill(self) -> bool:
+        if self._eof:
+            return False
+        chunk = self.file.read(self.chunk_size)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buffer += chunk
+        return True
+
+    def _find(self, pattern, position: int, lookahead: int = 0):
+        # Szuka wzorca, doczytując plik, aż dopasowanie ma za sobą `lookahead` bajtów (albo jest koniec pliku).
+        while True:
+            match = pattern.search(self._buffer, position)
+            if match is not None and (match.end() + lookahead <= len(self._buffer) or self._eof):
+                return match
+            if not self._fill():
+                return match
+
+    def _skip_quoted(self, position: int, quote: bytes, start: int) -> int:
+        # Zwykle cały literał jest w buforze i jedno dopasowanie wyrażenia go pomija.
+        literal, pattern = self._quoted[quote]
+        match = literal.match(self._buffer, position - 1)
+        if match is not None and (match.end() < len(self._buffer) or self._eof):
+            return match.end()
+        while True:
+            match = self._find(pattern, position, lookahead=1)
+            if match is None:
+                raise SQLSyntaxError(f"Unterminated {quote.decode()} literal in the statement at byte {self._base + start}")
+            if match.group() == b"\\":
+                position = match.end() + 1
+            elif self._buffer[match.end():match.end() + 1] == quote:
+                position = match.end() + 1
+            else:
+                return match.end()
+
+    def _skip_to(self, terminator: bytes, position: int, start: int, required: bool) -> int:
+        match = self._find(re.compile(re.escape(terminator)), position)
+        if match is None:
+            if required:
+                raise SQLSyntaxError(f"Unterminated comment in the statement at byte {self._base + start}")
+            return len(self._buffer)
+        return match.end()
+
+    def _delimiter_command(self, position: int):
+        while len(self._buffer) - position < 4096 and self._fill():
+            pass
+        match = self._DELIMITER_COMMAND.match(self._buffer, position)
+        if match is None:
+            return None
+        self._set_delimiter(match.group(1))
+        return match.end()
+
+    def __iter__(self):
+        # `code` to początek instrukcji bez poprzedzających ją komentarzy (None, dopóki nie ma kodu).
+        position = 0
+        code = None
+        while True:
+            if code is None:
+                after_command = self._delimiter_command(position)
+                if after_command is not None:
+                    position = after_command
+                    continue
+            match = self._find(self._tokens, position, lookahead=max(2, len(self._delimiter)))
+            end = len(self._buffer) if match is None else match.start()
+            if code is None:
+                skipped = len(self._buffer[position:end]) - len(self._buffer[position:end].lstrip())
+                if position + skipped < end:
+                    code = position + skipped
+            if match is None:
+                if code is not None:
+                    yield self._buffer[code:].decode().strip(), self._base + len(self._buffer)
+                return
+            token = match.group()
+            if token == self._delimiter:
+                if code is not None:
+                    yield self._buffer[code:match.start()].decode().strip(), self._base + match.end()
+                position = match.end()
+                code = None
+                if position > self.chunk_size:
+                    # Przetworzony początek bufora jest zwalniany co najwyżej raz na blok.
+                    self._buffer = self._buffer[position:]
+                    self._base += position
+                    position = 0
+            elif token in (b"'", b'"', b"`"):
+                code = match.start() if code is None else code
+                position = self._skip_quoted(match.end(), token, code)
+            elif token == b"/*":
+                if code is None and self._buffer[match.end():match.end() + 1] == b"!":
+                    code = match.start()
+                position = self._skip_to(b"*/", match.end(), match.start(), required=True)
+            elif token == b"#" or self._buffer[match.end():match.end() + 1] in (b" ", b"\t", b"\r", b"\n", b""):
+                position = self._skip_to(b"\n", match.end(), match.start(), required=False)
+            else:
+                # `--` bez spacji za nim nie jest komentarzem (np. `1--1`).
+                code = match.start() if code is None else code
+                position = match.end()
+
+
+_INSERT = re.compile(r"(INSERT\s+(?:IGNORE\s+)?INTO\s+.+?\s+VALUES)\s*(\(.*\))\s*\Z", re.IGNORECASE | re.DOTALL)
+_ROW_TOKENS = re.compile(
+    r"""'[^'\\]*(?:(?:\\.|'')[^'\\]*)*'|"[^"\\]*(?:(?:\\.|"")[^"\\]*)*"|[()]|[^'"()]+""", re.DOTALL
+)
+_TRANSACTIONAL = re.compile(r"(INSERT|UPDATE|DELETE|REPLACE)\b", re.IGNORECASE)
+
+
+def split_insert(statement: str):
+    """
+    Dzieli `INSERT INTO ... VALUES (...), (...)` na część wspólną i listę wierszy.
+
+    Instrukcje z czymkolwiek poza listą krotek (np. `ON DUPLICATE KEY UPDATE`,
+    `INSERT ... SELECT`) nie są dzielone.
+
+    Returns:
+        tuple: (`INSERT INTO tabela (kolumny) VALUES`, `(...), (...)`) albo None.
+    """
+    match = _INSERT.match(statement)
+    if match is None:
+        return None
+    prefix, values = match.groups()
+    depth = 0
+    for token in _ROW_TOKENS.finditer(values):
+        text = token.group()
+        if text == "(":
+            depth += 1
+        elif text == ")":
+            depth -= 1
+            if depth < 0:
+                return None
+        elif depth == 0 and text.strip(" \t\r\n,"):
+            return None
+    if depth != 0:
+        return None
+    return prefix, values
+
+
+class Progress:
+    """
+    Raportuje postęp importu (procent pliku, MB/s, instrukcje/s) na stderr co `interval` sekund.
+
+    Args:
+        size (int): Rozmiar pliku w bajtach.
+        offset (int): Pozycja, od której zaczyna się import.
+        interval (float, optional): Odstęp między raportami w sekundach. Defaults to 2.
+    """
+
+    def __init__(self, size: int, offset: int, interval: float = 2.0):
+        self.size = size
+        self.offset = self.start_offset = offset
+        self.statements = 0
+        self.interval = interval
+        self.started = self.reported = time.monotonic()
+
+    def update(self, offset: int, statements: int, force: bool = False):
+        self.offset = offset
+        self.statements = statements
+        now = time.monotonic()
+        if force or now - self.reported >= self.interval:
+            self.reported = now
+            print(self.line(), file=sys.stderr)
+
+    def line(self) -> str:
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        rate = (self.offset - self.start_offset) / elapsed
+        eta = (self.size - self.offset) / rate if rate else float("inf")
+        return (
+            f"{100 * self.offset / max(self.size, 1):5.1f}% {self.offset / 1e6:,.1f}/{self.size / 1e6:,.1f} MB "
+            f"{rate / 1e6:,.1f} MB/s {self.statements / elapsed:,.0f} statements/s ETA {eta:,.0f}s"
+        )
+
+
+# Punkty kontrolne importów, zapisywane w tej samej transakcji co importowane wiersze.
+metadata = MetaData()
+checkpoints = Table(
+    "data_imports",
+    metadata,
+    Column("name", String(255), primary_key=True),
+    Column("size", BigInteger, nullable=False),
+    Column("position", BigInteger, nullable=False),
+    Column("statements", BigInteger, nullable=False),
+    Column("delimiter", String(20), nullable=False),
+    Column("session", Text, nullable=False),
+)
+
+# Instrukcje ustawiające stan sesji (SET NAMES, FOREIGN_KEY_CHECKS, SQL_MODE, USE, LOCK TABLES),
+# powtarzane przy wznowieniu, bo nowe połączenie zaczyna z domyślnymi ustawieniami serwera.
+_SESSION = re.compile(r"(/\*!\d*\s*)?(SET|USE|LOCK\s+TABLES?)\b", re.IGNORECASE)
+_UNLOCK = re.compile(r"UNLOCK\s+TABLES?\b", re.IGNORECASE)
+# Liczba zapamiętywanych różnych instrukcji sesji.
+MAX_SESSION_STATEMENTS = 1000
+
+
+def track_session(session: dict, statement: str):
+    """
+    Zapamiętuje instrukcję zmieniającą stan sesji w `session` (instrukcja -> None, w kolejności).
+
+    Powtórzona instrukcja jest przenoszona na koniec, więc stały zestaw instrukcji
+    powtarzany przez mysqldump przy każdej tabeli nie powiększa słownika.
+    `UNLOCK TABLES` usuwa zapamiętane `LOCK TABLES`.
+    """
+    if _UNLOCK.match(statement):
+        for locked in [key for key in session if _SESSION.match(key).group(2).upper().startswith("LOCK")]:
+            del session[locked]
+    elif _SESSION.match(statement):
+        session.pop(statement, None)
+        if len(session) >= MAX_SESSION_STATEMENTS:
+            del session[next(iter(session))]
+        session[statement] = None
+
+
+def _load_checkpoint(engine, name: str):
+    with engine.connect() as conn:
+        return conn.execute(select(checkpoints).where(checkpoints.c.name == name)).first()
+
+
+def _save_checkpoint(cursor, paramstyle: str, values: dict):
+    # Surowe SQL na kursorze importu, więc punkt kontrolny trafia do tej samej transakcji.
+    mark = "?" if paramstyle == "qmark" else "%s"
+    columns = ("size", "position", "statements", "delimiter", "session")
+    cursor.execute(
+        f"UPDATE data_imports SET {', '.join(f'{column} = {mark}' for column in columns)} WHERE name = {mark}",
+        [values[column] for column in columns] + [values["name"]],
     )
-    
+    if cursor.rowcount == 0:
+        cursor.execute(
+            f"INSERT INTO data_imports (name, {', '.join(columns)}) VALUES ({', '.join([mark] * (len(columns) + 1))})",
+            [values["name"]] + [values[column] for column in columns],
+        )
+
 
-    cursor = mysql_conn.cursor()
+def import_sql_dump(path: str, engine=None, batch_rows: int = 500, batch_bytes: int = 1024 * 1024,
+                    commit_every: int = 1000, resume: bool = False, checkpoint_name: str = None,
+                    chunk_size: int = CHUNK_SIZE) -> dict:
+    """
+    Importuje zrzut SQL do bazy danych, strumieniowo i w transakcjach.
+
+    Kolejne INSERT-y z tą samą częścią `INSERT INTO ... VALUES` są łączone
+    w jeden INSERT z najwyżej `batch_rows` instrukcji źródłowych i `batch_bytes`
+    bajtów wierszy (limit powinien być mniejszy niż `max_allowed_packet`
+    MySQL). Transakcja jest zatwierdzana co `commit_every` instrukcji i po
+    każdej instrukcji innej niż INSERT/UPDATE/DELETE/REPLACE, a razem z nią
+    punkt kontrolny w tabeli `data_imports`: pozycja w pliku, liczba instrukcji,
+    bieżący ogranicznik i instrukcje sesji (`SET`, `/*!... SET ...*/`, `USE`,
+    `LOCK TABLES`), które przy wznowieniu są wykonywane ponownie przed dalszą
+    częścią pliku. Znaki ucieczki `\\` w literałach są rozpoznawane tylko dla MySQL.
+
+    Args:
+        path (str): Ścieżka do pliku SQL.
+        engine (Engine, optional): Silnik bazy danych. Defaults to None (silnik DATABASE_URL z `db.dbs`).
+        batch_rows (int, optional): Maksymalna liczba instrukcji INSERT łączonych w jedną. Defaults to 500.
+        batch_bytes (int, optional): Maksymalny rozmiar wierszy połączonego INSERT-a. Defaults to 1 MiB.
+        commit_every (int, optional): Liczba instrukcji w transakcji. Defaults to 1000.
+        resume (bool, optional): Wznawia import od punktu kontrolnego. Defaults to False.
+        checkpoint_name (str, optional): Nazwa punktu kontrolnego. Defaults to None (nazwa pliku).
+        chunk_size (int, optional): Rozmiar czytanych bloków w bajtach. Defaults to CHUNK_SIZE.
 
+    Raises:
+        ValueError: Gdy punkt kontrolny dotyczy pliku o innym rozmiarze.
+        SQLSyntaxError: Gdy plik kończy się niedomkniętym literałem albo komentarzem.
+
+    Returns:
+        dict: `statements` (łącznie z wcześniejszymi przebiegami), `executed` (zapytania wysłane do bazy),
+        `offset`, `bytes` i `seconds` tego przebiegu.
+    """
+    if engine is None:
+        from db.dbs import engine
+    size = os.path.getsize(path)
+    name = checkpoint_name or os.path.basename(path)
+    offset, statements, delimiter, session = 0, 0, ";", {}
+    metadata.create_all(engine, tables=[checkpoints])
+    state = _load_checkpoint(engine, name) if resume else None
+    if state is not None:
+        if state.size != size:
+            raise ValueError(f"Checkpoint {name!r} was written for a file of {state.size} bytes, not {size}")
+        offset, statements, delimiter = state.position, state.statements, state.delimiter
+        session = dict.fromkeys(json.loads(state.session))
+
+    mysql = engine.dialect.name == "mysql"
+    progress = Progress(size, offset)
+    connection = engine.raw_connection()
+    cursor = connection.cursor()
+    executed = 0
+    prefix, rows, rows_bytes = None, [], 0
+    uncommitted, end, committed = 0, offset, offset
+
+    def flush():
+        nonlocal prefix, rows, rows_bytes, executed
+        if rows:
+            cursor.execute(f"{prefix} {', '.join(rows)}")
+            executed += 1
+        prefix, rows, rows_bytes = None, [], 0
+
+    def commit(reader):
+        nonlocal uncommitted, committed
+        flush()
+        _save_checkpoint(cursor, engine.dialect.paramstyle, {
+            "name": name, "size": size, "position": end, "statements": statements,
+            "delimiter": reader.delimiter, "session": json.dumps(list(session)),
+        })
+        connection.commit()
+        uncommitted, committed = 0, end
 
     try:
-        with open("data_for_db.sql", "r") as sql_file:
-            sql_commands = sql_file.read().split(';')
+        for statement in session:
+            cursor.execute(statement)
+        with open(path, "rb") as file:
+            file.seek(offset)
+            reader = StatementReader(file, delimiter, offset, chunk_size, backslash_escapes=mysql)
+            for statement, end in reader:
+                statements += 1
+                uncommitted += 1
+                if statement.startswith("/*!") and not mysql:
+                    continue
+                parts = split_insert(statement)
+                if parts is not None and parts[0] == prefix and len(rows) < batch_rows \
+                        and rows_bytes + len(parts[1]) <= batch_bytes:
+                    rows.append(parts[1])
+                    rows_bytes += len(parts[1])
+                else:
+                    flush()
+                    if parts is not None:
+                        prefix, rows, rows_bytes = parts[0], [parts[1]], len(parts[1])
+                    else:
+                        cursor.execute(statement)
+                        executed += 1
+                        track_session(session, statement)
+                if not _TRANSACTIONAL.match(statement) or uncommitted >= commit_every:
+                    commit(reader)
+                progress.update(end, statements)
+            commit(reader)
+    except BaseException:
+        connection.rollback()
+        logger.error("Import failed; rerun with --resume to continue from byte %d (the last commit)", committed)
+        raise
+    finally:
+        cursor.close()
+        connection.close()
+    progress.update(end, statements, force=True)
+    return {
+        "statements": statements, "executed": executed, "offset": end,
+        "bytes": end - progress.start_offset, "seconds": time.monotonic() - progress.started,
+    }
 
-            for command in sql_commands:
-                if command.strip():
-                    cursor.execute(command)
 
+def main():
+    """
+    Importuje zrzut SQL z wiersza poleceń (zob. opis modułu).
+    """
+    parser = argparse.ArgumentParser(description="Stream a SQL dump into DATABASE_URL in batched transactions.")
+    parser.add_argument("path", nargs="?", default="data_for_db.sql")
+    parser.add_argument("--batch-rows", type=int, default=500, help="INSERT statements merged into one")
+    parser.add_argument("--batch-bytes", type=int, default=1024 * 1024, help="maximum size of a merged INSERT")
+    parser.add_argument("--commit-every", type=int, default=1000, help="statements per transaction")
+    parser.add_argument("--resume", action="store_true", help="continue from the last checkpoint")
+    parser.add_argument("--checkpoint", help="checkpoint name in the data_imports table (default: the file name)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
 
-        mysql_conn.commit()
-        print("Dane zostały zaimportowane do bazy MySQL.")
+    try:
+        report = import_sql_dump(
+            args.path, batch_rows=args.batch_rows, batch_bytes=args.batch_bytes,
+            commit_every=args.commit_every, resume=args.resume, checkpoint_name=args.checkpoint,
+        )
     except Exception as e:
         print(f"Błąd podczas importowania danych: {e}")
-    finally:
-        cursor.close()
-        mysql_conn.close()
+        sys.exit(1)
+    print(
+        f"Zaimportowano {report['statements']} instrukcji ({report['executed']} zapytań) "
+        f"w {report['seconds']:.1f}s ({report['bytes'] / 1e6 / max(report['seconds'], 1e-9):,.1f} MB/s)."
+    )
+
 
 if __name__ == "__main__":
-    import_data_to_mysql()
+    main()
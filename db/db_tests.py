@@ -1,31 +1,56 @@
+import os
 import unittest
 from unittest.mock import patch, MagicMock
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.runtime.migration import MigrationContext
 from databases import Database
 from sqlalchemy.orm import sessionmaker
-from dbs import database, engine, Base, init_db, get_db
+from dbs import async_engine, engine, Base, init_db, get_db, to_async_url, alembic_config
 from faker import Faker
 from sqlalchemy import create_engine, Column, Integer, String, Date, Text, MetaData, Table
-from data_faker import create_fake_contact, seed_fake_data
-from data_sender import import_data_to_mysql
+from data_faker import create_fake_contact, seed_fake_data, contact_rows, seed_database, export_files
+from data_sender import StatementReader, import_sql_dump, split_insert, track_session
+import io
+import asyncio
+import tempfile
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from search import init_search, search_contact_ids
+from db.backfill import BACKFILLS, metadata as backfill_metadata, pending_rows, run_backfill
 
 
 class TestDB(unittest.TestCase):
 
-    @patch("dbs.create_engine")
-    @patch("dbs.Base.metadata.create_all")
-    def test_init_db(self, mock_create_all, mock_create_engine):
-        init_db()
-        mock_create_engine.assert_called_once_with(database)
-        mock_create_all.assert_called_once_with(bind=engine)
+    def test_init_db(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            test_engine = create_engine(f"sqlite:///{tmp}/init.db")
+            with patch("dbs.engine", test_engine):
+                init_db()
+                init_db()
+            with test_engine.connect() as conn:
+                self.assertEqual(MigrationContext.configure(conn).get_current_revision(), "0005")
+                self.assertEqual(conn.execute(text("SELECT COUNT(*) FROM contacts_fts")).scalar(), 0)
+            test_engine.dispose()
 
-    @patch("dbs.SessionLocal")
+    @patch("dbs.AsyncSessionLocal")
     def test_get_db(self, mock_session_local):
         mock_session = MagicMock()
-        mock_session_local.return_value = mock_session
-        with get_db() as db:
-            self.assertEqual(db, mock_session)
+        mock_session_local.return_value.__aenter__.return_value = mock_session
+
+        async def first_session():
+            sessions = get_db()
+            db = await sessions.__anext__()
+            await sessions.aclose()
+            return db
+
+        self.assertEqual(asyncio.run(first_session()), mock_session)
         mock_session_local.assert_called_once()
-        mock_session.close.assert_called_once()
+        mock_session_local.return_value.__aexit__.assert_called_once()
+
+    def test_to_async_url(self):
+        self.assertEqual(str(to_async_url("sqlite:///./contacts.db")), "sqlite+aiosqlite:///./contacts.db")
+        self.assertEqual(str(to_async_url("mysql+pymysql://u:p@localhost/db")), "mysql+aiomysql://u:p@localhost/db")
 
 
 class TestDataFaker(unittest.TestCase):
@@ -57,10 +82,11 @@ class TestDataFaker(unittest.TestCase):
 
         self.assertEqual(create_fake_contact(), expected_contact)
 
+    @patch("data_faker.Base.metadata.create_all")
     @patch("data_faker.engine.connect")
     @patch("data_faker.contacts.insert")
     @patch("data_faker.create_fake_contact")
-    def test_seed_fake_data(self, mock_create_fake_contact, mock_insert, mock_connect):
+    def test_seed_fake_data(self, mock_create_fake_contact, mock_insert, mock_connect, mock_create_all):
         mock_create_fake_contact.return_value = {
             "first_name": "John",
             "last_name": "Doe",
@@ -71,41 +97,246 @@ class TestDataFaker(unittest.TestCase):
         }
 
         seed_fake_data()
+        mock_create_all.assert_called_once()
         mock_insert.assert_called()
         mock_connect.assert_called()
 
+    def test_contact_rows_are_deterministic(self):
+        rows = contact_rows(42, 101, 200, 5, 10)
+        self.assertEqual(rows, contact_rows(42, 101, 200, 5, 10))
+        self.assertNotEqual(rows, contact_rows(43, 101, 200, 5, 10))
+        self.assertEqual([row["id"] for row in rows], list(range(101, 301)))
+        self.assertTrue(all(5 <= row["owner_id"] < 15 for row in rows))
+        self.assertEqual(len({row["email"] for row in rows}), 200)
+        self.assertTrue(all(row["birth_md"] == row["birth_date"].month * 100 + row["birth_date"].day for row in rows))
 
-class TestDataSender(unittest.TestCase):
+    def test_seed_database(self):
+        with tempfile.TemporaryDirectory() as directory:
+            engine = create_engine(f"sqlite:///{directory}/fake.db")
+            Base.metadata.create_all(engine)
+            init_search(engine)
+            seed_database(engine, 3, 250, seed=1, batch_size=100, workers=1, hashed_password="hash")
+            report = seed_database(engine, 0, 50, seed=1, batch_size=100, workers=1, owner_id=2)
+            with engine.connect() as conn:
+                self.assertEqual(conn.scalar(text("SELECT count(*) FROM users")), 3)
+                self.assertEqual(conn.scalar(text("SELECT count(*) FROM contacts")), 300)
+                self.assertEqual(conn.scalar(text("SELECT count(*) FROM contacts WHERE id > 250 AND owner_id != 2")), 0)
+                self.assertEqual(conn.scalar(text("SELECT count(*) FROM contacts_fts")), 300)
+            engine.dispose()
+        self.assertEqual(report["contacts"]["rows"], 50)
+
+    def test_export_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            export_files(directory, 2, 150, seed=1, batch_size=100, workers=1, hashed_password="hash")
+            files = sorted(os.listdir(directory))
+            self.assertEqual(files, [
+                "contacts-0000000001.csv", "contacts-0000000101.csv", "load_mysql.sql", "load_postgresql.sql",
+                "users-0000000001.csv",
+            ])
+            with open(os.path.join(directory, "contacts-0000000101.csv")) as file:
+                self.assertEqual(len(file.readlines()), 51)
+            with open(os.path.join(directory, "load_mysql.sql")) as file:
+                self.assertEqual(len(file.readlines()), 3)
+
+
+class TestSearch(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{self.tmp.name}/search.db")
+        metadata = MetaData()
+        self.contacts = Table(
+            "contacts",
+            metadata,
+            Column("id", Integer, primary_key=True),
+            Column("owner_id", Integer),
+            Column("first_name", String),
+            Column("last_name", String),
+            Column("email", String),
+        )
+        metadata.create_all(self.engine)
+        with self.engine.begin() as conn:
+            conn.execute(self.contacts.insert(), [
+                {"owner_id": 1, "first_name": "John", "last_name": "Doe", "email": "john@example.com"},
+                {"owner_id": 2, "first_name": "Anna", "last_name": "Kowalska", "email": "anna@example.org"},
+            ])
+        init_search(self.engine)
+        self.async_engine = create_async_engine(f"sqlite+aiosqlite:///{self.tmp.name}/search.db")
+        self.db = AsyncSession(bind=self.async_engine)
+
+    async def asyncTearDown(self):
+        await self.db.close()
+        await self.async_engine.dispose()
+        self.engine.dispose()
+        self.tmp.cleanup()
+
+    async def test_prefix_match(self):
+        self.assertEqual(await search_contact_ids(self.db, "jo"), [1])
+
+    async def test_trigram_match(self):
+        self.assertEqual(await search_contact_ids(self.db, "owals"), [2])
+
+    async def test_owner_scope(self):
+        self.assertEqual(await search_contact_ids(self.db, "kowalska", owner_id=2), [2])
+        self.assertEqual(await search_contact_ids(self.db, "kowalska", owner_id=1), [])
+        self.assertEqual(await search_contact_ids(self.db, "owals", owner_id=1), [])
+
+    async def test_index_follows_changes(self):
+        with self.engine.begin() as conn:
+            conn.execute(text("UPDATE contacts SET last_name = 'Nowak' WHERE id = 2"))
+            conn.execute(text("DELETE FROM contacts WHERE id = 1"))
+        self.assertEqual(await search_contact_ids(self.db, "nowak"), [2])
+        self.assertEqual(await search_contact_ids(self.db, "kowalska"), [])
+        self.assertEqual(await search_contact_ids(self.db, "john"), [])
 
-    @patch("data_sender.mysql.connector.connect")
-    @patch("data_sender.open")
-    @patch("data_sender.mysql.connector.cursor")
-    def test_import_data_to_mysql(self, mock_cursor, mock_open, mock_connect):
-        mock_cursor_instance = MagicMock()
-        mock_cursor.return_value.__enter__.return_value = mock_cursor_instance
 
-        mock_connect_instance = MagicMock()
-        mock_connect.return_value = mock_connect_instance
+class TestMigrations(unittest.TestCase):
 
-        mock_open_instance = MagicMock()
-        mock_open.return_value.__enter__.return_value.read.return_value = "CREATE TABLE test_table (id INT); INSERT INTO test_table VALUES (1);"
-        mock_open.return_value = mock_open_instance
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{self.tmp.name}/migrations.db")
 
-        import_data_to_mysql()
+    def tearDown(self):
+        self.engine.dispose()
+        self.tmp.cleanup()
 
-        mock_connect.assert_called_with(
-            host="localhost",
-            user="Camilleus",
-            password="fghg1234",
-            database="konigcontacts"
+    def _upgrade(self, revision):
+        with self.engine.begin() as conn:
+            command.upgrade(alembic_config(conn), revision)
+
+    def _insert_contacts(self, count):
+        with self.engine.begin() as conn:
+            conn.execute(text("INSERT INTO users (username, email) VALUES ('alice', 'alice@example.com')"))
+            for i in range(count):
+                conn.execute(text(
+                    "INSERT INTO contacts (first_name, email, birth_date) VALUES ('John', :email, '1990-12-24')"
+                ), {"email": f"john{i}@example.com"})
+
+    def test_head_matches_models(self):
+        self._upgrade("head")
+        with self.engine.connect() as conn:
+            context = MigrationContext.configure(conn, opts={
+                "include_object": lambda object, name, type_, *args: not name.startswith("contacts_fts"),
+            })
+            self.assertEqual(compare_metadata(context, [Base.metadata, backfill_metadata]), [])
+
+    def test_contract_waits_for_backfills(self):
+        self._upgrade("0004")
+        self._insert_contacts(3)
+        with self.assertRaises(RuntimeError):
+            self._upgrade("head")
+        with patch.dict(os.environ, {"BACKFILL_CONTACTS_OWNER": "alice"}):
+            for name in BACKFILLS:
+                run_backfill(self.engine, name, pause=0)
+        self._upgrade("head")
+        with self.engine.connect() as conn:
+            rows = conn.execute(text("SELECT birth_md, owner_id FROM contacts WHERE updated_at IS NOT NULL")).all()
+        self.assertEqual([tuple(row) for row in rows], [(1224, 1)] * 3)
+
+    def test_backfill_resumes_from_checkpoint(self):
+        self._upgrade("0004")
+        self._insert_contacts(5)
+        state = run_backfill(self.engine, "contacts_birth_md", batch_size=2, pause=0, max_batches=1)
+        self.assertEqual(state, {"last_id": 2, "rows": 2, "done": False})
+        state = run_backfill(self.engine, "contacts_birth_md", batch_size=2, pause=0)
+        self.assertEqual(state, {"last_id": 5, "rows": 5, "done": True})
+        with self.engine.connect() as conn:
+            self.assertFalse(pending_rows(conn, "contacts_birth_md"))
+
+
+class TestDataSender(unittest.TestCase):
+
+    DUMP = (
+        "-- dump; header\n"
+        "/*!40101 SET NAMES utf8mb4 */;\n"
+        "CREATE TABLE t (id INTEGER PRIMARY KEY, s TEXT); # comment; here\n"
+        "INSERT INTO t VALUES (1, 'a;b'), (2, 'it''s \"x\"');\n"
+        "INSERT INTO t VALUES (3, 'O''Hara; /* not a comment */');\n"
+        "DELIMITER $$\n"
+        "CREATE TRIGGER tr AFTER INSERT ON t BEGIN SELECT 1; SELECT 2; END$$\n"
+        "DELIMITER ;\n"
+        "INSERT INTO t VALUES (4, '-- not a comment')"
+    ).encode()
+
+    def test_statement_reader(self):
+        expected = [
+            "/*!40101 SET NAMES utf8mb4 */",
+            "CREATE TABLE t (id INTEGER PRIMARY KEY, s TEXT)",
+            "INSERT INTO t VALUES (1, 'a;b'), (2, 'it''s \"x\"')",
+            "INSERT INTO t VALUES (3, 'O''Hara; /* not a comment */')",
+            "CREATE TRIGGER tr AFTER INSERT ON t BEGIN SELECT 1; SELECT 2; END",
+            "INSERT INTO t VALUES (4, '-- not a comment')",
+        ]
+        # Małe bloki sprawdzają literały, komentarze i ograniczniki przecięte granicą bloku.
+        for chunk_size in (1, 5, 1024):
+            statements = list(StatementReader(io.BytesIO(self.DUMP), chunk_size=chunk_size))
+            self.assertEqual([statement for statement, _ in statements], expected)
+        offsets = [offset for _, offset in statements]
+        self.assertEqual(self.DUMP[offsets[0] - 1:offsets[0]], b";")
+        self.assertEqual(offsets[-1], len(self.DUMP))
+        resumed = StatementReader(io.BytesIO(self.DUMP[offsets[1]:]), offset=offsets[1])
+        self.assertEqual(list(resumed), statements[2:])
+        escaped = StatementReader(io.BytesIO(b"SELECT 'it\\'s; \\\\';SELECT 2"))
+        self.assertEqual([statement for statement, _ in escaped], ["SELECT 'it\\'s; \\\\'", "SELECT 2"])
+
+    def test_split_insert(self):
+        self.assertEqual(
+            split_insert("INSERT INTO t (a, b) VALUES (1, 'x)'), (2, 'y')"),
+            ("INSERT INTO t (a, b) VALUES", "(1, 'x)'), (2, 'y')"),
         )
+        self.assertIsNone(split_insert("INSERT INTO t VALUES (1) ON DUPLICATE KEY UPDATE a = VALUES(a)"))
+        self.assertIsNone(split_insert("INSERT INTO t SELECT * FROM u"))
+
+    def test_import_sql_dump(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "dump.sql")
+            with open(path, "wb") as file:
+                file.write(self.DUMP)
+            engine = create_engine(f"sqlite:///{directory}/import.db")
+            report = import_sql_dump(path, engine, chunk_size=7)
+            with engine.connect() as conn:
+                rows = conn.execute(text("SELECT id, s FROM t ORDER BY id")).all()
+            engine.dispose()
+        self.assertEqual(rows, [(1, "a;b"), (2, "it's \"x\""), (3, "O'Hara; /* not a comment */"), (4, "-- not a comment")])
+        self.assertEqual(report["statements"], 6)
+        # Dwa kolejne INSERT-y do `t` są wysyłane jednym zapytaniem, a `/*!...*/` jest pomijane poza MySQL.
+        self.assertEqual(report["executed"], 4)
+
+    def test_import_resumes_from_checkpoint(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "dump.sql")
+            with open(path, "w") as file:
+                file.write(
+                    "CREATE TABLE t (id INTEGER PRIMARY KEY);\n"
+                    "INSERT INTO t VALUES (1);\nINSERT INTO t VALUES (2);\n"
+                    "INSERT INTO missing VALUES (3);\nINSERT INTO t VALUES (4);\n"
+                )
+            engine = create_engine(f"sqlite:///{directory}/import.db")
+            with self.assertRaises(Exception):
+                import_sql_dump(path, engine, commit_every=2)
+            with engine.begin() as conn:
+                self.assertEqual(conn.execute(text("SELECT id FROM t")).scalars().all(), [1, 2])
+                conn.execute(text("CREATE TABLE missing (id INTEGER PRIMARY KEY)"))
+            with engine.connect() as conn:
+                checkpoint = conn.execute(text("SELECT position, statements FROM data_imports WHERE name = 'dump.sql'")).one()
+            self.assertEqual(checkpoint.statements, 3)
+            report = import_sql_dump(path, engine, commit_every=2, resume=True)
+            with engine.connect() as conn:
+                self.assertEqual(conn.execute(text("SELECT id FROM t ORDER BY id")).scalars().all(), [1, 2, 4])
+                self.assertEqual(conn.execute(text("SELECT id FROM missing")).scalars().all(), [3])
+            engine.dispose()
+        self.assertEqual(report["statements"], 5)
+
+    def test_track_session(self):
+        session = {}
+        for statement in [
+            "/*!40101 SET NAMES utf8mb4 */", "/*!40014 SET FOREIGN_KEY_CHECKS=0 */", "LOCK TABLES `t` WRITE",
+            "CREATE TABLE t (id INT)", "/*!40101 SET NAMES utf8mb4 */", "UNLOCK TABLES", "USE `contacts`",
+        ]:
+            track_session(session, statement)
+        # Powtórzona instrukcja trafia na koniec, a UNLOCK TABLES usuwa LOCK TABLES.
+        self.assertEqual(list(session), ["/*!40014 SET FOREIGN_KEY_CHECKS=0 */", "/*!40101 SET NAMES utf8mb4 */", "USE `contacts`"])
 
-        mock_cursor_instance.execute.assert_called_with("CREATE TABLE test_table (id INT)")
-        mock_cursor_instance.execute.assert_called_with("INSERT INTO test_table VALUES (1)")
-        mock_connect_instance.commit.assert_called()
-        mock_cursor_instance.close.assert_called()
-        mock_connect_instance.close.assert_called()
 
-        
 if __name__ == '__main__':
     unittest.main()
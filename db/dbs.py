@@ -1,38 +1,174 @@
-from databases import Database
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
+import logging
 import os
 from dotenv import load_dotenv
+from db.search import create_search_index
+from models import Base
+from db.pool_metrics import instrument_engine, TimedQueuePool, TimedAsyncAdaptedQueuePool
 
 
 load_dotenv()
 
 
+logger = logging.getLogger(__name__)
+
+
 DATABASE_URL = os.getenv("DATABASE_URL")
 
 
-database = Database(DATABASE_URL)
-engine = create_engine(DATABASE_URL)
+# Sterowniki asynchroniczne używane zamiast synchronicznych dla danego backendu.
+ASYNC_DRIVERS = {
+    "sqlite": "aiosqlite",
+    "mysql": "aiomysql",
+    "postgresql": "asyncpg",
+}
+
+
+# Ustawienia puli połączeń. DB_POOL_RECYCLE powinno być krótsze niż wait_timeout serwera MySQL,
+# a DB_POOL_PRE_PING sprawdza połączenie przed użyciem, więc zerwane połączenia nie trafiają do żądań.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+
+def to_async_url(url: str):
+    """
+    Zamienia adres bazy danych na adres z asynchronicznym sterownikiem.
+
+    Args:
+        url (str): Adres bazy danych, np. `mysql+pymysql://...`.
+
+    Returns:
+        URL: Adres z asynchronicznym sterownikiem, np. `mysql+aiomysql://...`.
+    """
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend in ASYNC_DRIVERS and url.get_driver_name() != ASYNC_DRIVERS[backend]:
+        url = url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}")
+    return url
+
+
+def pool_options(url, name: str, asynchronous: bool = False) -> dict:
+    """
+    Zwraca ustawienia puli połączeń dla `create_engine` / `create_async_engine`.
+
+    SQLite nie korzysta z puli kolejkowej, więc dla niego ustawienia są pomijane.
+
+    Args:
+        url (URL): Adres bazy danych.
+        name (str): Nazwa puli w logach i metrykach.
+        asynchronous (bool, optional): Czy pula jest dla silnika asynchronicznego. Defaults to False.
+
+    Returns:
+        dict: Argumenty puli połączeń.
+    """
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+    return {
+        "poolclass": TimedAsyncAdaptedQueuePool if asynchronous else TimedQueuePool,
+        "pool_logging_name": name,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or to_async_url(DATABASE_URL)
+
+
+# Synchroniczny silnik służy do tworzenia schematu i skryptów uruchamianych poza aplikacją.
+engine = create_engine(DATABASE_URL, **pool_options(DATABASE_URL, "sync"))
+instrument_engine(engine, "sync")
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
-Base = declarative_base()
+# Asynchroniczny silnik ze wspólną pulą połączeń obsługuje wszystkie żądania API.
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **pool_options(ASYNC_DATABASE_URL, "async", asynchronous=True))
+instrument_engine(async_engine.sync_engine, "async")
+AsyncSessionLocal = sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+
+def alembic_config(connection=None):
+    """
+    Zwraca konfigurację Alembica dla migracji z `db/migrations`.
+
+    Args:
+        connection (Connection, optional): Połączenie, na którym mają działać polecenia. Defaults to None
+            (nowe połączenie do DATABASE_URL).
+
+    Returns:
+        Config: Konfiguracja Alembica.
+    """
+    from alembic.config import Config
+
+    config = Config()
+    config.set_main_option("script_location", MIGRATIONS_DIR)
+    # ConfigParser traktuje % jako interpolację, a może on wystąpić w haśle.
+    config.set_main_option("sqlalchemy.url", str(DATABASE_URL).replace("%", "%%"))
+    config.attributes["connection"] = connection
+    return config
 
 
 def init_db():
     """
-    Inicjuje bazę danych poprzez tworzenie wszystkich tabel zdefiniowanych w bazie.
+    Przygotowuje schemat bazy danych.
+
+    Pusta baza dostaje od razu wszystkie tabele z modeli (`models.Base`),
+    indeks pełnotekstowy kontaktów i znacznik najnowszej migracji Alembica.
+    Istniejąca baza nie jest zmieniana: jej schemat aktualizują migracje
+    (`alembic upgrade head` i backfille `python -m db.backfill`), a tutaj
+    jest tylko ostrzeżenie, gdy nie jest aktualna.
+
+    Wywoływana przy starcie aplikacji (lifespan), a nie przy imporcie, więc
+    Alembic jest importowany dopiero tutaj.
+    """
+    from alembic import command
+    from alembic.runtime.migration import MigrationContext
+    from alembic.script import ScriptDirectory
+
+    with engine.begin() as conn:
+        if not inspect(conn).has_table("contacts"):
+            Base.metadata.create_all(bind=conn)
+            create_search_index(conn)
+            command.stamp(alembic_config(conn), "head")
+            return
+        current = MigrationContext.configure(conn).get_current_revision()
+    head = ScriptDirectory.from_config(alembic_config()).get_current_head()
+    if current != head:
+        logger.warning(
+            "Database schema is at revision %s, the latest is %s; run `alembic upgrade head` "
+            "(a database created before migrations needs `alembic stamp 0001` first)", current, head
+        )
+
+
+async def connect_db():
+    """
+    Otwiera pulę połączeń asynchronicznego silnika, sprawdzając połączenie z bazą.
+    """
+    async with async_engine.connect():
+        pass
+
+
+async def disconnect_db():
+    """
+    Zamyka wszystkie połączenia w puli asynchronicznego silnika.
     """
-    Base.metadata.create_all(bind=engine)
+    await async_engine.dispose()
 
 
-def get_db():
+async def get_db():
     """
-    Uzyskuje sesję bazy danych, która jest używana przez zasoby w aplikacji.
+    Uzyskuje asynchroniczną sesję bazy danych, która jest używana przez zasoby w aplikacji.
     """
-    db = SessionLocal()
-    try:
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
@@ -0,0 +1,71 @@
+"""
+Środowisko Alembica dla schematu z `models.Base` i punktów kontrolnych backfilli.
+
+Każda rewizja jest wykonywana w osobnej transakcji, więc przerwana migracja
+"contract" (np. przez niedokończony backfill) nie cofa wcześniejszych kroków.
+Dla SQLite zmiany kolumn i ograniczeń są wykonywane w trybie wsadowym
+(kopia tabeli), dla MySQL jako zwykłe ALTER TABLE (online DDL InnoDB).
+"""
+import os
+from logging.config import fileConfig
+from alembic import context
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, pool
+from models import Base
+from db.backfill import metadata as backfill_metadata
+
+
+load_dotenv()
+
+config = context.config
+
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+target_metadata = [Base.metadata, backfill_metadata]
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    # Tabele FTS5 (i ich tabele pomocnicze) zakłada db.search, nie autogenerate.
+    return not (type_ == "table" and name.startswith("contacts_fts"))
+
+
+def database_url() -> str:
+    return config.get_main_option("sqlalchemy.url") or os.getenv("DATABASE_URL")
+
+
+def configure(**options):
+    context.configure(
+        target_metadata=target_metadata,
+        include_object=include_object,
+        render_as_batch=True,
+        transaction_per_migration=True,
+        **options,
+    )
+
+
+def run_migrations_offline():
+    configure(url=database_url(), literal_binds=True, dialect_opts={"paramstyle": "named"})
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    # Aplikacja (db.dbs.init_db) może przekazać własne połączenie.
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        configure(connection=connection)
+        with context.begin_transaction():
+            context.run_migrations()
+        return
+    engine = create_engine(database_url(), poolclass=pool.NullPool)
+    with engine.connect() as connection:
+        configure(connection=connection)
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
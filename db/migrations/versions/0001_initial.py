@@ -0,0 +1,51 @@
+"""Początkowy schemat: kontakty i użytkownicy
+
+Stan bazy sprzed migracji (tabela kontaktów z db/data_faker.py i tabela
+użytkowników). Istniejącą bazę z tym schematem należy oznaczyć poleceniem
+`alembic stamp 0001` zamiast ją tworzyć.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "contacts",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("first_name", sa.String(50)),
+        sa.Column("last_name", sa.String(50)),
+        sa.Column("email", sa.String(100)),
+        sa.Column("phone_number", sa.String(50)),
+        sa.Column("birth_date", sa.Date),
+        sa.Column("additional_data", sa.Text, nullable=True),
+    )
+    op.create_index("ix_contacts_id", "contacts", ["id"])
+    op.create_index("ix_contacts_first_name", "contacts", ["first_name"])
+    op.create_index("ix_contacts_last_name", "contacts", ["last_name"])
+    op.create_index("ix_contacts_email", "contacts", ["email"], unique=True)
+
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("username", sa.String(50)),
+        sa.Column("hashed_password", sa.String(255)),
+        sa.Column("email", sa.String(100)),
+    )
+    op.create_index("ix_users_id", "users", ["id"])
+    op.create_index("ix_users_username", "users", ["username"], unique=True)
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+
+def downgrade():
+    op.drop_table("users")
+    op.drop_table("contacts")
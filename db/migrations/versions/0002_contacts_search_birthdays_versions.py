@@ -0,0 +1,49 @@
+"""Kontakty: indeks pełnotekstowy, birth_md, version i updated_at (expand)
+
+Nowe kolumny są dodawane jako NULL-owalne albo ze stałą wartością domyślną,
+więc ALTER TABLE nie przepisuje tabeli. `birth_md` i `updated_at` uzupełniają
+backfille `contacts_birth_md` i `contacts_updated_at`
+(`python -m db.backfill run ...`); NOT NULL ustawia migracja 0005.
+Powstaje też tabela punktów kontrolnych backfilli `data_migrations`.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+from db.search import create_search_index, drop_search_index
+
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "data_migrations",
+        sa.Column("name", sa.String(100), primary_key=True),
+        sa.Column("last_id", sa.Integer, nullable=False),
+        sa.Column("rows", sa.Integer, nullable=False),
+        sa.Column("done", sa.Boolean, nullable=False),
+        sa.Column("updated_at", sa.DateTime, nullable=False),
+    )
+    op.add_column("contacts", sa.Column("birth_md", sa.SmallInteger, nullable=True))
+    op.add_column("contacts", sa.Column("version", sa.Integer, nullable=False, server_default=sa.text("1")))
+    op.add_column("contacts", sa.Column("updated_at", sa.DateTime, nullable=True))
+    op.create_index("ix_contacts_birth_md", "contacts", ["birth_md"])
+    op.create_index("ix_contacts_updated_at", "contacts", ["updated_at"])
+    create_search_index(op.get_bind())
+
+
+def downgrade():
+    drop_search_index(op.get_bind())
+    op.drop_index("ix_contacts_updated_at", "contacts")
+    op.drop_index("ix_contacts_birth_md", "contacts")
+    with op.batch_alter_table("contacts") as batch:
+        batch.drop_column("updated_at")
+        batch.drop_column("version")
+        batch.drop_column("birth_md")
+    op.drop_table("data_migrations")
@@ -0,0 +1,35 @@
+"""Użytkownicy: aktywność, awatar, weryfikacja e-mail i created_at (expand)
+
+Istniejące konta są aktywne i zweryfikowane (stałe wartości domyślne).
+`created_at` uzupełnia backfill `users_created_at`; NOT NULL ustawia migracja 0005.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("users", sa.Column("is_active", sa.Boolean, nullable=False, server_default=sa.true()))
+    op.add_column("users", sa.Column("avatar_url", sa.String(255), nullable=True))
+    op.add_column("users", sa.Column("is_verified", sa.Boolean, nullable=False, server_default=sa.true()))
+    op.add_column("users", sa.Column("verification_token_hash", sa.String(64), nullable=True))
+    op.add_column("users", sa.Column("verification_expires_at", sa.DateTime, nullable=True))
+    op.add_column("users", sa.Column("created_at", sa.DateTime, nullable=True))
+    op.create_index("ix_users_unverified_expiry", "users", ["is_verified", "verification_expires_at"])
+
+
+def downgrade():
+    op.drop_index("ix_users_unverified_expiry", "users")
+    with op.batch_alter_table("users") as batch:
+        for column in ("created_at", "verification_expires_at", "verification_token_hash",
+                       "is_verified", "avatar_url", "is_active"):
+            batch.drop_column(column)
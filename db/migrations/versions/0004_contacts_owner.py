@@ -0,0 +1,49 @@
+"""Kontakty: właściciel i indeksy złożone (expand)
+
+`owner_id` jest dodawane jako NULL-owalne, a nowe indeksy (zaczynające się
+od `owner_id`) powstają obok starych, które usuwa dopiero migracja 0005.
+Istniejące kontakty przypisuje backfill `contacts_owner` do użytkownika
+z BACKFILL_CONTACTS_OWNER. Unikalny indeks (owner_id, email) nie blokuje
+kontaktów bez właściciela, bo wartości NULL są w nim różne.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+from db.search import create_search_index
+
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ("ix_contacts_owner_id", ["owner_id", "id"], False),
+    ("ix_contacts_owner_updated_at", ["owner_id", "updated_at"], False),
+    ("ix_contacts_owner_name", ["owner_id", "last_name", "first_name"], False),
+    ("ix_contacts_owner_email", ["owner_id", "email"], True),
+    ("ix_contacts_owner_birth_md", ["owner_id", "birth_md"], False),
+]
+
+
+def upgrade():
+    with op.batch_alter_table("contacts") as batch:
+        batch.add_column(sa.Column("owner_id", sa.Integer, nullable=True))
+        batch.create_foreign_key("fk_contacts_owner_id_users", "users", ["owner_id"], ["id"], ondelete="CASCADE")
+    # SQLite kopiuje tabelę w trybie wsadowym, a razem ze starą tabelą znikają triggery FTS.
+    create_search_index(op.get_bind())
+    for name, columns, unique in INDEXES:
+        op.create_index(name, "contacts", columns, unique=unique)
+
+
+def downgrade():
+    for name, _, _ in reversed(INDEXES):
+        op.drop_index(name, "contacts")
+    with op.batch_alter_table("contacts") as batch:
+        batch.drop_constraint("fk_contacts_owner_id_users", type_="foreignkey")
+        batch.drop_column("owner_id")
+    create_search_index(op.get_bind())
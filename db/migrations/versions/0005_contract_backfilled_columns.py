@@ -0,0 +1,58 @@
+"""Kontakty i użytkownicy: NOT NULL po backfillach, usunięcie starych indeksów (contract)
+
+Wymaga zakończonych backfilli `contacts_birth_md`, `contacts_updated_at`,
+`users_created_at` i `contacts_owner`; w przeciwnym razie migracja jest
+przerywana z listą poleceń do uruchomienia. Stare jednokolumnowe indeksy
+kontaktów (także globalnie unikalny e-mail) zastępują indeksy z migracji 0004.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+from db.search import create_search_index
+from db.backfill import ensure_backfilled
+
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+OLD_INDEXES = [
+    ("ix_contacts_first_name", ["first_name"], False),
+    ("ix_contacts_last_name", ["last_name"], False),
+    ("ix_contacts_email", ["email"], True),
+    ("ix_contacts_birth_md", ["birth_md"], False),
+    ("ix_contacts_updated_at", ["updated_at"], False),
+]
+
+
+def upgrade():
+    ensure_backfilled(op.get_bind(), "contacts_birth_md", "contacts_updated_at", "users_created_at", "contacts_owner")
+    for name, _, _ in OLD_INDEXES:
+        op.drop_index(name, "contacts")
+    with op.batch_alter_table("contacts") as batch:
+        batch.alter_column("owner_id", existing_type=sa.Integer, nullable=False)
+        batch.alter_column(
+            "updated_at", existing_type=sa.DateTime, nullable=False, server_default=sa.func.current_timestamp()
+        )
+    with op.batch_alter_table("users") as batch:
+        batch.alter_column(
+            "created_at", existing_type=sa.DateTime, nullable=False, server_default=sa.func.current_timestamp()
+        )
+    # SQLite kopiuje tabelę w trybie wsadowym, a razem ze starą tabelą znikają triggery FTS.
+    create_search_index(op.get_bind())
+
+
+def downgrade():
+    with op.batch_alter_table("users") as batch:
+        batch.alter_column("created_at", existing_type=sa.DateTime, nullable=True, server_default=None)
+    with op.batch_alter_table("contacts") as batch:
+        batch.alter_column("updated_at", existing_type=sa.DateTime, nullable=True, server_default=None)
+        batch.alter_column("owner_id", existing_type=sa.Integer, nullable=True)
+    create_search_index(op.get_bind())
+    for name, columns, unique in OLD_INDEXES:
+        op.create_index(name, "contacts", columns, unique=unique)
@@ -0,0 +1,94 @@
+import time
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from metrics import Counter, Gauge, Histogram
+
+
+CHECKOUT_SECONDS = Histogram(
+    "db_pool_checkout_seconds",
+    "Czas oczekiwania na połączenie z puli (łącznie z otwarciem nowego połączenia).",
+    ["pool"],
+)
+HOLD_SECONDS = Histogram(
+    "db_pool_connection_hold_seconds",
+    "Czas, przez jaki połączenie było pobrane z puli.",
+    ["pool"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+)
+CHECKOUTS = Counter("db_pool_checkouts_total", "Liczba pobrań połączeń z puli.", ["pool"])
+CONNECTS = Counter("db_pool_connections_opened_total", "Liczba otwartych połączeń z bazą.", ["pool"])
+INVALIDATIONS = Counter("db_pool_invalidations_total", "Liczba unieważnionych połączeń.", ["pool"])
+
+
+_engines = {}
+
+
+def _pool_status(attribute: str):
+    def collect():
+        return {
+            (name,): getattr(engine.pool, attribute)()
+            for name, engine in _engines.items()
+            if isinstance(engine.pool, QueuePool)
+        }
+    return collect
+
+
+Gauge("db_pool_size", "Docelowy rozmiar puli.", ["pool"], collect=_pool_status("size"))
+Gauge("db_pool_checked_out", "Liczba połączeń aktualnie pobranych z puli.", ["pool"], collect=_pool_status("checkedout"))
+Gauge("db_pool_checked_in", "Liczba wolnych połączeń w puli.", ["pool"], collect=_pool_status("checkedin"))
+Gauge("db_pool_overflow", "Liczba połączeń ponad rozmiar puli (ujemna, gdy pula nie jest pełna).", ["pool"], collect=_pool_status("overflow"))
+
+
+class _TimedCheckoutMixin:
+    """
+    Mierzy czas pobrania połączenia z puli, etykietując go nazwą `logging_name` puli.
+    """
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            CHECKOUT_SECONDS.observe(time.perf_counter() - started, pool=self._orig_logging_name or "default")
+
+
+class TimedQueuePool(_TimedCheckoutMixin, QueuePool):
+    """
+    QueuePool mierzący czas oczekiwania na połączenie.
+    """
+
+
+class TimedAsyncAdaptedQueuePool(_TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    """
+    AsyncAdaptedQueuePool mierzący czas oczekiwania na połączenie.
+    """
+
+
+def instrument_engine(engine, name: str):
+    """
+    Podpina zdarzenia puli silnika pod metryki i rejestruje pulę w wskaźnikach.
+
+    Args:
+        engine (Engine): Silnik synchroniczny (dla silnika asynchronicznego `async_engine.sync_engine`).
+        name (str): Nazwa puli używana jako etykieta `pool`.
+    """
+    _engines[name] = engine
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        CONNECTS.inc(pool=name)
+
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        CHECKOUTS.inc(pool=name)
+        connection_record.info["checked_out_at"] = time.perf_counter()
+
+    @event.listens_for(engine, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        checked_out_at = connection_record.info.pop("checked_out_at", None)
+        if checked_out_at is not None:
+            HOLD_SECONDS.observe(time.perf_counter() - checked_out_at, pool=name)
+
+    @event.listens_for(engine, "invalidate")
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        INVALIDATIONS.inc(pool=name)
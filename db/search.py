@@ -0,0 +1,238 @@
+import re
+import sqlite3
+from sqlalchemy import inspect, text, or_, Integer
+
+
+SEARCH_COLUMNS = ("first_name", "last_name", "email")
+
+# Tokenizer trigram jest dostępny w FTS5 od SQLite 3.34.
+SQLITE_TRIGRAM_SUPPORTED = sqlite3.sqlite_version_info >= (3, 34, 0)
+
+MYSQL_FULLTEXT_INDEX = "ft_contacts_search"
+
+
+_SQLITE_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS contacts_fts USING fts5(
+        first_name, last_name, email,
+        content='contacts', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS contacts_fts_ai AFTER INSERT ON contacts BEGIN
+        INSERT INTO contacts_fts(rowid, first_name, last_name, email)
+        VALUES (new.id, new.first_name, new.last_name, new.email);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS contacts_fts_ad AFTER DELETE ON contacts BEGIN
+        INSERT INTO contacts_fts(contacts_fts, rowid, first_name, last_name, email)
+        VALUES ('delete', old.id, old.first_name, old.last_name, old.email);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS contacts_fts_au AFTER UPDATE OF first_name, last_name, email ON contacts BEGIN
+        INSERT INTO contacts_fts(contacts_fts, rowid, first_name, last_name, email)
+        VALUES ('delete', old.id, old.first_name, old.last_name, old.email);
+        INSERT INTO contacts_fts(rowid, first_name, last_name, email)
+        VALUES (new.id, new.first_name, new.last_name, new.email);
+    END""",
+]
+
+_SQLITE_TRIGRAM_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS contacts_fts_trigram USING fts5(
+        first_name, last_name, email,
+        content='contacts', content_rowid='id',
+        tokenize='trigram'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS contacts_fts_trigram_ai AFTER INSERT ON contacts BEGIN
+        INSERT INTO contacts_fts_trigram(rowid, first_name, last_name, email)
+        VALUES (new.id, new.first_name, new.last_name, new.email);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS contacts_fts_trigram_ad AFTER DELETE ON contacts BEGIN
+        INSERT INTO contacts_fts_trigram(contacts_fts_trigram, rowid, first_name, last_name, email)
+        VALUES ('delete', old.id, old.first_name, old.last_name, old.email);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS contacts_fts_trigram_au AFTER UPDATE OF first_name, last_name, email ON contacts BEGIN
+        INSERT INTO contacts_fts_trigram(contacts_fts_trigram, rowid, first_name, last_name, email)
+        VALUES ('delete', old.id, old.first_name, old.last_name, old.email);
+        INSERT INTO contacts_fts_trigram(rowid, first_name, last_name, email)
+        VALUES (new.id, new.first_name, new.last_name, new.email);
+    END""",
+]
+
+
+def init_search(engine):
+    """
+    Tworzy indeks pełnotekstowy dla kontaktów, jeśli jeszcze nie istnieje.
+
+    Args:
+        engine (Engine): Silnik bazy danych.
+    """
+    with engine.begin() as conn:
+        create_search_index(conn)
+
+
+def create_search_index(conn):
+    """
+    Tworzy indeks pełnotekstowy dla kontaktów w ramach otwartej transakcji (np. migracji).
+
+    Dla SQLite zakładane są tabele FTS5 (prefiksowa i trigramowa) z zawartością
+    zewnętrzną oraz triggery, które synchronizują je przy INSERT/UPDATE/DELETE.
+    Dla MySQL zakładany jest indeks FULLTEXT z parserem ngram, który InnoDB
+    aktualizuje sam. Dla pozostałych baz nic nie jest tworzone, a wyszukiwanie
+    korzysta z ILIKE.
+
+    Args:
+        conn (Connection): Połączenie z bazą danych.
+    """
+    inspector = inspect(conn)
+    if not inspector.has_table("contacts"):
+        return
+
+    dialect = conn.dialect.name
+    if dialect == "sqlite":
+        created = not inspector.has_table("contacts_fts")
+        statements = _SQLITE_DDL + (_SQLITE_TRIGRAM_DDL if SQLITE_TRIGRAM_SUPPORTED else [])
+        for statement in statements:
+            conn.execute(text(statement))
+        if created:
+            conn.execute(text("INSERT INTO contacts_fts(contacts_fts) VALUES ('rebuild')"))
+            if SQLITE_TRIGRAM_SUPPORTED:
+                conn.execute(text("INSERT INTO contacts_fts_trigram(contacts_fts_trigram) VALUES ('rebuild')"))
+    elif dialect == "mysql":
+        indexes = {index["name"] for index in inspector.get_indexes("contacts")}
+        if MYSQL_FULLTEXT_INDEX not in indexes:
+            conn.execute(text(
+                f"ALTER TABLE contacts ADD FULLTEXT INDEX {MYSQL_FULLTEXT_INDEX} "
+                f"({', '.join(SEARCH_COLUMNS)}) WITH PARSER ngram"
+            ))
+
+
+def drop_search_index(conn):
+    """
+    Usuwa indeks pełnotekstowy kontaktów utworzony przez `create_search_index`.
+
+    Args:
+        conn (Connection): Połączenie z bazą danych.
+    """
+    dialect = conn.dialect.name
+    if dialect == "sqlite":
+        for table in ("contacts_fts", "contacts_fts_trigram"):
+            for event in ("ai", "ad", "au"):
+                conn.execute(text(f"DROP TRIGGER IF EXISTS {table}_{event}"))
+            conn.execute(text(f"DROP TABLE IF EXISTS {table}"))
+    elif dialect == "mysql":
+        indexes = {index["name"] for index in inspect(conn).get_indexes("contacts")}
+        if MYSQL_FULLTEXT_INDEX in indexes:
+            conn.execute(text(f"ALTER TABLE contacts DROP INDEX {MYSQL_FULLTEXT_INDEX}"))
+
+
+def _quote(term: str) -> str:
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _sqlite_match(table: str, param: str, owner_id: int = None) -> str:
+    if owner_id is None:
+        return f"SELECT rowid AS id FROM {table} WHERE {table} MATCH {param}"
+    # Złączenie po kluczu głównym zawęża wyniki do kontaktów użytkownika przed LIMIT.
+    return (
+        f"SELECT {table}.rowid AS id FROM {table} JOIN contacts ON contacts.id = {table}.rowid "
+        f"WHERE {table} MATCH {param} AND contacts.owner_id = :owner_id"
+    )
+
+
+def _match_branches(dialect: str, q: str, owner_id: int = None):
+    """
+    Buduje zapytania zwracające identyfikatory pasujących kontaktów.
+
+    Args:
+        dialect (str): Nazwa dialektu bazy danych.
+        q (str): Wyszukiwana fraza.
+        owner_id (int, optional): Tylko kontakty tego użytkownika. Defaults to None (wszystkie).
+
+    Returns:
+        list: Pary (zapytanie SQL z kolumną `id` i wyrażeniem rankingu, parametry),
+        od najlepszego rodzaju dopasowania, albo None, jeśli baza nie ma indeksu
+        pełnotekstowego lub fraza jest pusta.
+    """
+    owner = {"owner_id": owner_id} if owner_id is not None else {}
+
+    if dialect == "sqlite":
+        words = re.findall(r"\w+", q)
+        terms = [term for term in q.split() if len(term) >= 3]
+        branches = []
+        if words:
+            branches.append((
+                _sqlite_match("contacts_fts", ":prefix", owner_id),
+                "rank",
+                {"prefix": " AND ".join(_quote(word) + "*" for word in words), **owner},
+            ))
+        if terms and SQLITE_TRIGRAM_SUPPORTED:
+            branches.append((
+                _sqlite_match("contacts_fts_trigram", ":trigram", owner_id),
+                "rank",
+                {"trigram": " AND ".join(_quote(term) for term in terms), **owner},
+            ))
+        return branches or None
+
+    if dialect == "mysql":
+        words = re.findall(r"\w+", q)
+        if not words:
+            return None
+        match = f"MATCH({', '.join(SEARCH_COLUMNS)}) AGAINST (:q IN BOOLEAN MODE)"
+        where = match + (" AND owner_id = :owner_id" if owner_id is not None else "")
+        return [(
+            f"SELECT id FROM contacts WHERE {where}",
+            f"{match} DESC",
+            {"q": " ".join("+" + _quote(word) for word in words), **owner},
+        )]
+
+    return None
+
+
+async def search_contact_ids(db, q: str, limit: int = 50, owner_id: int = None):
+    """
+    Zwraca identyfikatory kontaktów pasujących do frazy, posortowane według trafności.
+
+    Najpierw zwracane są dopasowania całych słów i prefiksów, a dopasowania
+    fragmentów (trigramy) tylko wtedy, gdy tych pierwszych jest mniej niż `limit`.
+
+    Args:
+        db (AsyncSession): Sesja bazy danych.
+        q (str): Wyszukiwana fraza.
+        limit (int, optional): Maksymalna liczba wyników. Defaults to 50.
+        owner_id (int, optional): Tylko kontakty tego użytkownika. Defaults to None (wszystkie).
+
+    Returns:
+        list: Lista identyfikatorów albo None, jeśli indeks pełnotekstowy jest niedostępny.
+    """
+    branches = _match_branches(db.get_bind().dialect.name, q, owner_id)
+    if branches is None:
+        return None
+    ids = []
+    for sql, order_by, params in branches:
+        rows = await db.execute(text(f"{sql} ORDER BY {order_by} LIMIT :limit"), {**params, "limit": limit})
+        for row in rows:
+            if row.id not in ids:
+                ids.append(row.id)
+        if len(ids) >= limit:
+            break
+    return ids[:limit]
+
+
+def search_clause(db, column, q: str):
+    """
+    Zwraca warunek filtrujący kolumnę identyfikatora do kontaktów pasujących do frazy.
+
+    Przydatne, gdy wyniki mają zachować kolejność po `id` (np. przy strumieniowaniu).
+
+    Args:
+        db (AsyncSession): Sesja bazy danych.
+        column (Column): Kolumna identyfikatora kontaktu.
+        q (str): Wyszukiwana fraza.
+
+    Returns:
+        ClauseElement: Warunek `column IN (...)` albo None, jeśli indeks pełnotekstowy jest niedostępny.
+    """
+    branches = _match_branches(db.get_bind().dialect.name, q)
+    if branches is None:
+        return None
+    return or_(*(
+        column.in_(text(sql).bindparams(**params).columns(id=Integer))
+        for sql, _, params in branches
+    ))
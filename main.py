@@ -1,11 +1,49 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
-from db.dbs import init_db
+from db.dbs import init_db, connect_db, disconnect_db, AsyncSessionLocal, async_engine
+from auth.passwords import shutdown_executor
+from auth.mailer import mail_queue
+from api.avatars import shutdown_executor as shutdown_avatar_executor
+from api.config import UNVERIFIED_CLEANUP_INTERVAL
+from auth.registration import cleanup_loop
 from api.routes import router
+from api.apis import router as contacts_router
+from api.endpoints import router as pages_router
+from api.monitoring import router as monitoring_router
+from api.instrumentation import RequestTimingMiddleware, instrument_queries
+from api.profiling import ProfilingMiddleware, router as profiling_router
 from fastapi.middleware.cors import CORSMiddleware
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Przygotowuje schemat bazy (`init_db`) i otwiera pulę połączeń przy starcie
+    aplikacji, a przy wyłączeniu zamyka ją (razem z pulami hashowania haseł
+    i przetwarzania awatarów oraz kolejką poczty, która przed zamknięciem
+    wysyła zaległe wiadomości). W tle okresowo usuwa niezweryfikowane konta
+    z wygasłym linkiem.
+
+    Import modułu nie łączy się z bazą, więc proces startuje szybko także
+    wtedy, gdy baza jest chwilowo niedostępna.
+    """
+    await asyncio.to_thread(init_db)
+    await connect_db()
+    cleanup = None
+    if UNVERIFIED_CLEANUP_INTERVAL > 0:
+        cleanup = asyncio.create_task(cleanup_loop(AsyncSessionLocal, UNVERIFIED_CLEANUP_INTERVAL))
+    yield
+    if cleanup is not None:
+        cleanup.cancel()
+    await disconnect_db()
+    shutdown_executor()
+    shutdown_avatar_executor()
+    await asyncio.to_thread(mail_queue.stop, 30)
+
+
+app = FastAPI(lifespan=lifespan)
 
 
 # Dodaj middleware do obsługi żądań CORS
@@ -16,10 +54,23 @@ app.add_middleware(
     allow_methods=["GET", "POST", "PUT", "DELETE"],  
     allow_headers=["*"],  
 )
+# Mierz czas żądań i zapytań SQL (nagłówek Server-Timing, metryki, log wolnych żądań i N+1)
+app.add_middleware(RequestTimingMiddleware)
+instrument_queries(async_engine.sync_engine)
+# Profilowanie pojedynczych żądań nagłówkiem X-Profile (tylko z PROFILING_ENABLED, dla PROFILING_ADMINS)
+app.add_middleware(ProfilingMiddleware)
 
 
 # Dodaj router zdefiniowany w pliku routes.py
 app.include_router(router)
+# Dodaj router z operacjami CRUD na kontaktach z pliku apis.py
+app.include_router(contacts_router)
+# Dodaj strony logowania, rejestracji i weryfikacji adresu e-mail z pliku endpoints.py
+app.include_router(pages_router)
+# Dodaj endpoint /metrics z metrykami puli połączeń
+app.include_router(monitoring_router)
+# Dodaj endpoint /debug/profile profilujący cały proces (tylko z PROFILING_ENABLED)
+app.include_router(profiling_router)
 
 
 # Udostępnij folder 'static' jako zasób statyczny
@@ -28,13 +79,8 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 app.mount("/templates", StaticFiles(directory="templates"), name="templates")
 
 
-
-# Inicjalizuj bazę danych
-init_db()
-
-
 # Importy funkcji z pliku api.apis i klas z pliku schemas.py
-from api.apis import create_contact, get_all_contacts, get_contact, update_contact, delete_contact, get_birthdays_within_7_days
+from api.apis import create_contact, get_all_contacts, get_contact, update_contact, delete_contact, get_upcoming_birthdays
 from schemas import ContactCreateUpdate, ContactResponse
 
 
@@ -6,6 +6,13 @@ from sqlalchemy.orm import sessionmaker
 from models import Base, Contact
 from datetime import date
 from schemas import ContactCreateUpdate, ContactResponse
+from metrics import Counter, Histogram, render_metrics
+from cache import MemoryCache, RedisCache, CACHE_HITS, CACHE_MISSES, CACHE_EVICTIONS, CACHE_EXPIRATIONS
+from unittest.mock import patch
+import os
+import tempfile
+from benchmarks.startup_bench import heavy_modules, measure, parse_importtime, startup_env
+from benchmarks.api_bench import compare, parse_mix, percentile, summarize
 
 
 
@@ -35,6 +42,7 @@ class TestModels(unittest.TestCase):
     def test_contact_model(self):
         contact = Contact(
             id=1,
+            owner_id=1,
             first_name="John",
             last_name="Doe",
             email="john@example.com",
@@ -98,5 +106,113 @@ class TestSchemas(unittest.TestCase):
         self.assertEqual(contact_schema.additional_data, "Additional information")
 
 
+class TestMetrics(unittest.TestCase):
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram("test_latency_seconds", "Test.", ["route"], buckets=(0.1, 1.0))
+        histogram.observe(0.05, route="/a")
+        histogram.observe(0.5, route="/a")
+        histogram.observe(5, route="/a")
+        rendered = render_metrics()
+        self.assertIn('test_latency_seconds_bucket{route="/a",le="0.1"} 1', rendered)
+        self.assertIn('test_latency_seconds_bucket{route="/a",le="1.0"} 2', rendered)
+        self.assertIn('test_latency_seconds_bucket{route="/a",le="+Inf"} 3', rendered)
+        self.assertIn('test_latency_seconds_count{route="/a"} 3', rendered)
+
+    def test_counter(self):
+        counter = Counter("test_events_total", "Test.", ["kind"])
+        counter.inc(kind="x")
+        counter.inc(2, kind="x")
+        self.assertEqual(counter.value(kind="x"), 3)
+        self.assertIn('test_events_total{kind="x"} 3', render_metrics())
+
+
+class TestCache(unittest.IsolatedAsyncioTestCase):
+
+    async def test_memory_cache_lru_eviction(self):
+        cache = MemoryCache("test-lru", ttl=60, maxsize=2)
+        await cache.set("a", 1)
+        await cache.set("b", 2)
+        self.assertEqual(await cache.get("a"), 1)
+        await cache.set("c", 3)
+        self.assertIsNone(await cache.get("b"))
+        self.assertEqual(await cache.get("a"), 1)
+        self.assertEqual(await cache.get("c"), 3)
+        self.assertEqual(CACHE_HITS.value(cache="test-lru"), 3)
+        self.assertEqual(CACHE_MISSES.value(cache="test-lru"), 1)
+        self.assertEqual(CACHE_EVICTIONS.value(cache="test-lru"), 1)
+
+    async def test_memory_cache_ttl(self):
+        cache = MemoryCache("test-ttl", ttl=10, maxsize=10)
+        with patch("cache.time.monotonic", return_value=100.0):
+            await cache.set("a", 1)
+        with patch("cache.time.monotonic", return_value=111.0):
+            self.assertIsNone(await cache.get("a"))
+        self.assertEqual(CACHE_EXPIRATIONS.value(cache="test-ttl"), 1)
+        self.assertEqual(len(cache), 0)
+
+    async def test_redis_cache(self):
+        try:
+            import fakeredis
+        except ImportError:
+            self.skipTest("fakeredis is not installed")
+        cache = RedisCache("test-redis", ttl=60, client=fakeredis.FakeAsyncRedis())
+        await cache.set("1", '{"id": 1}')
+        self.assertEqual(await cache.get("1"), '{"id": 1}')
+        await cache.delete("1")
+        self.assertIsNone(await cache.get("1"))
+        self.assertEqual(CACHE_HITS.value(cache="test-redis"), 1)
+        self.assertEqual(CACHE_MISSES.value(cache="test-redis"), 1)
+
+
+class TestStartup(unittest.TestCase):
+
+    def test_parse_importtime(self):
+        output = (
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       120 |        120 |   cloudinary.utils\n"
+            "import time:      1500 |       1620 | main\n"
+        )
+        modules = parse_importtime(output)
+        self.assertEqual(modules["main"], (1500, 1620))
+        self.assertEqual(heavy_modules(modules), ["cloudinary"])
+
+    def test_import_has_no_side_effects(self):
+        # Import aplikacji nie łączy się z bazą ani nie ładuje ciężkich zależności.
+        with tempfile.TemporaryDirectory() as directory:
+            env = startup_env(directory)
+            env["DATABASE_URL"] = f"sqlite:///{os.path.join(directory, 'missing', 'contacts.db')}"
+            modules = measure("main", env)
+            self.assertFalse(os.path.exists(os.path.join(directory, "missing")))
+        self.assertIn("main", modules)
+        self.assertEqual(heavy_modules(modules), [])
+
+
+class TestApiBench(unittest.TestCase):
+
+    def test_summarize(self):
+        samples = {"get": [(i / 1000, i != 100) for i in range(1, 101)]}
+        result = summarize(samples, elapsed=2.0)
+        stats = result["operations"]["get"]
+        self.assertEqual(stats["requests"], 100)
+        self.assertEqual(stats["errors"], 1)
+        self.assertEqual(stats["rps"], 50.0)
+        self.assertEqual((stats["p50_ms"], stats["p95_ms"], stats["p99_ms"]), (50.0, 95.0, 99.0))
+        self.assertEqual(result["total"]["requests"], 100)
+        self.assertEqual(percentile([], 95), 0.0)
+
+    def test_compare(self):
+        baseline = summarize({"get": [(0.010, True)] * 100, "list": [(0.020, True)] * 100}, elapsed=1.0)
+        same = summarize({"get": [(0.011, True)] * 100, "list": [(0.020, True)] * 100}, elapsed=1.0)
+        self.assertEqual(compare(same, baseline, 0.2), [])
+        slower = summarize({"get": [(0.013, True)] * 100, "list": [(0.020, True)] * 70}, elapsed=1.0)
+        regressions = compare(slower, baseline, 0.2)
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(regressions[0].startswith("get: p95"))
+        self.assertTrue(regressions[1].startswith("list:"))
+        with self.assertRaises(ValueError):
+            parse_mix("get=1,unknown=2")
+
+
 if __name__ == '__main__':
     unittest.main()
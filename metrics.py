@@ -0,0 +1,145 @@
+import bisect
+import threading
+from collections import defaultdict
+
+
+# Domyślne przedziały histogramów czasu (w sekundach).
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+_registry = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    """
+    Bazowa klasa metryki w formacie tekstowym Prometheusa.
+
+    Args:
+        name (str): Nazwa metryki.
+        documentation (str): Opis metryki (linia HELP).
+        labelnames (tuple, optional): Nazwy etykiet. Defaults to ().
+    """
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: dict):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        """
+        Zwraca próbki metryki jako pary (nazwa z etykietami, wartość).
+        """
+        return []
+
+    def render(self):
+        """
+        Zwraca metrykę w formacie tekstowym Prometheusa.
+        """
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(f"{name} {_format_value(value)}" for name, value in self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """
+    Licznik, którego wartość może tylko rosnąć.
+    """
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = defaultdict(float)
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] += amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name + _format_labels(self.labelnames, key), value) for key, value in items]
+
+
+class Gauge(Metric):
+    """
+    Wskaźnik, którego wartości są odczytywane w momencie zbierania metryk.
+
+    Funkcja `collect` zwraca słownik {krotka wartości etykiet: wartość}.
+    """
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), collect=None):
+        super().__init__(name, documentation, labelnames)
+        self._collect = collect or (lambda: {})
+
+    def samples(self):
+        return [(self.name + _format_labels(self.labelnames, key), value) for key, value in self._collect().items()]
+
+
+class Histogram(Metric):
+    """
+    Histogram z ustalonymi przedziałami (skumulowanymi jak w Prometheusie).
+    """
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._counts = defaultdict(lambda: [0] * (len(self.buckets) + 1))
+        self._sums = defaultdict(float)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[key][index] += 1
+            self._sums[key] += value
+
+    def count(self, **labels) -> int:
+        return sum(self._counts.get(self._key(labels), ()))
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(counts), self._sums[key]) for key, counts in self._counts.items()]
+        samples = []
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                samples.append((self.name + "_bucket" + _format_labels(self.labelnames, key, [("le", le)]), cumulative))
+            samples.append((self.name + "_sum" + _format_labels(self.labelnames, key), total))
+            samples.append((self.name + "_count" + _format_labels(self.labelnames, key), cumulative))
+        return samples
+
+
+def render_metrics() -> str:
+    """
+    Zwraca wszystkie zarejestrowane metryki w formacie tekstowym Prometheusa.
+    """
+    return "\n".join(metric.render() for metric in _registry) + "\n"
@@ -1,36 +1,91 @@
-from sqlalchemy import Column, Integer, String, Date
+from sqlalchemy import Column, Boolean, ForeignKey, Index, Integer, SmallInteger, String, Date, DateTime, Text, func, text, true
 from sqlalchemy.ext.declarative import declarative_base
-from passlib.context import CryptContext
+from sqlalchemy.orm import validates
 from pydantic import BaseModel
-import cloudinary
-
-# Konfiguracja cloudinary
-cloudinary.config( 
-  cloud_name = "dfqqteqmv", 
-  api_key = "724751544977486", 
-  api_secret = "***************************" 
-)
+from typing import Optional
+from datetime import datetime, timezone
 
 # Utwórz obiekt bazowy dla modeli SQLAlchemy
 Base = declarative_base()
 
 
-class Contact(BaseModel):
+def birth_md_of(birth_date):
+    """
+    Zamienia datę urodzenia na liczbę MMDD (np. 24 grudnia -> 1224).
+
+    Args:
+        birth_date (date): Data urodzenia.
+
+    Returns:
+        int: Miesiąc i dzień urodzin albo None, jeśli data nie jest znana.
+    """
+    if birth_date is None:
+        return None
+    return birth_date.month * 100 + birth_date.day
+
+
+def _default_birth_md(context):
+    return birth_md_of(context.get_current_parameters().get("birth_date"))
+
+
+def utcnow():
+    """
+    Zwraca bieżący czas UTC bez strefy czasowej (tak jak jest zapisywany w bazie).
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class Contact(Base):
     """
     Model danych dla kontaktu.
+
+    Kolumna `birth_md` przechowuje miesiąc i dzień urodzin (MMDD) i jest
+    zindeksowana razem z `owner_id`, dzięki czemu zapytanie o nadchodzące
+    urodziny jest skanem zakresu indeksu. Jest wyliczana z `birth_date` przy
+    zapisie przez ORM oraz przy INSERT wykonywanym przez Core.
+
+    Kolumny `version` i `updated_at` służą do warunkowych żądań HTTP (ETag,
+    Last-Modified). `version` jest licznikiem wersji ORM: UPDATE i DELETE
+    sprawdzają wersję wczytanego obiektu, więc równoległa zmiana kończy się
+    błędem `StaleDataError` zamiast nadpisaniem danych.
+
+    Każdy kontakt należy do użytkownika (`owner_id`) i wszystkie zapytania API
+    są zawężone do kontaktów zalogowanego użytkownika. Dlatego indeksy są
+    złożone i zaczynają się od `owner_id`: lista i stronicowanie (po `id`),
+    ETag listy (`updated_at`), sortowanie po nazwisku, wyszukiwanie po e-mailu
+    i urodziny czytają tylko zakres indeksu jednego użytkownika. Adres e-mail
+    jest unikalny w obrębie kontaktów jednego użytkownika.
     """
     __tablename__ = "contacts"
 
-    id: int
-    first_name: str
-    last_name: str
-    email: str
-    phone_number: str
-    birth_date: Date
-    additional_data: str = None
+    id = Column(Integer, primary_key=True, index=True)
+    owner_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    first_name = Column(String(50))
+    last_name = Column(String(50))
+    email = Column(String(100))
+    phone_number = Column(String(50))
+    birth_date = Column(Date)
+    birth_md = Column(SmallInteger, default=_default_birth_md)
+    additional_data = Column(Text, nullable=True)
+    version = Column(Integer, nullable=False, default=1, server_default=text("1"))
+    updated_at = Column(
+        DateTime, nullable=False,
+        default=utcnow, onupdate=utcnow, server_default=func.current_timestamp(),
+    )
 
-    class Config:
-        arbitrary_types_allowed = True
+    __table_args__ = (
+        Index("ix_contacts_owner_id", "owner_id", "id"),
+        Index("ix_contacts_owner_updated_at", "owner_id", "updated_at"),
+        Index("ix_contacts_owner_name", "owner_id", "last_name", "first_name"),
+        Index("ix_contacts_owner_email", "owner_id", "email", unique=True),
+        Index("ix_contacts_owner_birth_md", "owner_id", "birth_md"),
+    )
+    __mapper_args__ = {"version_id_col": version}
+
+    @validates("birth_date")
+    def _sync_birth_md(self, key, birth_date):
+        self.birth_md = birth_md_of(birth_date)
+        return birth_date
         
 
 class Token(BaseModel):
@@ -39,9 +94,10 @@ class Token(BaseModel):
     """
     __tablename__ = "tokens"
 
-    id: int 
+    id: Optional[int] = None
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
 
     class Config:
         arbitrary_types_allowed = True
@@ -54,14 +110,20 @@ class User(Base):
     __tablename__ = "users"
 
     id = Column(Integer, primary_key=True, index=True)
-    username = Column(String, unique=True, index=True)
-    hashed_password = Column(String)
-    email = Column(String, unique=True, index=True)  
-    avatar_url: str = None
+    username = Column(String(50), unique=True, index=True)
+    hashed_password = Column(String(255))
+    email = Column(String(100), unique=True, index=True)
+    is_active = Column(Boolean, nullable=False, default=True, server_default=true())
+    avatar_url = Column(String(255), nullable=True)
+    # Konta sprzed weryfikacji e-mail są zweryfikowane; rejestracja tworzy konto z is_verified=False.
+    is_verified = Column(Boolean, nullable=False, default=True, server_default=true())
+    verification_token_hash = Column(String(64), nullable=True)
+    verification_expires_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=utcnow, server_default=func.current_timestamp())
+
+    # Sprzątanie niezweryfikowanych kont: WHERE is_verified = false AND verification_expires_at < now.
+    __table_args__ = (Index("ix_users_unverified_expiry", "is_verified", "verification_expires_at"),)
 
     class Config:
         arbitrary_types_allowed = True
-        
 
-# Inicjalizacja kontekstu hashowania
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -1,5 +1,6 @@
 from pydantic import BaseModel
 from datetime import date
+from typing import List, Optional
 
 
 class ContactCreateUpdate(BaseModel):
@@ -11,7 +12,7 @@ class ContactCreateUpdate(BaseModel):
     email: str
     phone_number: str
     birth_date: date
-    additional_data: str = None
+    additional_data: Optional[str] = None
     
     
 class ContactResponse(BaseModel):
@@ -24,4 +25,38 @@ class ContactResponse(BaseModel):
     email: str
     phone_number: str
     birth_date: date
-    additional_data: str = None
+    additional_data: Optional[str] = None
+
+
+class ContactPage(BaseModel):
+    """
+    Model Pydantic reprezentujący jedną stronę listy kontaktów.
+    """
+    items: List[ContactResponse]
+    next_cursor: Optional[str] = None
+
+
+class BulkImportRowError(BaseModel):
+    """
+    Model Pydantic reprezentujący błędy jednego wiersza importu.
+    """
+    row: int
+    errors: List[dict]
+
+
+class BulkImportReport(BaseModel):
+    """
+    Model Pydantic reprezentujący raport z masowego importu kontaktów.
+    """
+    received: int
+    inserted: int
+    failed: int
+    errors: List[BulkImportRowError]
+    error: Optional[str] = None
+
+
+class TokenRefresh(BaseModel):
+    """
+    Model Pydantic reprezentujący żądanie odświeżenia tokenu dostępu.
+    """
+    refresh_token: str